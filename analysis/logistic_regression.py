@@ -1,3 +1,6 @@
+import os
+import sys
+
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
@@ -5,7 +8,10 @@ from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import roc_auc_score, classification_report
 import numpy as np
 
-df = pd.read_csv("data/processed/risk_segments.csv")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+from stage_io import read_stage, write_stage
+
+df = read_stage("data/processed/risk_segments.csv")
 
 features = [
     "loan_amnt",
@@ -52,6 +58,6 @@ print(importance)
 
 
 df["pred_default_prob"] = lr.predict_proba(scaler.transform(X))[:, 1]
-df.to_csv("data/processed/risk_segments_with_predictions.csv", index=False)
+write_stage(df, "data/processed/risk_segments_with_predictions.csv")
 
 print("\n Saved predictions → data/processed/risk_segments_with_predictions.csv")
\ No newline at end of file
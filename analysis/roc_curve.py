@@ -1,9 +1,14 @@
-import pandas as pd
+import os
+import sys
+
 import matplotlib.pyplot as plt
 from sklearn.metrics import roc_curve, auc
 
-# Load the data
-df = pd.read_csv("data/processed/risk_segments_with_predictions.csv")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+from stage_io import read_stage
+
+# Load the data (only the two columns used)
+df = read_stage("data/processed/risk_segments_with_predictions.csv", columns=["default", "pred_default_prob"])
 
 # Extract true labels and predicted probabilities
 y_true = df["default"]
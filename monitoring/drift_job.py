@@ -67,7 +67,7 @@ def main():
 
     # Upload to S3
     s3_key = f"reports/drift/drift_report_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.html"
-    s3_url = upload_file(out_path, s3_key)
+    s3_url = upload_file(out_path, s3_key, content_type="text/html")
     if s3_url:
         print(f"🚀 Drift report uploaded to S3: {s3_url}")
     else:
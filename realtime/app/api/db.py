@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+import math
 import os
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 import psycopg2
 import numpy as np
@@ -20,6 +21,9 @@ PG_DB = os.getenv("PG_DB", "credit_risk")
 PG_USER = os.getenv("PG_USER", "credit")
 PG_PASSWORD = os.getenv("PG_PASSWORD", "risk")
 
+# Requires the unique index from infra/unique_loan_id.sql
+PG_UPSERT = os.getenv("PG_UPSERT", "false").lower() == "true"
+
 
 def get_conn():
     return psycopg2.connect(
@@ -47,12 +51,103 @@ INSERT INTO risk_scored (
 );
 """
 
+SCORED_COLUMNS = [
+    "loan_id", "purpose", "term",
+    "loan_amnt", "annual_inc", "dti", "int_rate_pct", "revol_util_pct",
+    "delinq_2yrs", "inq_last_6mths", "credit_history_years", "emp_length_yrs",
+    "dti_band", "util_band", "rate_band",
+    "early_warning_flag", "risk_tier", "reasons",
+]
+
+# Columns refreshed when a replayed/redelivered loan_id is scored again
+UPSERT_UPDATE_COLUMNS = SCORED_COLUMNS[1:]
+
+# Multi-row form for psycopg2.extras.execute_values (one statement per page of rows)
+BULK_INSERT_SQL = f"INSERT INTO risk_scored ({', '.join(SCORED_COLUMNS)}) VALUES %s"
+BULK_ROW_TEMPLATE = "(" + ", ".join(f"%({c})s" for c in SCORED_COLUMNS) + ")"
+
+
+def build_upsert_sql(insert_sql: str) -> str:
+    """
+    Turn a plain risk_scored INSERT into an idempotent upsert keyed on loan_id.
+    RETURNING (xmax = 0) is true for a fresh insert and false when an existing row was updated.
+    """
+    updates = ",\n  ".join(f"{c} = EXCLUDED.{c}" for c in UPSERT_UPDATE_COLUMNS)
+    return (
+        insert_sql.rstrip().rstrip(";")
+        + f"\nON CONFLICT (loan_id) DO UPDATE SET\n  {updates}\nRETURNING (xmax = 0) AS inserted;\n"
+    )
+
+
+UPSERT_SQL = build_upsert_sql(INSERT_SQL)
+
+
+def _num(value: Any, cast=float) -> Optional[float]:
+    """Native float/int, or None for missing and non-finite values (NaN is not valid JSON or a useful SQL value)."""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return cast(value) if math.isfinite(value) else None
+
+
+def build_scored_row(loan_id: str, features: Dict[str, Any], decision: Dict[str, Any]) -> Dict[str, Any]:
+    """risk_scored row with numpy types converted to native Python types and NaN/inf to None."""
+    return {
+        "loan_id": loan_id,
+        "purpose": features.get("purpose"),
+        "term": features.get("term"),
+        "loan_amnt": _num(features.get("loan_amnt")),
+        "annual_inc": _num(features.get("annual_inc")),
+        "dti": _num(features.get("dti")),
+        "int_rate_pct": _num(features.get("int_rate_pct")),
+        "revol_util_pct": _num(features.get("revol_util_pct")),
+        "delinq_2yrs": _num(features.get("delinq_2yrs"), int),
+        "inq_last_6mths": _num(features.get("inq_last_6mths"), int),
+        "credit_history_years": _num(features.get("credit_history_years")),
+        "emp_length_yrs": _num(features.get("emp_length_yrs")),
+        "dti_band": decision.get("dti_band"),
+        "util_band": decision.get("util_band"),
+        "rate_band": decision.get("rate_band"),
+        "early_warning_flag": decision.get("early_warning_flag"),
+        "risk_tier": decision.get("risk_tier"),
+        "reasons": ",".join(decision.get("reasons", [])),
+    }
+
+# Watchlist priority lane (streaming/alert_lane.py): small, immediately committed inserts
+ALERT_COLUMNS = [
+    "loan_id", "risk_tier", "reasons", "purpose",
+    "loan_amnt", "annual_inc", "dti", "revol_util_pct",
+    "delinq_2yrs", "inq_last_6mths", "kafka_time",
+]
+# Idempotent, applied by the alert lane at startup: schema.sql only runs when the Postgres volume is first created
+ALERTS_DDL = """
+CREATE TABLE IF NOT EXISTS risk_alerts (
+  id BIGSERIAL PRIMARY KEY,
+  alerted_at TIMESTAMPTZ DEFAULT NOW(),
+  kafka_time TIMESTAMPTZ,
+  loan_id TEXT,
+  risk_tier TEXT,
+  reasons TEXT,
+  purpose TEXT,
+  loan_amnt DOUBLE PRECISION,
+  annual_inc DOUBLE PRECISION,
+  dti DOUBLE PRECISION,
+  revol_util_pct DOUBLE PRECISION,
+  delinq_2yrs DOUBLE PRECISION,
+  inq_last_6mths DOUBLE PRECISION
+);
+CREATE INDEX IF NOT EXISTS idx_risk_alerts_time ON risk_alerts(alerted_at DESC);
+"""
+BULK_ALERT_INSERT_SQL = f"INSERT INTO risk_alerts ({', '.join(ALERT_COLUMNS)}) VALUES %s"
+ALERT_ROW_TEMPLATE = "(" + ", ".join(f"%({c})s" for c in ALERT_COLUMNS[:-1]) + ", to_timestamp(%(kafka_ts)s))"
+
 
-def insert_scored_row(row: Dict[str, Any]) -> None:
+def insert_scored_row(row: Dict[str, Any], upsert: bool = PG_UPSERT) -> None:
     conn = get_conn()
     try:
         with conn:
             with conn.cursor() as cur:
-                cur.execute(INSERT_SQL, row)
+                cur.execute(UPSERT_SQL if upsert else INSERT_SQL, row)
     finally:
         conn.close()
@@ -0,0 +1,129 @@
+# app/api/decision_publisher.py
+from __future__ import annotations
+
+import json
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from app.api.metrics import DECISIONS_PUBLISHED_TOTAL
+
+# Output topic for scored decisions; empty disables publishing
+DECISIONS_TOPIC = os.getenv("DECISIONS_TOPIC", "")
+DECISIONS_COMPRESSION = os.getenv("DECISIONS_COMPRESSION", "zstd")  # gzip | snappy | lz4 | zstd | none
+
+DECISION_FIELDS = (
+    "loan_id", "risk_tier", "early_warning_flag",
+    "dti_band", "util_band", "rate_band",
+    "purpose", "loan_amnt", "dti", "revol_util_pct", "int_rate_pct",
+)
+
+
+def compact_decision(row: Dict[str, Any], source: str) -> Dict[str, Any]:
+    """The subset of a risk_scored row downstream systems need, plus provenance."""
+    out = {k: row.get(k) for k in DECISION_FIELDS}
+    reasons = row.get("reasons")
+    out["reasons"] = [r for r in reasons.split(",") if r] if isinstance(reasons, str) else list(reasons or [])
+    out["source"] = source
+    out["scored_at"] = datetime.now(timezone.utc).isoformat()
+    return out
+
+
+def _encode(decision: Dict[str, Any]) -> bytes:
+    # strict JSON: a NaN/inf that slipped past build_scored_row raises instead of emitting a NaN token
+    return json.dumps(decision, separators=(",", ":"), default=str, allow_nan=False).encode("utf-8")
+
+
+def ensure_topic(bootstrap_servers: str, topic: str, partitions: int = 3, replication: int = 1) -> None:
+    """Create the topic if it does not exist (Redpanda does not auto-create topics by default)."""
+    from kafka.admin import KafkaAdminClient, NewTopic
+    from kafka.errors import TopicAlreadyExistsError
+
+    admin = KafkaAdminClient(bootstrap_servers=bootstrap_servers)
+    try:
+        if topic not in admin.list_topics():
+            admin.create_topics([NewTopic(topic, num_partitions=partitions, replication_factor=replication)])
+            print(f"✅ Created topic '{topic}' ({partitions} partitions)")
+    except TopicAlreadyExistsError:
+        pass
+    finally:
+        admin.close()
+
+
+class DecisionPublisher:
+    """
+    Publishes compact scored decisions to a Kafka topic, keyed by loan_id so
+    every decision for a loan lands on the same partition in order.
+
+    Sends are asynchronous: the producer groups records per partition
+    (linger_ms / batch_size) and compresses each batch, so publish() costs
+    only a serialize + enqueue. Delivery failures are counted, not raised.
+    """
+    def __init__(
+        self,
+        bootstrap_servers: str,
+        topic: str,
+        source: str,
+        compression: Optional[str] = DECISIONS_COMPRESSION,
+        linger_ms: int = 50,
+        batch_size: int = 256 * 1024,
+        producer: Optional[Any] = None,
+    ):
+        self.topic = topic
+        self.source = source
+        if producer is None:
+            from kafka import KafkaProducer
+
+            producer = KafkaProducer(
+                bootstrap_servers=bootstrap_servers,
+                acks=1,
+                linger_ms=linger_ms,
+                batch_size=batch_size,
+                compression_type=None if compression in (None, "", "none") else compression,
+                retries=5,
+            )
+        self._producer = producer
+
+    @classmethod
+    def from_env(cls, bootstrap_servers: str, source: str) -> Optional["DecisionPublisher"]:
+        if not DECISIONS_TOPIC:
+            return None
+        try:
+            if os.getenv("DECISIONS_CREATE_TOPIC", "true").lower() == "true":
+                ensure_topic(bootstrap_servers, DECISIONS_TOPIC, int(os.getenv("DECISIONS_PARTITIONS", "3")))
+            return cls(
+                bootstrap_servers,
+                DECISIONS_TOPIC,
+                source,
+                linger_ms=int(os.getenv("DECISIONS_LINGER_MS", "50")),
+                batch_size=int(os.getenv("DECISIONS_BATCH_BYTES", str(256 * 1024))),
+            )
+        except Exception as e:
+            print(f"⚠️ Decision publishing disabled, cannot reach Kafka at {bootstrap_servers}: {e}")
+            return None
+
+    def _on_error(self, exc: Exception) -> None:
+        DECISIONS_PUBLISHED_TOTAL.labels(source=self.source, status="error").inc()
+        print(f"⚠️ Failed to publish decision to '{self.topic}': {exc}")
+
+    def publish(self, row: Dict[str, Any]) -> None:
+        decision = compact_decision(row, self.source)
+        try:
+            future = self._producer.send(
+                self.topic,
+                key=str(decision["loan_id"]).encode("utf-8"),
+                value=_encode(decision),
+            )
+        except Exception as e:
+            self._on_error(e)
+            return
+        DECISIONS_PUBLISHED_TOTAL.labels(source=self.source, status="sent").inc()
+        if hasattr(future, "add_errback"):
+            future.add_errback(self._on_error)
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        self._producer.flush(timeout)
+
+    def close(self) -> None:
+        self._producer.flush()
+        self._producer.close()
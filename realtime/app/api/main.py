@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+import os
 import time
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -13,12 +14,28 @@ from app.api.preprocess import preprocess_event, validate_required_features
 from app.api.rules import apply_rules
 from app.api.schemas import ScoreRequest, ScoreResponse
 from app.api.metrics import REQUESTS_TOTAL, SCORING_LATENCY, WATCHLIST_TOTAL
-from app.api.db import insert_scored_row
+from app.api.db import build_scored_row, insert_scored_row
+from app.api.decision_publisher import DecisionPublisher
 
 import numpy as np
 
 app = FastAPI(title="Credit Risk Scoring API", version="0.1.0")
 
+# Set on startup when DECISIONS_TOPIC is configured
+publisher: Optional[DecisionPublisher] = None
+
+
+@app.on_event("startup")
+def start_publisher():
+    global publisher
+    publisher = DecisionPublisher.from_env(os.getenv("KAFKA_BOOTSTRAP", "localhost:9092"), source="api")
+
+
+@app.on_event("shutdown")
+def stop_publisher():
+    if publisher is not None:
+        publisher.close()
+
 
 def _to_python_types(obj: Any) -> Any:
     if isinstance(obj, dict):
@@ -78,33 +95,18 @@ def score(req: ScoreRequest):
 
         decision = apply_rules(features)
 
+        row = build_scored_row(loan_id, features, decision)
+
         if req.persist_to_db:
             try:
-                row = {
-                    "loan_id": loan_id,
-                    "purpose": features.get("purpose"),
-                    "term": features.get("term"),
-                    "loan_amnt": features.get("loan_amnt"),
-                    "annual_inc": features.get("annual_inc"),
-                    "dti": features.get("dti"),
-                    "int_rate_pct": features.get("int_rate_pct"),
-                    "revol_util_pct": features.get("revol_util_pct"),
-                    "delinq_2yrs": features.get("delinq_2yrs"),
-                    "inq_last_6mths": features.get("inq_last_6mths"),
-                    "credit_history_years": features.get("credit_history_years"),
-                    "emp_length_yrs": features.get("emp_length_yrs"),
-                    "dti_band": decision.get("dti_band"),
-                    "util_band": decision.get("util_band"),
-                    "rate_band": decision.get("rate_band"),
-                    "early_warning_flag": decision.get("early_warning_flag"),
-                    "risk_tier": decision.get("risk_tier"),
-                    "reasons": ",".join(decision.get("reasons", [])),
-                }
                 insert_scored_row(row)
             except Exception as e:
                 print(f"Failed to persist: {e}")
                 # Optional: REQUESTS_TOTAL.labels(endpoint=endpoint, status="db_error").inc()
 
+        if publisher is not None:
+            publisher.publish(row)
+
         if decision.get("risk_tier") == "Watchlist":
             WATCHLIST_TOTAL.labels(source="api").inc()
 
@@ -17,3 +17,9 @@ WATCHLIST_TOTAL = Counter(
     "Total watchlist decisions",
     ["source"],
 )
+
+DECISIONS_PUBLISHED_TOTAL = Counter(
+    "credit_risk_decisions_published_total",
+    "Scored decisions handed to the Kafka decisions topic",
+    ["source", "status"],  # source: api, consumer; status: sent, error
+)
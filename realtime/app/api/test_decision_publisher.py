@@ -0,0 +1,68 @@
+"""
+Run: cd realtime && python -m pytest app
+"""
+import json
+
+import numpy as np
+
+from app.api.db import build_scored_row
+from app.api.decision_publisher import DecisionPublisher
+
+
+class FakeFuture:
+    def __init__(self):
+        self.errbacks = []
+
+    def add_errback(self, fn):
+        self.errbacks.append(fn)
+
+
+class FakeProducer:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, topic, key=None, value=None):
+        self.sent.append((topic, key, value))
+        return FakeFuture()
+
+    def flush(self, timeout=None):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_publishes_compact_decision_keyed_by_loan_id():
+    producer = FakeProducer()
+    pub = DecisionPublisher("unused:9092", "risk_decisions", source="consumer", producer=producer)
+    pub.publish({"loan_id": "42", "risk_tier": "Watchlist", "reasons": "DTI>=30,DELINQ_2YRS>0",
+                 "dti": 31.0, "annual_inc": 50000.0})
+
+    topic, key, value = producer.sent[0]
+    decision = json.loads(value)
+    assert (topic, key) == ("risk_decisions", b"42")
+    assert decision["risk_tier"] == "Watchlist"
+    assert decision["reasons"] == ["DTI>=30", "DELINQ_2YRS>0"]
+    assert decision["source"] == "consumer"
+    assert "annual_inc" not in decision
+
+
+def test_nan_features_publish_as_null():
+    producer = FakeProducer()
+    pub = DecisionPublisher("unused:9092", "risk_decisions", source="api", producer=producer)
+    features = {"purpose": "car", "loan_amnt": 5000.0, "dti": float("inf"),
+                "revol_util_pct": float("nan"), "delinq_2yrs": np.float64("nan")}
+    pub.publish(build_scored_row("7", features, {"risk_tier": "Standard", "reasons": []}))
+
+    decision = json.loads(producer.sent[0][2])
+    assert decision["revol_util_pct"] is None
+    assert decision["dti"] is None
+    assert decision["loan_amnt"] == 5000.0
+
+
+def test_raw_nan_is_not_published():
+    producer = FakeProducer()
+    pub = DecisionPublisher("unused:9092", "risk_decisions", source="api", producer=producer)
+    pub.publish({"loan_id": "7", "risk_tier": "Standard", "dti": float("nan")})
+
+    assert producer.sent == []
@@ -0,0 +1,18 @@
+from prometheus_client import Counter, Histogram
+
+S3_UPLOADS_TOTAL = Counter(
+    "credit_risk_s3_uploads_total",
+    "S3 uploads",
+    ["status"],  # ok, error, no_credentials
+)
+
+S3_UPLOAD_BYTES_TOTAL = Counter(
+    "credit_risk_s3_upload_bytes_total",
+    "Bytes uploaded to S3",
+)
+
+S3_UPLOAD_LATENCY = Histogram(
+    "credit_risk_s3_upload_latency_seconds",
+    "Time to upload one object to S3",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
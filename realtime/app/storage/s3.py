@@ -1,22 +1,144 @@
 # realtime/app/storage/s3.py
+import io
 import os
+import threading
+import time
+from typing import BinaryIO, Iterator, Optional
+
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import NoCredentialsError
 
-def upload_file(local_path: str, s3_path: str, content_type: str = None) -> str:
-    bucket = os.getenv("S3_BUCKET", "credit-risk-lake")
-    s3 = boto3.client("s3")
-    
-    extra_args = {}
-    if content_type:
-        extra_args["ContentType"] = content_type
+from app.storage.metrics import S3_UPLOAD_BYTES_TOTAL, S3_UPLOAD_LATENCY, S3_UPLOADS_TOTAL
+
+_MB = 1024 * 1024
+
+_client_lock = threading.Lock()
+_cached_client = None
+
+
+def get_client():
+    """
+    Process-wide S3 client (boto3 clients are thread-safe; building one costs
+    tens of ms, so do it once). S3_ENDPOINT_URL points at an S3-compatible
+    store such as MinIO or a moto server.
+    """
+    global _cached_client
+    if _cached_client is None:
+        with _client_lock:
+            if _cached_client is None:
+                _cached_client = boto3.client(
+                    "s3",
+                    endpoint_url=os.getenv("S3_ENDPOINT_URL") or None,
+                    config=Config(
+                        max_pool_connections=int(os.getenv("S3_MAX_POOL_CONNECTIONS", "32")),
+                        retries={"max_attempts": int(os.getenv("S3_MAX_ATTEMPTS", "5")), "mode": "adaptive"},
+                    ),
+                )
+    return _cached_client
+
 
+def reset_client() -> None:
+    """Drop the cached client (e.g. after changing credentials or S3_ENDPOINT_URL)."""
+    global _cached_client
+    with _client_lock:
+        _cached_client = None
+
+
+def transfer_config() -> TransferConfig:
+    """Parallel multipart settings shared by file and stream uploads."""
+    return TransferConfig(
+        multipart_threshold=int(float(os.getenv("S3_MULTIPART_THRESHOLD_MB", "8")) * _MB),
+        multipart_chunksize=int(float(os.getenv("S3_MULTIPART_CHUNK_MB", "8")) * _MB),
+        max_concurrency=int(os.getenv("S3_MAX_CONCURRENCY", "8")),
+        use_threads=True,
+    )
+
+
+def _bucket(bucket: Optional[str]) -> str:
+    return bucket or os.getenv("S3_BUCKET", "credit-risk-lake")
+
+
+def _upload(send, s3_path: str, bucket: str, size: Optional[int]) -> Optional[str]:
+    t0 = time.time()
     try:
-        s3.upload_file(local_path, bucket, s3_path, ExtraArgs=extra_args)
-        return f"s3://{bucket}/{s3_path}"
+        send()
     except NoCredentialsError:
+        S3_UPLOADS_TOTAL.labels(status="no_credentials").inc()
         print("❌ No AWS credentials found.")
         return None
     except Exception as e:
+        S3_UPLOADS_TOTAL.labels(status="error").inc()
         print(f"❌ Failed to upload to S3: {e}")
         return None
+    S3_UPLOAD_LATENCY.observe(time.time() - t0)
+    S3_UPLOADS_TOTAL.labels(status="ok").inc()
+    if size:
+        S3_UPLOAD_BYTES_TOTAL.inc(size)
+    return f"s3://{bucket}/{s3_path}"
+
+
+def upload_file(local_path: str, s3_path: str, content_type: str = None, bucket: Optional[str] = None) -> str:
+    bucket = _bucket(bucket)
+    s3 = get_client()
+    
+    extra_args = {}
+    if content_type:
+        extra_args["ContentType"] = content_type
+
+    size = os.path.getsize(local_path) if os.path.exists(local_path) else None
+    return _upload(
+        lambda: s3.upload_file(local_path, bucket, s3_path, ExtraArgs=extra_args, Config=transfer_config()),
+        s3_path, bucket, size,
+    )
+
+
+def upload_fileobj(fileobj: BinaryIO, s3_path: str, content_type: str = None, bucket: Optional[str] = None) -> str:
+    """
+    Stream a readable binary object to S3 without a temp file. Large streams
+    are sent as parallel multipart uploads per transfer_config().
+    """
+    bucket = _bucket(bucket)
+    s3 = get_client()
+
+    extra_args = {}
+    if content_type:
+        extra_args["ContentType"] = content_type
+
+    size = None
+    if fileobj.seekable():
+        pos = fileobj.tell()
+        size = fileobj.seek(0, io.SEEK_END) - pos
+        fileobj.seek(pos)
+    return _upload(
+        lambda: s3.upload_fileobj(fileobj, bucket, s3_path, ExtraArgs=extra_args, Config=transfer_config()),
+        s3_path, bucket, size,
+    )
+
+
+def upload_bytes(data: bytes, s3_path: str, content_type: str = None, bucket: Optional[str] = None) -> str:
+    """Upload an in-memory buffer (bytes/bytearray/memoryview)."""
+    return upload_fileobj(io.BytesIO(data), s3_path, content_type=content_type, bucket=bucket)
+
+
+def list_keys(prefix: str, bucket: Optional[str] = None) -> Iterator[str]:
+    """All object keys under prefix (paginated)."""
+    paginator = get_client().get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=_bucket(bucket), Prefix=prefix):
+        for obj in page.get("Contents", []):
+            yield obj["Key"]
+
+
+def iter_lines(s3_path: str, bucket: Optional[str] = None) -> Iterator[bytes]:
+    """Stream an object line by line without downloading it to disk first."""
+    body = get_client().get_object(Bucket=_bucket(bucket), Key=s3_path)["Body"]
+    try:
+        yield from body.iter_lines(chunk_size=1024 * 1024)
+    finally:
+        body.close()
+
+
+def open_object(s3_path: str, bucket: Optional[str] = None):
+    """Streaming, file-like body of an object (caller closes it)."""
+    return get_client().get_object(Bucket=_bucket(bucket), Key=s3_path)["Body"]
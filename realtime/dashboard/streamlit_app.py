@@ -98,6 +98,26 @@ def load_data(limit: int = 5000):
         conn.close()
 
 
+def load_alerts(limit: int = 50) -> pd.DataFrame:
+    """Latest Watchlist alerts from the consumer's priority lane (empty if risk_alerts is not set up)."""
+    conn = get_conn()
+    try:
+        return pd.read_sql(
+            f"""
+            SELECT alerted_at AS event_time, loan_id, risk_tier, loan_amnt, annual_inc,
+                   dti, revol_util_pct, delinq_2yrs, reasons
+            FROM risk_alerts
+            ORDER BY alerted_at DESC
+            LIMIT {int(limit)};
+            """,
+            conn,
+        )
+    except Exception:
+        return pd.DataFrame()
+    finally:
+        conn.close()
+
+
 def main():
     st.set_page_config(
         page_title="Credit Risk Monitoring (Real-Time)",
@@ -186,7 +206,10 @@ def main():
     # Watchlist Table
     st.subheader(f"🚨 Latest Watchlist Events ({watchlist_count} Total)")
     
-    wl_df = df[df["risk_tier"] == "Watchlist"]
+    # Priority-lane alerts land before the bulk risk_scored batch; fall back to the loaded window
+    wl_df = load_alerts()
+    if wl_df.empty:
+        wl_df = df[df["risk_tier"] == "Watchlist"]
     if wl_df.empty:
         st.info("No Watchlist events in the current loaded window.")
     else:
@@ -26,3 +26,38 @@ CREATE TABLE IF NOT EXISTS risk_scored (
 
 CREATE INDEX IF NOT EXISTS idx_risk_scored_time ON risk_scored(event_time DESC);
 CREATE INDEX IF NOT EXISTS idx_risk_scored_tier ON risk_scored(risk_tier);
+
+-- risk_alerts: Watchlist decisions written by the consumer's priority lane
+-- (committed per small batch, ahead of the bulk risk_scored writes).
+-- Existing databases get it from the consumer at startup (ALERTS_DDL in app/api/db.py).
+CREATE TABLE IF NOT EXISTS risk_alerts (
+  id BIGSERIAL PRIMARY KEY,
+  alerted_at TIMESTAMPTZ DEFAULT NOW(),
+  kafka_time TIMESTAMPTZ,
+  loan_id TEXT,
+  risk_tier TEXT,
+  reasons TEXT,
+  purpose TEXT,
+  loan_amnt DOUBLE PRECISION,
+  annual_inc DOUBLE PRECISION,
+  dti DOUBLE PRECISION,
+  revol_util_pct DOUBLE PRECISION,
+  delinq_2yrs DOUBLE PRECISION,
+  inq_last_6mths DOUBLE PRECISION
+);
+
+CREATE INDEX IF NOT EXISTS idx_risk_alerts_time ON risk_alerts(alerted_at DESC);
+
+-- risk_rollups_1m: per-minute tier/purpose rollups from the consumer
+-- (WINDOW_AGG_ROLLUPS=true); sums and counts so any range can be re-aggregated
+CREATE TABLE IF NOT EXISTS risk_rollups_1m (
+  window_start TIMESTAMPTZ NOT NULL,
+  risk_tier TEXT NOT NULL,
+  purpose TEXT NOT NULL,
+  events BIGINT NOT NULL,
+  sum_dti DOUBLE PRECISION NOT NULL,
+  n_dti BIGINT NOT NULL,
+  sum_util DOUBLE PRECISION NOT NULL,
+  n_util BIGINT NOT NULL,
+  PRIMARY KEY (window_start, risk_tier, purpose)
+);
@@ -0,0 +1,10 @@
+-- Optional: one row per loan_id in risk_scored.
+-- Needed for PG_UPSERT=true (INSERT ... ON CONFLICT (loan_id) DO UPDATE).
+-- Removes existing duplicates first, keeping the latest row per loan_id.
+
+DELETE FROM risk_scored a
+USING risk_scored b
+WHERE a.loan_id = b.loan_id
+  AND a.id < b.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_risk_scored_loan_id ON risk_scored(loan_id);
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from streaming.consumer_metrics import (
+    CONSUMER_BATCH_SIZE,
+    CONSUMER_FLUSH_LINGER_SECONDS,
+    CONSUMER_POLL_SIZE,
+)
+
+
+class AdaptiveBatchController:
+    """
+    Tunes the consumer's poll size, commit interval (rows per DB batch) and
+    flush linger at runtime.
+
+    - Lag above target: grow batches (x2) so the writer amortises round trips.
+    - Lag well below target: shrink batches and linger so rows land quickly.
+    - Batches are also capped so one flush costs at most half the latency budget
+      at the observed per-row write cost, unless we are already behind.
+    """
+    def __init__(
+        self,
+        target_latency_s: float = 1.0,
+        min_batch: int = 20,
+        max_batch: int = 5000,
+        initial_batch: int = 200,
+        min_linger_s: float = 0.02,
+        max_linger_s: float = 0.5,
+    ):
+        self.target_latency_s = target_latency_s
+        self.min_batch = max(1, int(min_batch))
+        self.max_batch = max(self.min_batch, int(max_batch))
+        self.min_linger_s = min_linger_s
+        self.max_linger_s = max(min_linger_s, max_linger_s)
+
+        self.batch_size = min(max(int(initial_batch), self.min_batch), self.max_batch)
+        self.linger_s = min(max(target_latency_s / 4, self.min_linger_s), self.max_linger_s)
+        self._row_cost_s = 0.0  # EWMA of DB write seconds per row
+        self._export()
+
+    @property
+    def poll_size(self) -> int:
+        return self.batch_size
+
+    def observe_flush(self, rows: int, seconds: float) -> None:
+        if rows <= 0:
+            return
+        per_row = seconds / rows
+        self._row_cost_s = per_row if self._row_cost_s == 0 else 0.8 * self._row_cost_s + 0.2 * per_row
+
+    def adjust(self, lag_s: float) -> None:
+        target = self.target_latency_s
+        if lag_s > target:
+            self.batch_size = min(self.max_batch, self.batch_size * 2)
+            self.linger_s = min(self.max_linger_s, self.linger_s * 1.5)
+        elif lag_s < target / 2:
+            self.batch_size = max(self.min_batch, int(self.batch_size * 0.75))
+            self.linger_s = max(self.min_linger_s, self.linger_s * 0.5)
+
+            if self._row_cost_s > 0:
+                budget_rows = int((target / 2) / self._row_cost_s)
+                self.batch_size = max(self.min_batch, min(self.batch_size, budget_rows))
+        self._export()
+
+    def _export(self) -> None:
+        CONSUMER_BATCH_SIZE.set(self.batch_size)
+        CONSUMER_POLL_SIZE.set(self.poll_size)
+        CONSUMER_FLUSH_LINGER_SECONDS.set(self.linger_s)
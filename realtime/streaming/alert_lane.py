@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import json
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from psycopg2.extras import execute_values
+
+from app.api.db import ALERT_ROW_TEMPLATE, ALERTS_DDL, BULK_ALERT_INSERT_SQL
+from streaming.consumer_metrics import WATCHLIST_ALERT_LATENCY, WATCHLIST_ALERTS_TOTAL
+
+Row = Dict[str, Any]
+
+
+class WatchlistAlertLane(threading.Thread):
+    """
+    Priority path for Watchlist decisions, separate from the bulk BatchWriter.
+
+    Alerts are picked up as soon as they are submitted and written in small
+    groups (whatever is queued, up to `max_batch`) with one commit each, to the
+    risk_alerts table and/or a Kafka alert topic. The same rows still go through
+    the bulk risk_scored path; this lane only makes them visible sooner.
+    The risk_alerts table is created if missing when the lane starts; if that
+    fails (e.g. no CREATE privilege) the table sink is turned off.
+    """
+    def __init__(
+        self,
+        connect: Optional[Callable[[], Any]] = None,
+        producer: Optional[Any] = None,
+        topic: Optional[str] = None,
+        max_batch: int = 50,
+        max_queue: int = 10_000,
+    ):
+        super().__init__(name="watchlist-alert-lane", daemon=True)
+        self._connect = connect
+        self._producer = producer if topic else None
+        self.topic = topic
+        self.max_batch = max(1, int(max_batch))
+        self._queue: "queue.Queue[Optional[Row]]" = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._conn = None
+        self.sent = 0
+
+    def submit(self, row: Row, kafka_ts: Optional[float]) -> None:
+        """Queue one Watchlist row; `kafka_ts` (unix seconds) is the source record's timestamp."""
+        alert = dict(row)
+        alert["kafka_ts"] = kafka_ts if kafka_ts else time.time()
+        try:
+            self._queue.put_nowait(alert)
+        except queue.Full:
+            # never stall the consumer on the alert path; the row still reaches risk_scored
+            WATCHLIST_ALERTS_TOTAL.labels(sink="queue", status="dropped").inc()
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        self._queue.put(None)
+        self.join(timeout)
+
+    def ensure_table(self) -> bool:
+        """Apply ALERTS_DDL (idempotent). Returns False and disables the table sink on failure."""
+        if self._connect is None:
+            return False
+        try:
+            conn = self._connect()
+            try:
+                with conn, conn.cursor() as cur:
+                    cur.execute(ALERTS_DDL)
+            finally:
+                conn.close()
+            return True
+        except Exception as e:
+            print(f"⚠️ risk_alerts table unavailable, Watchlist alerts go to the topic only: {e}")
+            self._connect = None
+            return False
+
+    def run(self) -> None:
+        self.ensure_table()
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self.emit(batch)
+        if self._producer is not None:
+            self._producer.flush()
+        if self._conn is not None:
+            self._conn.close()
+
+    def emit(self, alerts: List[Row]) -> None:
+        """Write/send one group of alerts and record their end-to-end latency."""
+        delivered = False
+        if self._connect is not None:
+            delivered |= self._write_table(alerts)
+        if self._producer is not None:
+            delivered |= self._send_topic(alerts)
+        if delivered:
+            now = time.time()
+            for alert in alerts:
+                WATCHLIST_ALERT_LATENCY.observe(max(0.0, now - alert["kafka_ts"]))
+            self.sent += len(alerts)
+
+    def _write_table(self, alerts: List[Row]) -> bool:
+        try:
+            if self._conn is None or self._conn.closed:
+                self._conn = self._connect()
+                self._conn.autocommit = False
+            with self._conn.cursor() as cur:
+                execute_values(cur, BULK_ALERT_INSERT_SQL, alerts, template=ALERT_ROW_TEMPLATE)
+            self._conn.commit()
+            WATCHLIST_ALERTS_TOTAL.labels(sink="table", status="ok").inc(len(alerts))
+            return True
+        except Exception as e:
+            try:
+                if self._conn is not None and not self._conn.closed:
+                    self._conn.rollback()
+            except Exception:
+                self._conn = None
+            WATCHLIST_ALERTS_TOTAL.labels(sink="table", status="error").inc(len(alerts))
+            print(f"⚠️ Failed to write {len(alerts)} Watchlist alerts: {e}")
+            return False
+
+    def _send_topic(self, alerts: List[Row]) -> bool:
+        try:
+            for alert in alerts:
+                self._producer.send(
+                    self.topic,
+                    key=str(alert["loan_id"]).encode("utf-8"),
+                    value=json.dumps(alert, default=str).encode("utf-8"),
+                )
+            self._producer.flush()
+            WATCHLIST_ALERTS_TOTAL.labels(sink="topic", status="ok").inc(len(alerts))
+            return True
+        except Exception as e:
+            WATCHLIST_ALERTS_TOTAL.labels(sink="topic", status="error").inc(len(alerts))
+            print(f"⚠️ Failed to publish {len(alerts)} Watchlist alerts to '{self.topic}': {e}")
+            return False
@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import gzip
+import io
+import json
+import os
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
+
+try:
+    import msgspec
+    _encoder = msgspec.json.Encoder()
+except ImportError:  # pragma: no cover - optional fast path
+    _encoder = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+    pq = None
+
+from streaming.event_decoder import SCORING_FIELDS
+
+
+# RAW_EVENTS_FORMAT value -> (file extension, S3 content type)
+FORMATS = {
+    "jsonl": (".jsonl", "application/json"),
+    "jsonl.gz": (".jsonl.gz", "application/gzip"),
+    "jsonl.zst": (".jsonl.zst", "application/zstd"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+
+_NUMERIC_FIELDS = {
+    "loan_amnt", "installment", "annual_inc", "dti",
+    "delinq_2yrs", "inq_last_6mths", "open_acc", "total_acc",
+}
+
+
+def format_for_path(name: str) -> str:
+    for fmt, (ext, _) in sorted(FORMATS.items(), key=lambda kv: -len(kv[1][0])):
+        if name.endswith(ext):
+            return fmt
+    raise ValueError(f"Unknown raw archive format: {name}")
+
+
+class JsonlArchiveWriter:
+    """
+    JSON lines, optionally gzip or zstd compressed as one stream per file.
+
+    Events are encoded straight into a reusable bytearray (msgspec when
+    available) and reach the file in `buffer_bytes` chunks, so there is no
+    per-event string concatenation or write call. flush() pushes everything
+    to the OS; durability (fsync) is decided by the caller.
+    """
+    def __init__(
+        self,
+        path: str,
+        compression: Optional[str] = None,
+        level: Optional[int] = None,
+        buffer_bytes: int = 64 * 1024,
+    ):
+        self._raw = open(path, "wb")
+        if compression is None:
+            self._fp: BinaryIO = self._raw
+        elif compression == "gzip":
+            self._fp = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=level or 6)
+        elif compression == "zstd":
+            if zstandard is None:
+                raise RuntimeError("RAW_EVENTS_FORMAT=jsonl.zst requires the 'zstandard' package")
+            cctx = zstandard.ZstdCompressor(level=level or 3)
+            self._fp = cctx.stream_writer(self._raw, closefd=False)
+        else:
+            raise ValueError(f"Unsupported compression: {compression}")
+        self.compression = compression
+        self.buffer_bytes = max(1, int(buffer_bytes))
+        self._buf = bytearray()
+        self.rows = 0
+
+    @property
+    def size_bytes(self) -> int:
+        """Bytes on disk so far (for compressed files: output that has left the encoder)."""
+        pending = len(self._buf) if self.compression is None else 0
+        return self._raw.tell() + pending
+
+    def write(self, event: Dict[str, Any]) -> None:
+        buf = self._buf
+        if _encoder is not None:
+            _encoder.encode_into(event, buf, -1)
+        else:
+            buf += json.dumps(event, ensure_ascii=False).encode("utf-8")
+        buf += b"\n"
+        self.rows += 1
+        if len(buf) >= self.buffer_bytes:
+            self._drain()
+
+    def _drain(self) -> None:
+        if self._buf:
+            self._fp.write(self._buf)
+            self._buf.clear()
+
+    def flush(self) -> None:
+        """Hand all buffered events to the OS (compressors emit a complete block)."""
+        self._drain()
+        if self._fp is not self._raw:
+            self._fp.flush()
+        self._raw.flush()
+
+    def fileno(self) -> int:
+        return self._raw.fileno()
+
+    def close(self, fsync: bool = True) -> None:
+        self._drain()
+        if self._fp is not self._raw:
+            self._fp.close()
+        self._raw.flush()
+        if fsync:
+            os.fsync(self._raw.fileno())
+        self._raw.close()
+
+
+class ParquetArchiveWriter:
+    """
+    Parquet with a fixed schema: the scoring fields as typed columns (for fast
+    analytical scans) plus `raw`, the full event as JSON, so nothing is lost.
+    Events are buffered and written one row group at a time.
+    """
+    def __init__(self, path: str, row_group_size: int = 10_000, compression: str = "zstd"):
+        if pa is None:
+            raise RuntimeError("RAW_EVENTS_FORMAT=parquet requires the 'pyarrow' package")
+        self._raw = open(path, "wb")
+        self.schema = parquet_schema()
+        self._writer = pq.ParquetWriter(self._raw, self.schema, compression=compression)
+        self.row_group_size = max(1, int(row_group_size))
+        self._buffer: List[Dict[str, Any]] = []
+        self.rows = 0
+
+    @property
+    def size_bytes(self) -> int:
+        return self._raw.tell()
+
+    def write(self, event: Dict[str, Any]) -> None:
+        self._buffer.append(event)
+        self.rows += 1
+        if len(self._buffer) >= self.row_group_size:
+            self._write_row_group()
+
+    def _write_row_group(self) -> None:
+        if not self._buffer:
+            return
+        columns = {}
+        for name in SCORING_FIELDS:
+            values = [e.get(name) for e in self._buffer]
+            columns[name] = [_as_float(v) for v in values] if name in _NUMERIC_FIELDS else [_as_str(v) for v in values]
+        columns["raw"] = [json.dumps(e, ensure_ascii=False) for e in self._buffer]
+        self._writer.write_table(pa.Table.from_pydict(columns, schema=self.schema))
+        self._buffer.clear()
+
+    def flush(self) -> None:
+        """Only completed row groups can be made durable; buffered rows wait for the next one."""
+        self._raw.flush()
+
+    def fileno(self) -> int:
+        return self._raw.fileno()
+
+    def close(self, fsync: bool = True) -> None:
+        self._write_row_group()
+        self._writer.close()
+        self._raw.flush()
+        if fsync:
+            os.fsync(self._raw.fileno())
+        self._raw.close()
+
+
+def parquet_schema():
+    fields = [
+        pa.field(name, pa.float64() if name in _NUMERIC_FIELDS else pa.string())
+        for name in SCORING_FIELDS
+    ]
+    fields.append(pa.field("raw", pa.string()))
+    return pa.schema(fields)
+
+
+def _as_float(v: Any) -> Optional[float]:
+    try:
+        return None if v is None else float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _as_str(v: Any) -> Optional[str]:
+    return None if v is None else str(v)
+
+
+def open_writer(path: str, fmt: str, parquet_row_group: int = 10_000, buffer_bytes: int = 64 * 1024):
+    if fmt == "jsonl":
+        return JsonlArchiveWriter(path, buffer_bytes=buffer_bytes)
+    if fmt == "jsonl.gz":
+        return JsonlArchiveWriter(path, compression="gzip", buffer_bytes=buffer_bytes)
+    if fmt == "jsonl.zst":
+        return JsonlArchiveWriter(path, compression="zstd", buffer_bytes=buffer_bytes)
+    if fmt == "parquet":
+        return ParquetArchiveWriter(path, row_group_size=parquet_row_group)
+    raise ValueError(f"Unknown RAW_EVENTS_FORMAT: {fmt}")
+
+
+def iter_archive_lines(fileobj: BinaryIO, name: str) -> Iterator[bytes]:
+    """One JSON event (bytes) per item from any archive format; `name` picks the decoder."""
+    fmt = format_for_path(name)
+    if fmt == "jsonl":
+        yield from fileobj
+    elif fmt == "jsonl.gz":
+        with gzip.GzipFile(fileobj=fileobj, mode="rb") as gz:
+            yield from io.BufferedReader(gz)
+    elif fmt == "jsonl.zst":
+        if zstandard is None:
+            raise RuntimeError("Reading .jsonl.zst archives requires the 'zstandard' package")
+        reader = zstandard.ZstdDecompressor().stream_reader(fileobj)
+        yield from io.BufferedReader(reader)
+    else:
+        if not fileobj.seekable():
+            fileobj = io.BytesIO(fileobj.read())
+        pf = pq.ParquetFile(fileobj)
+        for batch in pf.iter_batches(columns=["raw"]):
+            for value in batch.column(0).to_pylist():
+                yield value.encode("utf-8")
@@ -0,0 +1,141 @@
+# streaming/archive_lookup.py
+"""
+Find archived raw events by loan_id and/or event_time using the archive
+manifest (see archive_manifest), opening only the files whose manifest entry
+can match instead of scanning the whole archive.
+
+Examples:
+  python streaming/archive_lookup.py --loan-id 1077501
+  python streaming/archive_lookup.py --source s3://credit-risk-lake/raw_events \
+      --since 2026-02-14T00:00:00+00:00 --until 2026-02-14T01:00:00+00:00
+  python streaming/archive_lookup.py --reindex   # index files archived before the manifest existed
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app.storage import s3
+from streaming import archive_manifest
+from streaming.archive_format import format_for_path
+from streaming.event_decoder import decode_full
+from streaming.replay import _in_range, _parse_ts, iter_raw_lines, list_sources
+
+
+def load_entries(source: str) -> List[Dict[str, Any]]:
+    """Manifest entries from a local archive directory or the sidecars under s3://bucket/prefix/_manifest/."""
+    if not source.startswith("s3://"):
+        return archive_manifest.load_local(source)
+    bucket, _, prefix = source[len("s3://"):].partition("/")
+    manifest_prefix = f"{prefix.rstrip('/')}/{archive_manifest.MANIFEST_DIR}/"
+    entries = []
+    for key in s3.list_keys(manifest_prefix, bucket=bucket):
+        if not key.endswith(archive_manifest.SIDECAR_SUFFIX):
+            continue
+        body = s3.open_object(key, bucket=bucket)
+        try:
+            entries.append(json.loads(body.read()))
+        finally:
+            body.close()
+    return entries
+
+
+def locate(entry: Dict[str, Any], source: str) -> Optional[str]:
+    """Where to read the file from: the local copy while it still exists, else S3."""
+    if not source.startswith("s3://"):
+        for candidate in (Path(source) / entry["file"], Path(source) / "pending" / entry["file"]):
+            if candidate.exists():
+                return str(candidate)
+        bucket = os.getenv("S3_BUCKET", "credit-risk-lake")
+    else:
+        bucket = source[len("s3://"):].partition("/")[0]
+    if entry.get("s3_key") and bucket:
+        return f"s3://{bucket}/{entry['s3_key']}"
+    return None
+
+
+def index_file(path: str) -> Dict[str, Any]:
+    """Build a manifest entry by reading an existing archive file."""
+    rows = [decode_full(line) for line in iter_raw_lines(path) if line.strip()]
+    index = archive_manifest.FileIndex(max(1, len(rows)))
+    for event in rows:
+        index.add(event)
+    name = os.path.basename(path)
+    return index.entry(name, format_for_path(name), os.path.getsize(path), None)
+
+
+def reindex(local_dir: str) -> int:
+    """Add manifest entries for local archive files that have none."""
+    known = {e["file"] for e in archive_manifest.load_local(local_dir)}
+    added = 0
+    for path in list_sources(local_dir):
+        if os.path.basename(path) in known:
+            continue
+        archive_manifest.append_local(Path(local_dir), index_file(path))
+        added += 1
+    return added
+
+
+def lookup(
+    source: str,
+    loan_id: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    stats: Optional[Dict[str, int]] = None,
+) -> Iterator[Dict[str, Any]]:
+    stats = stats if stats is not None else {}
+    entries = load_entries(source)
+    candidates = archive_manifest.select(entries, loan_id=loan_id, since=since, until=until)
+    stats.update(indexed=len(entries), opened=0, missing=0, matched=0)
+    for entry in candidates:
+        path = locate(entry, source)
+        if path is None:
+            stats["missing"] += 1
+            print(f"⚠️ {entry['file']} is in the manifest but neither local nor in S3")
+            continue
+        stats["opened"] += 1
+        for line in iter_raw_lines(path):
+            if not line.strip():
+                continue
+            event = decode_full(line)
+            if loan_id is not None and archive_manifest.event_loan_id(event) != str(loan_id):
+                continue
+            if not _in_range(event, since, until):
+                continue
+            stats["matched"] += 1
+            yield event
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Look up archived raw events via the archive manifest.")
+    parser.add_argument("--source", default=os.getenv("RAW_EVENTS_LOCAL_DIR", "tmp/raw_events"),
+                        help="Local archive directory or s3://bucket/prefix")
+    parser.add_argument("--loan-id", help="Only events for this loan_id")
+    parser.add_argument("--since", help="Only events with event_time >= this ISO timestamp")
+    parser.add_argument("--until", help="Only events with event_time < this ISO timestamp")
+    parser.add_argument("--reindex", action="store_true",
+                        help="Index local archive files missing from the manifest, then exit")
+    args = parser.parse_args()
+
+    if args.reindex:
+        added = reindex(args.source)
+        print(f"🗂️ Added {added} manifest entries under {args.source}")
+        return
+
+    stats: Dict[str, int] = {}
+    started = time.time()
+    for event in lookup(args.source, args.loan_id, _parse_ts(args.since), _parse_ts(args.until), stats):
+        print(json.dumps(event, ensure_ascii=False))
+    print(f"🔎 {stats['matched']} events from {stats['opened']}/{stats['indexed']} files "
+          f"({stats['missing']} missing) in {time.time() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import base64
+import json
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from streaming.dedup import BloomFilter
+
+MANIFEST_DIR = "_manifest"
+MANIFEST_FILE = "manifest.jsonl"
+SIDECAR_SUFFIX = ".manifest.json"
+
+
+def event_loan_id(event: Any) -> Optional[str]:
+    """Same id choice as the consumer's normalize_event_id, without the generated fallback."""
+    for key in ("loan_id", "id"):
+        value = event.get(key)
+        if value is not None:
+            return str(value)
+    return None
+
+
+def event_ts(event: Any) -> Optional[float]:
+    value = event.get("event_time")
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _iso(ts: Optional[float]) -> Optional[str]:
+    return None if ts is None else datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+class FileIndex:
+    """
+    Per-file statistics gathered while events are appended: row count,
+    min/max event_time and a Bloom filter of loan_ids (~10 bits per row at 1%).
+    Events without event_time are stamped with the archive time.
+    """
+    def __init__(self, capacity: int, fp_rate: float = 0.01):
+        self.bloom = BloomFilter(capacity, fp_rate)
+        self.rows = 0
+        self.min_ts: Optional[float] = None
+        self.max_ts: Optional[float] = None
+
+    def add(self, event: Dict[str, Any]) -> None:
+        self.rows += 1
+        loan_id = event_loan_id(event)
+        if loan_id is not None:
+            self.bloom.add(loan_id)
+        ts = event_ts(event)
+        if ts is None:
+            ts = time.time()
+        if self.min_ts is None or ts < self.min_ts:
+            self.min_ts = ts
+        if self.max_ts is None or ts > self.max_ts:
+            self.max_ts = ts
+
+    def entry(self, name: str, fmt: str, size_bytes: int, s3_key: Optional[str]) -> Dict[str, Any]:
+        return {
+            "file": name,
+            "s3_key": s3_key,
+            "format": fmt,
+            "rows": self.rows,
+            "bytes": size_bytes,
+            "min_event_time": _iso(self.min_ts),
+            "max_event_time": _iso(self.max_ts),
+            "loan_id_bloom": {
+                "capacity": self.bloom.capacity,
+                "fp_rate": self.bloom.fp_rate,
+                "count": self.bloom.count,
+                "bits": base64.b64encode(bytes(self.bloom.bits)).decode("ascii"),
+            },
+        }
+
+
+def append_local(local_dir: Path, entry: Dict[str, Any]) -> None:
+    """Append one entry to <local_dir>/_manifest/manifest.jsonl (the local index)."""
+    path = Path(local_dir) / MANIFEST_DIR / MANIFEST_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def write_sidecar(directory: Path, entry: Dict[str, Any]) -> Path:
+    """<file>.manifest.json next to the archive file, uploaded under <prefix>/_manifest/."""
+    path = Path(directory) / f"{entry['file']}{SIDECAR_SUFFIX}"
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(json.dumps(entry))
+    os.replace(tmp, path)
+    return path
+
+
+def load_local(local_dir: str) -> List[Dict[str, Any]]:
+    path = Path(local_dir) / MANIFEST_DIR / MANIFEST_FILE
+    if not path.exists():
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _bloom(entry: Dict[str, Any]) -> BloomFilter:
+    b = entry["loan_id_bloom"]
+    return BloomFilter(b["capacity"], b["fp_rate"], bytearray(base64.b64decode(b["bits"])), b["count"])
+
+
+def matches(
+    entry: Dict[str, Any],
+    loan_id: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+) -> bool:
+    """Could this file hold the loan_id / events in [since, until)? (No false negatives.)"""
+    if since is not None or until is not None:
+        lo = event_ts({"event_time": entry.get("min_event_time")})
+        hi = event_ts({"event_time": entry.get("max_event_time")})
+        if lo is None or hi is None:
+            return False
+        if until is not None and lo >= until:
+            return False
+        if since is not None and hi < since:
+            return False
+    if loan_id is not None:
+        return str(loan_id) in _bloom(entry)
+    return True
+
+
+def select(entries: Iterable[Dict[str, Any]], **criteria: Any) -> List[Dict[str, Any]]:
+    return [e for e in entries if matches(e, **criteria)]
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from psycopg2.extras import execute_values
+
+from app.api.db import BULK_INSERT_SQL, BULK_ROW_TEMPLATE, build_upsert_sql
+from streaming.consumer_metrics import (
+    CONSUMER_DUPLICATES_TOTAL,
+    CONSUMER_EVENTS_TOTAL,
+    CONSUMER_FLUSH_LATENCY,
+    CONSUMER_LAST_EVENT_TS,
+    CONSUMER_WRITE_QUEUE_DEPTH,
+)
+
+BULK_UPSERT_SQL = build_upsert_sql(BULK_INSERT_SQL)
+
+Row = Dict[str, Any]
+
+
+class BatchWriter(threading.Thread):
+    """
+    Writes batches of scored rows to risk_scored on its own Postgres connection.
+
+    The queue is bounded: `saturated` tells the consumer to pause fetching,
+    and submit() blocks if it is ignored. Each batch is one multi-row
+    statement and one commit; if a batch fails, its rows are retried one by
+    one so a single bad row does not drop the rest. `on_written` receives the
+    rows that were actually committed (called on the writer thread).
+    """
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        upsert: bool = False,
+        max_pending_batches: int = 4,
+        on_flush: Optional[Callable[[int, float], None]] = None,
+        on_written: Optional[Callable[[List[Row]], None]] = None,
+    ):
+        super().__init__(name="risk-scored-writer", daemon=True)
+        self._connect = connect
+        self._sql = BULK_UPSERT_SQL if upsert else BULK_INSERT_SQL
+        self.upsert = upsert
+        self._queue: "queue.Queue[Optional[List[Row]]]" = queue.Queue(maxsize=max(1, int(max_pending_batches)))
+        self._on_flush = on_flush
+        self._on_written = on_written
+        self._conn = None
+
+        self.written = 0
+        self.failed = 0
+
+    @property
+    def saturated(self) -> bool:
+        return self._queue.full()
+
+    def submit(self, rows: List[Row]) -> None:
+        if rows:
+            self._queue.put(rows)
+            CONSUMER_WRITE_QUEUE_DEPTH.set(self._queue.qsize())
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Flush everything queued, then stop the thread."""
+        self._queue.put(None)
+        self.join(timeout)
+
+    def run(self) -> None:
+        while True:
+            rows = self._queue.get()
+            CONSUMER_WRITE_QUEUE_DEPTH.set(self._queue.qsize())
+            if rows is None:
+                break
+            try:
+                self.write_batch(rows)
+            except Exception as e:
+                CONSUMER_EVENTS_TOTAL.labels(status="db_error").inc(len(rows))
+                print(f"⚠️ Writer dropped batch of {len(rows)} rows: {e}")
+        self.close_connection()
+
+    def close_connection(self) -> None:
+        """Close the Postgres connection (for write_batch users that never start the thread)."""
+        if self._conn is not None and not self._conn.closed:
+            self._conn.close()
+        self._conn = None
+
+    def _cursor(self):
+        if self._conn is None or self._conn.closed:
+            self._conn = self._connect()
+            self._conn.autocommit = False
+        return self._conn.cursor()
+
+    def write_batch(self, rows: List[Row]) -> int:
+        """Write rows synchronously (also usable without starting the thread)."""
+        t0 = time.time()
+        try:
+            with self._cursor() as cur:
+                result = execute_values(
+                    cur, self._sql, rows, template=BULK_ROW_TEMPLATE,
+                    page_size=len(rows), fetch=self.upsert,
+                )
+            self._conn.commit()
+            written = rows
+            if self.upsert:
+                updated = sum(1 for (inserted,) in result if not inserted)
+                if updated:
+                    CONSUMER_DUPLICATES_TOTAL.labels(stage="upsert").inc(updated)
+        except Exception as e:
+            self._rollback()
+            print(f"⚠️ Batch insert of {len(rows)} rows failed ({e}); retrying row by row")
+            written = self._write_rows_individually(rows)
+
+        ok = len(written)
+        elapsed = time.time() - t0
+        self.written += ok
+        self.failed += len(rows) - ok
+        CONSUMER_EVENTS_TOTAL.labels(status="ok").inc(ok)
+        if ok < len(rows):
+            CONSUMER_EVENTS_TOTAL.labels(status="db_error").inc(len(rows) - ok)
+        if ok:
+            CONSUMER_LAST_EVENT_TS.set(time.time())
+        CONSUMER_FLUSH_LATENCY.observe(elapsed)
+        if self._on_flush is not None:
+            self._on_flush(len(rows), elapsed)
+        if written and self._on_written is not None:
+            self._on_written(written)
+        return ok
+
+    def _write_rows_individually(self, rows: List[Row]) -> List[Row]:
+        written = []
+        for row in rows:
+            try:
+                with self._cursor() as cur:
+                    result = execute_values(cur, self._sql, [row], template=BULK_ROW_TEMPLATE, fetch=self.upsert)
+                self._conn.commit()
+                written.append(row)
+                if self.upsert and result and not result[0][0]:
+                    CONSUMER_DUPLICATES_TOTAL.labels(stage="upsert").inc()
+            except Exception as e:
+                self._rollback()
+                # keep going; streaming should be resilient
+                print(f"⚠️ Insert failed for loan_id={row.get('loan_id')}: {e}")
+        return written
+
+    def _rollback(self) -> None:
+        try:
+            if self._conn is not None and not self._conn.closed:
+                self._conn.rollback()
+        except Exception:
+            self._conn = None
@@ -1,30 +1,49 @@
 from __future__ import annotations
 
-import json
 import os
 import time
+from collections import deque
 from typing import Any, Dict, Optional
 from dotenv import load_dotenv
 load_dotenv()
 
-import pandas as pd
 import psycopg2
-from kafka import KafkaConsumer
+from kafka import KafkaConsumer, KafkaProducer
 from prometheus_client import start_http_server
 
+from app.api.db import PG_UPSERT, build_scored_row
+from app.api.decision_publisher import DecisionPublisher
+from app.api.metrics import WATCHLIST_TOTAL
 from app.api.preprocess import preprocess_event, validate_required_features
 from app.api.rules import apply_rules
+from streaming.adaptive_batch import AdaptiveBatchController
+from streaming.alert_lane import WatchlistAlertLane
+from streaming.batch_writer import BatchWriter
 from streaming.consumer_metrics import (
     CONSUMER_EVENTS_TOTAL,
     CONSUMER_PROCESSING_LATENCY,
-    CONSUMER_LAST_EVENT_TS,
     CONSUMER_LAG_SECONDS,
+    CONSUMER_DUPLICATES_TOTAL,
+    CONSUMER_FETCH_PAUSED,
 )
+from streaming.dedup import RecentIdFilter
+from streaming.event_decoder import (
+    DECODE_ERRORS,
+    SUPPORTED_VERSIONS,
+    decode_for_scoring,
+    decode_full,
+    wire_id,
+    wire_version,
+)
+from streaming.lag_monitor import PartitionLagMonitor
 from streaming.raw_event_sink import RawEventSink
+from streaming.velocity import VelocityTracker
+from streaming.window_aggregates import RollupWriter, WindowedAggregates
 
 
 KAFKA_TOPIC = os.getenv("KAFKA_TOPIC", "loan_applications")
 KAFKA_BOOTSTRAP = os.getenv("KAFKA_BOOTSTRAP", "localhost:9092")
+KAFKA_GROUP_ID = os.getenv("KAFKA_GROUP_ID", "credit-risk-consumer-v1")
 
 PG_HOST = os.getenv("PG_HOST", "localhost")
 PG_PORT = int(os.getenv("PG_PORT", "5433"))
@@ -32,6 +51,9 @@ PG_DB = os.getenv("PG_DB", "credit_risk")
 PG_USER = os.getenv("PG_USER", "credit")
 PG_PASSWORD = os.getenv("PG_PASSWORD", "risk")
 
+# loan_ids generated for events without an id; never deduplicated
+GENERATED_ID_PREFIX = "evt_"
+
 
 def pg_connect():
     return psycopg2.connect(
@@ -43,33 +65,42 @@ def pg_connect():
     )
 
 
-INSERT_SQL = """
-INSERT INTO risk_scored (
-  loan_id, purpose, term,
-  loan_amnt, annual_inc, dti, int_rate_pct, revol_util_pct,
-  delinq_2yrs, inq_last_6mths, credit_history_years, emp_length_yrs,
-  dti_band, util_band, rate_band,
-  early_warning_flag, risk_tier, reasons
-) VALUES (
-  %(loan_id)s, %(purpose)s, %(term)s,
-  %(loan_amnt)s, %(annual_inc)s, %(dti)s, %(int_rate_pct)s, %(revol_util_pct)s,
-  %(delinq_2yrs)s, %(inq_last_6mths)s, %(credit_history_years)s, %(emp_length_yrs)s,
-  %(dti_band)s, %(util_band)s, %(rate_band)s,
-  %(early_warning_flag)s, %(risk_tier)s, %(reasons)s
-);
-"""
-
-
 def normalize_event_id(event: Dict[str, Any]) -> str:
     """
     Choose a stable ID for storage. Your producer may send 'id' or 'loan_id' or neither.
+    Accepts a raw event dict or a decoded ScoringEvent.
     """
-    if event.get("loan_id") is not None:
-        return str(event["loan_id"])
-    if event.get("id") is not None:
-        return str(event["id"])
+    # v1 JSON carries ids as the producer read them, e.g. 53595000.0
+    for key in ("loan_id", "id"):
+        value = wire_id(event.get(key))
+        if value is not None:
+            return str(value)
     # fallback: not ideal, but prevents null key inserts
-    return f"evt_{int(time.time() * 1000)}"
+    return f"{GENERATED_ID_PREFIX}{int(time.time() * 1000)}"
+
+
+def score_event(
+    event: Any,
+    loan_id: str,
+    velocity: Optional[VelocityTracker] = None,
+    ts: Optional[float] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Preprocess + rules for one decoded event.
+    Returns the risk_scored row, or None if required features are missing.
+    With a VelocityTracker, the event is counted at `ts` and its sliding-window
+    features are added to the feature dict (burst reasons are appended).
+    """
+    features = preprocess_event(event)
+    ok, missing = validate_required_features(features)
+    if not ok:
+        return None
+    if velocity is not None:
+        features.update(velocity.observe(event, ts))
+    decision = apply_rules(features)
+    if velocity is not None:
+        decision["reasons"] = list(decision.get("reasons", [])) + velocity.burst_reasons(features)
+    return build_scored_row(loan_id, features, decision)
 
 
 def main():
@@ -82,127 +113,255 @@ def main():
         bootstrap_servers=KAFKA_BOOTSTRAP,
         auto_offset_reset="earliest",
         enable_auto_commit=True,
-        group_id="credit-risk-consumer-v1",
-        value_deserializer=lambda m: json.loads(m.decode("utf-8")),
-        consumer_timeout_ms=1000,  # lets us print heartbeat if idle
+        group_id=KAFKA_GROUP_ID,
+        # keep raw bytes; decoded below (projected for scoring, full only for the archive)
     )
 
-    conn = pg_connect()
-    conn.autocommit = False
-    cur = conn.cursor()
+    # Per-partition offset lag, refreshed off the hot path
+    lag_monitor = PartitionLagMonitor(
+        topic=KAFKA_TOPIC,
+        group_id=KAFKA_GROUP_ID,
+        bootstrap_servers=KAFKA_BOOTSTRAP,
+        interval_s=float(os.getenv("CONSUMER_LAG_REFRESH_SECONDS", "5")),
+    )
+    lag_monitor.start()
+
+    # Batch sizing adapts to lag; see AdaptiveBatchController
+    controller = AdaptiveBatchController(
+        target_latency_s=float(os.getenv("CONSUMER_TARGET_LATENCY_SECONDS", "1.0")),
+        min_batch=int(os.getenv("CONSUMER_MIN_BATCH", "20")),
+        max_batch=int(os.getenv("CONSUMER_MAX_BATCH", "5000")),
+        initial_batch=int(os.getenv("CONSUMER_BATCH_SIZE", "200")),
+        max_linger_s=float(os.getenv("CONSUMER_MAX_LINGER_SECONDS", "0.5")),
+    )
+    # loan_ids committed by the writer thread, moved into the dedup filter on this thread
+    durable_ids: deque = deque()
+    writer = BatchWriter(
+        pg_connect,
+        upsert=PG_UPSERT,
+        max_pending_batches=int(os.getenv("CONSUMER_MAX_PENDING_BATCHES", "4")),
+        on_flush=controller.observe_flush,
+        on_written=lambda rows: durable_ids.extend(r["loan_id"] for r in rows),
+    )
+    writer.start()
+
+    # Watchlist priority lane: alert table and/or topic, committed ahead of the bulk batches
+    alerts: Optional[WatchlistAlertLane] = None
+    if os.getenv("WATCHLIST_ALERTS_ENABLED", "true").lower() == "true":
+        alert_topic = os.getenv("WATCHLIST_ALERT_TOPIC", "")  # e.g. risk_alerts; empty = table only
+        alerts = WatchlistAlertLane(
+            connect=pg_connect if os.getenv("WATCHLIST_ALERTS_TABLE", "true").lower() == "true" else None,
+            producer=KafkaProducer(
+                bootstrap_servers=KAFKA_BOOTSTRAP,
+                acks=1,
+                linger_ms=0,
+            ) if alert_topic else None,
+            topic=alert_topic or None,
+            max_batch=int(os.getenv("WATCHLIST_ALERT_MAX_BATCH", "50")),
+        )
+        alerts.start()
+
+    # Sliding-window counts per zip_code / emp_title / addr_state (VELOCITY_*)
+    velocity = VelocityTracker.from_env(os.getenv)
+    if velocity is not None:
+        print(f"✅ Velocity features: {', '.join(velocity.feature_names)} ({velocity.memory_bytes / 1e6:.1f} MB)")
+
+    # Windowed tier/purpose/feature aggregates exported as gauges (WINDOW_AGG_*)
+    # closed minutes go to risk_rollups_1m from their own thread, off the poll loop
+    rollup_writer: Optional[RollupWriter] = None
+    if os.getenv("WINDOW_AGG_ROLLUPS", "false").lower() == "true":
+        rollup_writer = RollupWriter(pg_connect)
+        rollup_writer.start()
+    aggregates = WindowedAggregates.from_env(
+        os.getenv, on_rollup=rollup_writer.submit if rollup_writer is not None else None
+    )
+    agg_export_every = float(os.getenv("WINDOW_AGG_EXPORT_SECONDS", "10"))
+    last_export = time.time()
+
+    # Scored decisions fan-out topic (DECISIONS_TOPIC), keyed by loan_id
+    publisher = DecisionPublisher.from_env(KAFKA_BOOTSTRAP, source="consumer")
+    if publisher is not None:
+        print(f"✅ Publishing decisions to topic '{publisher.topic}'")
 
-    processed = 0
     skipped = 0
     last_log = time.time()
 
     print(f"✅ Consumer connected. Topic='{KAFKA_TOPIC}' bootstrap='{KAFKA_BOOTSTRAP}'")
-    print(f"✅ Postgres connected. db='{PG_DB}' host='{PG_HOST}:{PG_PORT}' user='{PG_USER}'")
+    print(f"✅ Postgres writer started. db='{PG_DB}' host='{PG_HOST}:{PG_PORT}' user='{PG_USER}'")
+
+    # Duplicate suppression (replays / redelivery / producer retries)
+    dedup_enabled = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+    dedup_checkpoint_every = float(os.getenv("DEDUP_CHECKPOINT_SECONDS", "60"))
+    seen_ids: Optional[RecentIdFilter] = None
+    if dedup_enabled:
+        seen_ids = RecentIdFilter(
+            capacity=int(os.getenv("DEDUP_CAPACITY", "1000000")),
+            fp_rate=float(os.getenv("DEDUP_FP_RATE", "1e-6")),
+            checkpoint_path=os.getenv("DEDUP_CHECKPOINT_PATH", "tmp/dedup/seen_loan_ids.bin"),
+        )
+    last_checkpoint = time.time()
+
+    def remember_written() -> None:
+        # ids enter the filter only once their rows are committed, so rows that
+        # are skipped, fail or are lost in flight are still accepted on redelivery
+        while durable_ids:
+            loan_id = durable_ids.popleft()
+            if seen_ids is not None and not loan_id.startswith(GENERATED_ID_PREFIX):
+                seen_ids.add(loan_id)
+
+    print(f"✅ Write mode: {'upsert on loan_id' if PG_UPSERT else 'insert'} dedup_filter={dedup_enabled}")
 
     # Raw Event Sink Setup
     raw_enabled = os.getenv("RAW_EVENTS_TO_S3", "false").lower() == "true"
     raw_prefix = os.getenv("RAW_EVENTS_PREFIX", "raw_events")
     raw_flush = int(os.getenv("RAW_EVENTS_FLUSH_EVERY", "500"))
     raw_dir = os.getenv("RAW_EVENTS_LOCAL_DIR", "tmp/raw_events")
+    raw_format = os.getenv("RAW_EVENTS_FORMAT", "jsonl")  # jsonl | jsonl.gz | jsonl.zst | parquet
+    raw_max_bytes = int(os.getenv("RAW_EVENTS_MAX_BYTES", str(64 * 1024 * 1024)))
+    raw_max_age = float(os.getenv("RAW_EVENTS_MAX_AGE_SECONDS", "300"))
 
     raw_sink = RawEventSink(
         enabled=raw_enabled,
         s3_prefix=raw_prefix,
         flush_every=raw_flush,
         local_dir=raw_dir,
+        max_upload_backlog=int(os.getenv("RAW_EVENTS_UPLOAD_BACKLOG", "100")),
+        upload_retries=int(os.getenv("RAW_EVENTS_UPLOAD_RETRIES", "5")),
+        fmt=raw_format,
+        max_bytes=raw_max_bytes,
+        max_age_s=raw_max_age,
+        parquet_row_group=int(os.getenv("RAW_EVENTS_PARQUET_ROW_GROUP", "10000")),
+        durability=os.getenv("RAW_EVENTS_DURABILITY", "rotation"),  # none | interval | rotation
+        fsync_interval_ms=int(os.getenv("RAW_EVENTS_FSYNC_INTERVAL_MS", "50")),
+        manifest=os.getenv("RAW_EVENTS_MANIFEST", "true").lower() == "true",
     )
 
+    pending: list[Dict[str, Any]] = []
+    batch_started = time.time()
+    lag = 0.0
+    paused = False
+
     try:
         while True:
-            got_any = False
-            for msg in consumer:
-                t0 = time.time()
-                got_any = True
-                event = msg.value  # dict
-                
-                # Archive raw event
-                raw_sink.append(event)
-                
-                loan_id = normalize_event_id(event)
-
-                features = preprocess_event(event)
-                ok, missing = validate_required_features(features)
-                if not ok:
-                    skipped += 1
-                    CONSUMER_EVENTS_TOTAL.labels(status="skipped").inc()
-                    CONSUMER_PROCESSING_LATENCY.observe(time.time() - t0)
-                    continue
-
-                decision = apply_rules(features)
-
-                # Prepare row and convert numpy types to native Python types
-                row = {
-                    "loan_id": loan_id,
-                    "purpose": features.get("purpose"),
-                    "term": features.get("term"),
-                    "loan_amnt": float(features.get("loan_amnt")) if pd.notna(features.get("loan_amnt")) else None,
-                    "annual_inc": float(features.get("annual_inc")) if pd.notna(features.get("annual_inc")) else None,
-                    "dti": float(features.get("dti")) if pd.notna(features.get("dti")) else None,
-                    "int_rate_pct": float(features.get("int_rate_pct")) if pd.notna(features.get("int_rate_pct")) else None,
-                    "revol_util_pct": float(features.get("revol_util_pct")) if pd.notna(features.get("revol_util_pct")) else None,
-                    "delinq_2yrs": int(features.get("delinq_2yrs")) if pd.notna(features.get("delinq_2yrs")) else None,
-                    "inq_last_6mths": int(features.get("inq_last_6mths")) if pd.notna(features.get("inq_last_6mths")) else None,
-                    "credit_history_years": float(features.get("credit_history_years")) if pd.notna(features.get("credit_history_years")) else None,
-                    "emp_length_yrs": float(features.get("emp_length_yrs")) if pd.notna(features.get("emp_length_yrs")) else None,
-                    "dti_band": decision.get("dti_band"),
-                    "util_band": decision.get("util_band"),
-                    "rate_band": decision.get("rate_band"),
-                    "early_warning_flag": decision.get("early_warning_flag"),
-                    "risk_tier": decision.get("risk_tier"),
-                    "reasons": ",".join(decision.get("reasons", [])),
-                }
-
-                try:
-                    cur.execute(INSERT_SQL, row)
-                    processed += 1
-
-                    # commit in batches for speed
-                    if processed % 200 == 0:
-                        conn.commit()
-                    
-                    CONSUMER_EVENTS_TOTAL.labels(status="ok").inc()
-                    CONSUMER_LAST_EVENT_TS.set(time.time())
-
-                except Exception as e:
-                    conn.rollback()
-                    skipped += 1
-                    # keep going; streaming should be resilient
-                    print(f"⚠️ Insert failed for loan_id={loan_id}: {e}")
-                    CONSUMER_EVENTS_TOTAL.labels(status="db_error").inc()
-                finally:
-                    CONSUMER_PROCESSING_LATENCY.observe(time.time() - t0)
+            # poll() waits at most one linger period, so partial batches still flush when idle
+            records = consumer.poll(
+                timeout_ms=int(controller.linger_s * 1000),
+                max_records=controller.poll_size,
+            )
+            for msgs in records.values():
+                for msg in msgs:
+                    t0 = time.time()
                     if msg.timestamp:
-                        lag = time.time() - (msg.timestamp / 1000.0)
+                        lag = t0 - (msg.timestamp / 1000.0)
                         CONSUMER_LAG_SECONDS.set(lag)
 
-                # periodic log
-                now = time.time()
-                if now - last_log > 3:
-                    print(f"📥 processed={processed} skipped={skipped}")
-                    last_log = now
-
-            # if we timed out (no messages), commit any pending and keep looping
-            if not got_any:
-                if processed % 200 != 0:
-                    conn.commit()
-                time.sleep(0.5)
+                    # Decoder per message: old (JSON) and new (compact) producers can share the topic
+                    version = wire_version(msg.headers)
+                    if version not in SUPPORTED_VERSIONS:
+                        CONSUMER_EVENTS_TOTAL.labels(status="unsupported_schema").inc()
+                        continue
+                    try:
+                        event = decode_for_scoring(msg.value, version)
+                        # Archive raw event (full decode only when the archive is enabled)
+                        if raw_sink.enabled:
+                            raw_sink.append(decode_full(msg.value, version))
+                    except DECODE_ERRORS as e:
+                        # one malformed message must not stop the consumer
+                        CONSUMER_EVENTS_TOTAL.labels(status="decode_error").inc()
+                        print(f"⚠️ Undecodable message at {msg.topic}[{msg.partition}]@{msg.offset}: {e}")
+                        continue
+
+                    loan_id = normalize_event_id(event)
+
+                    # Drop ids we have (almost certainly) already written; generated
+                    # evt_ ids are never deduplicated.
+                    has_source_id = event.get("loan_id") is not None or event.get("id") is not None
+                    if seen_ids is not None and has_source_id and seen_ids.seen(loan_id):
+                        CONSUMER_DUPLICATES_TOTAL.labels(stage="filter").inc()
+                        CONSUMER_EVENTS_TOTAL.labels(status="duplicate").inc()
+                        CONSUMER_PROCESSING_LATENCY.observe(time.time() - t0)
+                        continue
+
+                    event_ts = msg.timestamp / 1000.0 if msg.timestamp else t0
+                    row = score_event(event, loan_id, velocity, event_ts)
+                    CONSUMER_PROCESSING_LATENCY.observe(time.time() - t0)
+                    if row is None:
+                        skipped += 1
+                        CONSUMER_EVENTS_TOTAL.labels(status="skipped").inc()
+                        continue
+
+                    if aggregates is not None:
+                        aggregates.add(row, event_ts)
+                    if publisher is not None:
+                        publisher.publish(row)
+
+                    if row["risk_tier"] == "Watchlist":
+                        WATCHLIST_TOTAL.labels(source="consumer").inc()
+                        if alerts is not None:
+                            alerts.submit(row, msg.timestamp / 1000.0 if msg.timestamp else None)
+
+                    if not pending:
+                        batch_started = t0
+                    pending.append(row)
+
+            raw_sink.maybe_rotate()
+
+            now = time.time()
+            if pending and (len(pending) >= controller.batch_size or now - batch_started >= controller.linger_s):
+                writer.submit(pending)
+                pending = []
+                controller.adjust(lag)
+
+            # Backpressure: stop fetching while the writer is behind
+            if writer.saturated and not paused:
+                consumer.pause(*consumer.assignment())
+                paused = True
+                CONSUMER_FETCH_PAUSED.set(1)
+            elif paused and not writer.saturated:
+                consumer.resume(*consumer.paused())
+                paused = False
+                CONSUMER_FETCH_PAUSED.set(0)
+
+            # periodic log
+            if now - last_log > 3:
+                print(
+                    f"📥 processed={writer.written} skipped={skipped} "
+                    f"batch={controller.batch_size} linger={controller.linger_s:.3f}s lag={lag:.2f}s"
+                )
+                last_log = now
+
+            if aggregates is not None and now - last_export > agg_export_every:
+                aggregates.export(now)
+                last_export = now
+
+            remember_written()
+            if seen_ids is not None and now - last_checkpoint > dedup_checkpoint_every:
+                seen_ids.save()
+                last_checkpoint = now
 
     except KeyboardInterrupt:
         print("\n Stopping consumer...")
     finally:
-        try:
-            conn.commit()
-        except Exception:
-            pass
+        lag_monitor.stop()
+        if alerts is not None:
+            alerts.close()
+        writer.submit(pending)
+        writer.close()
+        if aggregates is not None:
+            aggregates.flush_rollup()
+        if rollup_writer is not None:
+            rollup_writer.close()
+        remember_written()
+        if seen_ids is not None:
+            try:
+                seen_ids.save()
+            except Exception as e:
+                print(f"⚠️ Dedup checkpoint failed: {e}")
+        if publisher is not None:
+            publisher.close()
         raw_sink.close()
-        cur.close()
-        conn.close()
         consumer.close()
-        print(f" Final: processed={processed} skipped={skipped}")
+        print(f" Final: processed={writer.written} skipped={skipped + writer.failed}")
 
 
 if __name__ == "__main__":
@@ -3,12 +3,12 @@ from prometheus_client import Counter, Histogram, Gauge
 CONSUMER_EVENTS_TOTAL = Counter(
     "credit_risk_consumer_events_total",
     "Kafka events consumed",
-    ["status"],  # ok, skipped, db_error
+    ["status"],  # ok, skipped, duplicate, db_error, unsupported_schema
 )
 
 CONSUMER_PROCESSING_LATENCY = Histogram(
     "credit_risk_consumer_processing_latency_seconds",
-    "Time to preprocess + rules + DB insert",
+    "Time to decode + preprocess + rules per event (DB writes: flush latency)",
 )
 
 CONSUMER_LAST_EVENT_TS = Gauge(
@@ -20,3 +20,122 @@ CONSUMER_LAG_SECONDS = Gauge(
     "credit_risk_consumer_lag_seconds",
     "End-to-end lag (processing time - kafka timestamp)",
 )
+
+CONSUMER_DUPLICATES_TOTAL = Counter(
+    "credit_risk_consumer_duplicates_total",
+    "Duplicate loan_ids detected",
+    ["stage"],  # filter (dropped before DB), upsert (ON CONFLICT hit)
+)
+
+CONSUMER_FLUSH_LATENCY = Histogram(
+    "credit_risk_consumer_flush_latency_seconds",
+    "Time to write + commit one batch to risk_scored",
+)
+
+CONSUMER_BATCH_SIZE = Gauge(
+    "credit_risk_consumer_batch_size",
+    "Current rows per DB batch (commit interval)",
+)
+
+CONSUMER_POLL_SIZE = Gauge(
+    "credit_risk_consumer_poll_max_records",
+    "Current max records per Kafka poll",
+)
+
+CONSUMER_FLUSH_LINGER_SECONDS = Gauge(
+    "credit_risk_consumer_flush_linger_seconds",
+    "Current max wait before a partial batch is flushed",
+)
+
+CONSUMER_WRITE_QUEUE_DEPTH = Gauge(
+    "credit_risk_consumer_write_queue_depth",
+    "Batches waiting for the DB writer",
+)
+
+CONSUMER_FETCH_PAUSED = Gauge(
+    "credit_risk_consumer_fetch_paused",
+    "1 while fetching is paused because the DB writer is saturated",
+)
+
+CONSUMER_PARTITION_END_OFFSET = Gauge(
+    "credit_risk_consumer_partition_end_offset",
+    "Log end offset per partition",
+    ["topic", "partition"],
+)
+
+CONSUMER_PARTITION_COMMITTED_OFFSET = Gauge(
+    "credit_risk_consumer_partition_committed_offset",
+    "Committed offset of the consumer group per partition (-1 if none)",
+    ["topic", "partition"],
+)
+
+CONSUMER_PARTITION_LAG_MESSAGES = Gauge(
+    "credit_risk_consumer_partition_lag_messages",
+    "Messages waiting per partition (end offset - committed offset)",
+    ["topic", "partition"],
+)
+
+CONSUMER_DRAIN_SECONDS = Gauge(
+    "credit_risk_consumer_estimated_drain_seconds",
+    "Estimated time to drain the backlog at the recent processing rate",
+    ["topic"],
+)
+
+RAW_UPLOAD_LATENCY = Histogram(
+    "credit_risk_raw_upload_latency_seconds",
+    "Time to upload one raw event file to S3",
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+
+RAW_UPLOAD_BACKLOG = Gauge(
+    "credit_risk_raw_upload_backlog_files",
+    "Closed raw event files waiting for upload",
+)
+
+RAW_UPLOAD_FAILURES_TOTAL = Counter(
+    "credit_risk_raw_upload_failures_total",
+    "Failed raw event upload attempts",
+)
+
+WATCHLIST_ALERT_LATENCY = Histogram(
+    "credit_risk_watchlist_alert_latency_seconds",
+    "Kafka timestamp to Watchlist alert committed/sent (priority lane)",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+
+WATCHLIST_ALERTS_TOTAL = Counter(
+    "credit_risk_watchlist_alerts_total",
+    "Watchlist alerts emitted by the priority lane",
+    ["sink", "status"],  # sink: table, topic, queue; status: ok, error, dropped
+)
+
+# Sliding-window aggregates of scored rows (streaming/window_aggregates.py)
+WINDOW_TIER_EVENTS = Gauge(
+    "credit_risk_window_tier_events",
+    "Scored events per risk tier over a sliding window",
+    ["window", "risk_tier"],
+)
+
+WINDOW_PURPOSE_EVENTS = Gauge(
+    "credit_risk_window_purpose_events",
+    "Scored events per purpose over a sliding window",
+    ["window", "purpose"],
+)
+
+WINDOW_WATCHLIST_SHARE = Gauge(
+    "credit_risk_window_watchlist_share",
+    "Share of Watchlist decisions per purpose over a sliding window",
+    ["window", "purpose"],
+)
+
+WINDOW_FEATURE_MEAN = Gauge(
+    "credit_risk_window_feature_mean",
+    "Mean of a scored feature over a sliding window",
+    ["window", "feature"],
+)
+
+WINDOW_FEATURE_QUANTILE = Gauge(
+    "credit_risk_window_feature_quantile",
+    "Quantile of a scored feature over a sliding window (fixed-bin histogram, 0.5 resolution)",
+    ["window", "feature", "quantile"],
+)
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import os
+import struct
+from pathlib import Path
+from typing import Optional
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over string keys (double hashing on blake2b).
+    No false negatives; false positive rate ~fp_rate once `capacity` keys are added.
+    """
+    def __init__(self, capacity: int, fp_rate: float, bits: Optional[bytearray] = None, count: int = 0):
+        capacity = max(1, int(capacity))
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.m = max(8, int(math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2))))
+        self.k = max(1, int(round(self.m / capacity * math.log(2))))
+        self.bits = bits if bits is not None else bytearray((self.m + 7) // 8)
+        self.count = count
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        m = self.m
+        return [(h1 + i * h2) % m for i in range(self.k)]
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def add(self, key: str) -> None:
+        bits = self.bits
+        for p in self._positions(key):
+            bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+
+_HEADER = struct.Struct("<4sQdQQ")  # magic, capacity, fp_rate, current count, previous count
+_MAGIC = b"RDF1"
+
+
+class RecentIdFilter:
+    """
+    Remembers roughly the last `capacity`..2*`capacity` loan_ids using two
+    rotating Bloom filters, so memory stays bounded (~2 * capacity * 1.44 * log2(1/fp) bits)
+    while old ids age out. Can be checkpointed to disk and restored on restart.
+    """
+    def __init__(self, capacity: int = 1_000_000, fp_rate: float = 1e-6, checkpoint_path: Optional[str] = None):
+        self.capacity = max(1, int(capacity))
+        self.fp_rate = fp_rate
+        self.checkpoint_path = Path(checkpoint_path) if checkpoint_path else None
+        self._current = BloomFilter(self.capacity, fp_rate)
+        self._previous: Optional[BloomFilter] = None
+
+        if self.checkpoint_path and self.checkpoint_path.exists():
+            try:
+                self.load()
+            except Exception as e:
+                print(f"⚠️ Ignoring unreadable dedup checkpoint {self.checkpoint_path}: {e}")
+
+    def seen(self, key: str) -> bool:
+        if key in self._current:
+            return True
+        return self._previous is not None and key in self._previous
+
+    def add(self, key: str) -> None:
+        if self._current.full:
+            self._previous = self._current
+            self._current = BloomFilter(self.capacity, self.fp_rate)
+        self._current.add(key)
+
+    def check_and_add(self, key: str) -> bool:
+        """Return True if key was (probably) seen before; otherwise remember it."""
+        if self.seen(key):
+            return True
+        self.add(key)
+        return False
+
+    def save(self) -> None:
+        if self.checkpoint_path is None:
+            return
+        self.checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.checkpoint_path.with_suffix(self.checkpoint_path.suffix + ".tmp")
+        prev = self._previous
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, self.capacity, self.fp_rate, self._current.count, prev.count if prev else 0))
+            f.write(self._current.bits)
+            if prev is not None:
+                f.write(prev.bits)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.checkpoint_path)
+
+    def load(self) -> None:
+        assert self.checkpoint_path is not None
+        data = self.checkpoint_path.read_bytes()
+        magic, capacity, fp_rate, cur_count, prev_count = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError("bad magic")
+        if capacity != self.capacity or fp_rate != self.fp_rate:
+            # sizing changed: bit layouts are incompatible, start fresh
+            print("⚠️ Dedup checkpoint sizing changed, starting with an empty filter")
+            return
+        nbytes = len(self._current.bits)
+        offset = _HEADER.size
+        self._current = BloomFilter(capacity, fp_rate, bytearray(data[offset:offset + nbytes]), cur_count)
+        offset += nbytes
+        if len(data) >= offset + nbytes:
+            self._previous = BloomFilter(capacity, fp_rate, bytearray(data[offset:offset + nbytes]), prev_count)
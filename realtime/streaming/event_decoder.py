@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Optional, Sequence, Tuple, Union
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - optional fast path
+    msgspec = None
+
+
+# Raw LendingClub fields read by preprocess_event / normalize_event_id
+# (plus the velocity keys used by streaming/velocity.py).
+# Everything else in the event (~140 columns) is skipped while parsing.
+SCORING_FIELDS = (
+    "id",
+    "loan_id",
+    "loan_amnt",
+    "term",
+    "int_rate",
+    "installment",
+    "purpose",
+    "annual_inc",
+    "dti",
+    "revol_util",
+    "delinq_2yrs",
+    "inq_last_6mths",
+    "open_acc",
+    "total_acc",
+    "emp_length",
+    "earliest_cr_line",
+    "loan_status",
+    "event_time",
+    "zip_code",
+    "emp_title",
+    "addr_state",
+)
+_SCORING_SET = frozenset(SCORING_FIELDS)
+
+# Wire formats of loan_applications payloads, announced in the SCHEMA_HEADER
+# Kafka header. Messages without the header are v1 (one JSON object with every
+# CSV column) so old producers keep working next to new ones.
+SCHEMA_HEADER = "schema-version"
+WIRE_JSON = 1
+WIRE_MSGPACK = 2  # CompactEvent: scoring fields as a MessagePack array + passthrough map
+
+# Values arrive as numbers or strings depending on the producer ("18.55" vs 18.55),
+# preprocess_event coerces both, so the schema only pins the JSON kinds.
+Scalar = Union[float, str, None]
+
+
+if msgspec is not None:
+
+    class ScoringEvent(msgspec.Struct, gc=False):
+        """
+        Compact typed view of one loan_applications event.
+        Exposes .get() so it can be passed anywhere a raw event dict is expected.
+        """
+        id: Union[int, str, None] = None
+        loan_id: Union[int, str, None] = None
+        loan_amnt: Scalar = None
+        term: Scalar = None
+        int_rate: Scalar = None
+        installment: Scalar = None
+        purpose: Scalar = None
+        annual_inc: Scalar = None
+        dti: Scalar = None
+        revol_util: Scalar = None
+        delinq_2yrs: Scalar = None
+        inq_last_6mths: Scalar = None
+        open_acc: Scalar = None
+        total_acc: Scalar = None
+        emp_length: Scalar = None
+        earliest_cr_line: Scalar = None
+        loan_status: Scalar = None
+        event_time: Scalar = None
+        zip_code: Scalar = None
+        emp_title: Scalar = None
+        addr_state: Scalar = None
+
+        def get(self, key: str, default: Any = None) -> Any:
+            return getattr(self, key, default)
+
+    class CompactEvent(ScoringEvent, array_like=True, gc=False):
+        """
+        v2 wire layout: the ScoringEvent fields positionally (no key names on the
+        wire), then `extra`, an embedded MessagePack map of the remaining non-null
+        columns. Decoding for scoring keeps `extra` as an undecoded slice.
+        """
+        extra: msgspec.Raw = msgspec.Raw(b"\x80")
+
+    _projected_decoder = msgspec.json.Decoder(ScoringEvent)
+    _compact_decoder = msgspec.msgpack.Decoder(CompactEvent)
+    _compact_encoder = msgspec.msgpack.Encoder()
+    _DecodeError = (msgspec.DecodeError, msgspec.ValidationError)
+    SUPPORTED_VERSIONS = (WIRE_JSON, WIRE_MSGPACK)
+else:
+    ScoringEvent = None
+    CompactEvent = None
+    _projected_decoder = None
+    _compact_decoder = None
+    _DecodeError = ()
+    SUPPORTED_VERSIONS = (WIRE_JSON,)
+
+# Raised for a malformed payload (msgspec errors, JSONDecodeError and UnicodeDecodeError are ValueErrors)
+DECODE_ERRORS = (*_DecodeError, ValueError)
+
+
+def wire_version(headers: Optional[Sequence[Tuple[str, bytes]]]) -> int:
+    """Schema version from Kafka record headers (v1 JSON when absent)."""
+    for key, value in headers or ():
+        if key == SCHEMA_HEADER:
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                return -1
+    return WIRE_JSON
+
+
+def wire_id(value: Any) -> Any:
+    """Integral float ids as ints and NaN as None (pandas reads an id column with gaps as float64)."""
+    if isinstance(value, float):
+        if value != value:
+            return None
+        if value.is_integer():
+            return int(value)
+    return value
+
+
+def to_compact(event: Dict[str, Any]) -> "CompactEvent":
+    """Event dict -> CompactEvent (scoring fields + non-null passthrough columns)."""
+    if CompactEvent is None:
+        raise RuntimeError("The compact wire format needs msgspec")
+    extra = {k: v for k, v in event.items() if v is not None and k not in _SCORING_SET}
+    fields = {k: event.get(k) for k in SCORING_FIELDS}
+    fields["id"], fields["loan_id"] = wire_id(fields["id"]), wire_id(fields["loan_id"])
+    return CompactEvent(**fields, extra=msgspec.Raw(_compact_encoder.encode(extra)))
+
+
+def encode_compact(event: "CompactEvent") -> bytes:
+    return _compact_encoder.encode(event)
+
+
+def decode_full(payload: bytes, version: int = WIRE_JSON) -> Dict[str, Any]:
+    """
+    Decode the complete event (all columns). Used for the raw archive.
+    v2 events carry only non-null passthrough columns, so nulls are absent.
+    """
+    if version == WIRE_MSGPACK:
+        compact = _compact_decoder.decode(payload)
+        event = {k: getattr(compact, k) for k in SCORING_FIELDS}
+        event.update(msgspec.msgpack.decode(compact.extra))
+        return event
+    event = json.loads(payload.decode("utf-8"))
+    if not isinstance(event, dict):
+        raise ValueError(f"event payload is a JSON {type(event).__name__}, not an object")
+    return event
+
+
+def _project(event: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: event.get(k) for k in SCORING_FIELDS}
+
+
+def decode_for_scoring(payload: bytes, version: int = WIRE_JSON) -> Union["ScoringEvent", Dict[str, Any]]:
+    """
+    Decode only the fields needed for scoring.
+
+    Uses msgspec with the ScoringEvent schema when available (unknown keys are
+    skipped by the parser, no dict is built for them). Payloads that do not fit
+    the schema (NaN tokens, unexpected types) fall back to a full json decode
+    and are projected to the same fields, so scoring behaviour is unchanged.
+    v2 payloads decode straight into CompactEvent.
+    """
+    if version == WIRE_MSGPACK:
+        return _compact_decoder.decode(payload)
+    if _projected_decoder is not None:
+        try:
+            return _projected_decoder.decode(payload)
+        except _DecodeError:
+            pass
+    return _project(decode_full(payload))
+
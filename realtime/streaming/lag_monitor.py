@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from kafka import KafkaConsumer, TopicPartition
+
+from streaming.consumer_metrics import (
+    CONSUMER_DRAIN_SECONDS,
+    CONSUMER_PARTITION_COMMITTED_OFFSET,
+    CONSUMER_PARTITION_END_OFFSET,
+    CONSUMER_PARTITION_LAG_MESSAGES,
+)
+
+
+class PartitionLagMonitor(threading.Thread):
+    """
+    Background thread exporting per-partition offset lag for a consumer group.
+
+    Uses its own KafkaConsumer (never subscribes, so it does not join the group)
+    to read log end offsets and the group's committed offsets every `interval_s`.
+    The processing rate is derived from how fast committed offsets advance, and
+    gives an estimated time to drain the current backlog. Nothing here touches
+    the main consumer, so the hot loop is not slowed down.
+    """
+    def __init__(
+        self,
+        topic: str,
+        group_id: str,
+        bootstrap_servers: str,
+        interval_s: float = 5.0,
+        client_factory: Optional[Callable[[], KafkaConsumer]] = None,
+    ):
+        super().__init__(name="partition-lag-monitor", daemon=True)
+        self.topic = topic
+        self.group_id = group_id
+        self.interval_s = interval_s
+        self._client_factory = client_factory or (lambda: KafkaConsumer(
+            bootstrap_servers=bootstrap_servers,
+            group_id=group_id,
+            enable_auto_commit=False,
+        ))
+        self._stop = threading.Event()
+        self._last_committed_total: Optional[int] = None
+        self._last_refresh: Optional[float] = None
+        self.rate_per_s = 0.0  # EWMA of committed messages/sec
+        self.lag: Dict[int, int] = {}
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def run(self) -> None:
+        client = None
+        while not self._stop.is_set():
+            try:
+                if client is None:
+                    client = self._client_factory()
+                self.refresh(client)
+            except Exception as e:
+                print(f"⚠️ Lag monitor refresh failed: {e}")
+                client = None
+            self._stop.wait(self.interval_s)
+        if client is not None:
+            client.close()
+
+    def refresh(self, client: KafkaConsumer) -> None:
+        partitions = client.partitions_for_topic(self.topic) or set()
+        tps = [TopicPartition(self.topic, p) for p in sorted(partitions)]
+        if not tps:
+            return
+        end_offsets = client.end_offsets(tps)
+
+        committed_total = 0
+        total_lag = 0
+        for tp in tps:
+            end = end_offsets.get(tp, 0)
+            committed = client.committed(tp)
+            # nothing committed yet: everything in the log is still waiting
+            lag = max(0, end - (committed or 0))
+            committed_total += committed or 0
+            total_lag += lag
+            self.lag[tp.partition] = lag
+
+            labels = dict(topic=self.topic, partition=str(tp.partition))
+            CONSUMER_PARTITION_END_OFFSET.labels(**labels).set(end)
+            CONSUMER_PARTITION_COMMITTED_OFFSET.labels(**labels).set(committed if committed is not None else -1)
+            CONSUMER_PARTITION_LAG_MESSAGES.labels(**labels).set(lag)
+
+        now = time.time()
+        if self._last_committed_total is not None and now > self._last_refresh:
+            rate = max(0, committed_total - self._last_committed_total) / (now - self._last_refresh)
+            self.rate_per_s = rate if self.rate_per_s == 0 else 0.7 * self.rate_per_s + 0.3 * rate
+        self._last_committed_total = committed_total
+        self._last_refresh = now
+
+        if total_lag == 0:
+            drain = 0.0
+        elif self.rate_per_s > 0:
+            drain = total_lag / self.rate_per_s
+        else:
+            drain = float("inf")
+        CONSUMER_DRAIN_SECONDS.labels(topic=self.topic).set(drain)
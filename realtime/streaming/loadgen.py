@@ -0,0 +1,370 @@
+# streaming/loadgen.py
+"""
+Synthetic load generator for capacity planning of the consumer (via Kafka) or
+the scoring API (via HTTP), with end-to-end latency measurement.
+
+Events are LendingClub-shaped: either whole rows resampled from a sample
+(`--mode rows`, keeps the joint distribution and therefore the tier mix) or
+every column drawn independently from its empirical distribution
+(`--mode columns`, same marginals, unseen combinations). Each event gets a
+fresh loan_id (lg-<run>-<worker>-<seq>) and a send_ts.
+
+The target rate follows a piecewise-linear profile split evenly across worker
+processes; each worker paces against the integral of the profile, so bursts
+after a stall catch up to the target rather than drifting. Every
+`--sample-every`-th event is remembered and looked up in risk_scored after
+the run: its insert time minus send_ts is the end-to-end latency.
+
+Examples:
+  python streaming/loadgen.py --source data/processed/sample_100k.csv \
+      --profile 0:1000,60:20000,120:20000 --workers 8
+  python streaming/loadgen.py --sink api --api-url http://localhost:8000/score \
+      --rate 300 --ramp-seconds 30 --duration 120 --workers 16
+"""
+from __future__ import annotations
+
+import argparse
+import bisect
+import http.client
+import json
+import multiprocessing as mp
+import os
+import random
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Sequence, Tuple
+from urllib.parse import urlparse
+
+from dotenv import load_dotenv
+load_dotenv()
+
+try:
+    import msgspec
+    _encode = msgspec.json.Encoder().encode
+except ImportError:  # pragma: no cover - optional fast path
+    def _encode(v: Any) -> bytes:
+        return json.dumps(v).encode("utf-8")
+
+# Fields the generator sets itself
+_GENERATED = ("id", "loan_id", "member_id", "event_time", "send_ts")
+
+
+class RateProfile:
+    """Piecewise-linear target rate: [(t_seconds, events_per_second), ...], flat after the last point."""
+    def __init__(self, points: Sequence[Tuple[float, float]]):
+        pts = sorted((float(t), float(r)) for t, r in points)
+        if not pts or pts[0][0] > 0:
+            pts.insert(0, (0.0, pts[0][1] if pts else 0.0))
+        self.points = pts
+        self._t = [t for t, _ in pts]
+        # cumulative events at each breakpoint
+        self._cum = [0.0]
+        for (t0, r0), (t1, r1) in zip(pts, pts[1:]):
+            self._cum.append(self._cum[-1] + (t1 - t0) * (r0 + r1) / 2)
+
+    @classmethod
+    def parse(cls, text: str) -> "RateProfile":
+        points = []
+        for item in text.split(","):
+            t, _, r = item.partition(":")
+            points.append((float(t), float(r)))
+        return cls(points)
+
+    @classmethod
+    def ramp(cls, rate: float, ramp_s: float, duration_s: float) -> "RateProfile":
+        if ramp_s <= 0:
+            return cls([(0, rate), (duration_s, rate)])
+        return cls([(0, 0), (ramp_s, rate), (max(duration_s, ramp_s), rate)])
+
+    @property
+    def duration(self) -> float:
+        return self._t[-1]
+
+    def rate(self, t: float) -> float:
+        i = bisect.bisect_right(self._t, t) - 1
+        if i >= len(self.points) - 1:
+            return self.points[-1][1]
+        (t0, r0), (t1, r1) = self.points[i], self.points[i + 1]
+        return r0 + (r1 - r0) * (t - t0) / (t1 - t0) if t1 > t0 else r1
+
+    def expected(self, t: float) -> float:
+        """Events that should have been sent by time t (integral of the rate)."""
+        i = bisect.bisect_right(self._t, t) - 1
+        if i < 0:
+            return 0.0
+        t0, r0 = self.points[i]
+        return self._cum[i] + (t - t0) * (r0 + self.rate(t)) / 2
+
+
+class EventModel:
+    """Event bodies (open JSON objects, without generated fields) drawn from a sample."""
+    def __init__(self, rows: List[Dict[str, Any]], mode: str = "rows"):
+        if not rows:
+            raise ValueError("Empty sample: nothing to model events on")
+        self.mode = mode
+        rows = [{k: v for k, v in r.items() if k not in _GENERATED} for r in rows]
+        if mode == "rows":
+            self._templates = [_encode(r)[:-1] for r in rows]
+        elif mode == "columns":
+            keys = list(dict.fromkeys(k for r in rows for k in r))
+            self._columns = {k: [r.get(k) for r in rows] for k in keys}
+        else:
+            raise ValueError(f"Unknown mode: {mode}")
+
+    @classmethod
+    def from_source(cls, source: str, limit: int = 20_000, mode: str = "rows", seed: int = 0) -> "EventModel":
+        """Sample rows from a CSV (e.g. sample_100k.csv) or a raw event archive (dir or s3://)."""
+        if source.endswith(".csv"):
+            import pandas as pd
+
+            from streaming.producer import chunk_to_records
+
+            df = pd.read_csv(source, low_memory=False)
+            if len(df) > limit:
+                df = df.sample(n=limit, random_state=seed)
+            return cls(chunk_to_records(df), mode)
+
+        from streaming.event_decoder import decode_full
+        from streaming.replay import iter_raw_lines, list_sources
+
+        rows: List[Dict[str, Any]] = []
+        for path in list_sources(source):
+            rows.extend(decode_full(line) for line in iter_raw_lines(path) if line.strip())
+            if len(rows) >= limit:
+                break
+        return cls(rows[:limit], mode)
+
+    def body(self, rng: random.Random) -> bytes:
+        if self.mode == "rows":
+            return rng.choice(self._templates)
+        return _encode({k: rng.choice(v) for k, v in self._columns.items()})[:-1]
+
+
+def _suffix(loan_id: str, send_ts: float) -> bytes:
+    iso = datetime.fromtimestamp(send_ts, timezone.utc).isoformat()
+    return f',"loan_id":"{loan_id}","send_ts":{send_ts:.6f},"event_time":"{iso}"}}'.encode("ascii")
+
+
+class _KafkaSink:
+    def __init__(self, opts: Dict[str, Any]):
+        from kafka import KafkaProducer
+
+        self.topic = opts["topic"]
+        self._producer = KafkaProducer(
+            bootstrap_servers=opts["bootstrap"],
+            acks=1,
+            linger_ms=5,
+            batch_size=256 * 1024,
+            compression_type=opts.get("compression"),
+        )
+
+    def send(self, loan_id: str, value: bytes) -> None:
+        self._producer.send(self.topic, key=loan_id.encode("ascii"), value=value)
+
+    def close(self) -> None:
+        self._producer.flush()
+        self._producer.close()
+
+
+class _ApiSink:
+    def __init__(self, opts: Dict[str, Any]):
+        url = urlparse(opts["api_url"])
+        self._path = url.path or "/score"
+        self._conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+
+    def send(self, loan_id: str, value: bytes) -> None:
+        body = b'{"persist_to_db":true,"event":' + value + b"}"
+        self._conn.request("POST", self._path, body=body, headers={"Content-Type": "application/json"})
+        resp = self._conn.getresponse()
+        resp.read()
+        if resp.status >= 400:
+            raise RuntimeError(f"HTTP {resp.status}")
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def run_worker(worker: int, opts: Dict[str, Any], model: EventModel, out: "mp.Queue") -> None:
+    """One generator process: paces its share of the profile and reports per-second counts and samples."""
+    profile: RateProfile = opts["profile"]
+    share = 1.0 / opts["workers"]
+    rng = random.Random(opts["seed"] * 1000 + worker)
+    sink = _KafkaSink(opts) if opts["sink"] == "kafka" else _ApiSink(opts)
+    per_second: Dict[int, int] = defaultdict(int)
+    samples: List[Tuple[str, float]] = []
+    errors = 0
+    sent = 0
+    prefix = f"lg-{opts['run_id']}-{worker}-"
+    start = opts["start_at"]
+    time.sleep(max(0.0, start - time.time()))
+    try:
+        while True:
+            elapsed = time.time() - start
+            if elapsed >= profile.duration:
+                break
+            due = int(profile.expected(elapsed) * share) - sent
+            if due <= 0:
+                time.sleep(0.001)
+                continue
+            for _ in range(due):
+                send_ts = time.time()
+                loan_id = f"{prefix}{sent}"
+                try:
+                    sink.send(loan_id, model.body(rng) + _suffix(loan_id, send_ts))
+                except Exception:
+                    errors += 1
+                sent += 1
+                per_second[int(send_ts - start)] += 1
+                if sent % opts["sample_every"] == 0:
+                    samples.append((loan_id, send_ts))
+    finally:
+        sink.close()
+    out.put({"worker": worker, "per_second": dict(per_second), "samples": samples, "errors": errors, "sent": sent})
+
+
+def _percentiles(values: List[float], qs=(50, 90, 99)) -> Dict[str, float]:
+    if not values:
+        return {}
+    values = sorted(values)
+    out = {f"p{q}": values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))] for q in qs}
+    out["max"] = values[-1]
+    return out
+
+
+def measure_e2e(samples: List[Tuple[str, float]], run_start: float, timeout_s: float) -> Dict[str, float]:
+    """Insert time in risk_scored minus send_ts for each sampled loan_id, polling until found or timeout."""
+    from app.api.db import get_conn
+
+    pending = dict(samples)
+    found: Dict[str, float] = {}
+    deadline = time.time() + timeout_s
+    conn = get_conn()
+    try:
+        while pending and time.time() < deadline:
+            ids = list(pending)
+            with conn.cursor() as cur:
+                for i in range(0, len(ids), 5000):
+                    cur.execute(
+                        "SELECT loan_id, EXTRACT(EPOCH FROM event_time) FROM risk_scored "
+                        "WHERE event_time >= to_timestamp(%s) AND loan_id = ANY(%s)",
+                        (run_start - 5, ids[i:i + 5000]),
+                    )
+                    for loan_id, inserted in cur.fetchall():
+                        if loan_id in pending:
+                            found[loan_id] = float(inserted) - pending.pop(loan_id)
+            conn.commit()
+            if pending:
+                time.sleep(1.0)
+    finally:
+        conn.close()
+    return found
+
+
+def report(results: List[Dict[str, Any]], profile: RateProfile, latencies: Dict[str, float],
+           sampled: List[Tuple[str, float]], start: float, bucket_s: int) -> Dict[str, Any]:
+    per_second: Dict[int, int] = defaultdict(int)
+    for r in results:
+        for sec, n in r["per_second"].items():
+            per_second[int(sec)] += n
+    sent = sum(r["sent"] for r in results)
+    errors = sum(r["errors"] for r in results)
+    sent_at = dict(sampled)
+
+    print(f"\n{'window':>10} {'target eps':>11} {'achieved':>9} {'e2e p50':>9} {'e2e p99':>9} {'found':>7}")
+    windows = []
+    for w0 in range(0, int(profile.duration + 0.999), bucket_s):
+        w1 = min(w0 + bucket_s, profile.duration)
+        target = (profile.expected(w1) - profile.expected(w0)) / max(w1 - w0, 1e-9)
+        achieved = sum(per_second.get(s, 0) for s in range(w0, w0 + bucket_s)) / max(w1 - w0, 1e-9)
+        lat = [latencies[i] for i, ts in sent_at.items() if i in latencies and w0 <= ts - start < w0 + bucket_s]
+        n_sampled = sum(1 for ts in sent_at.values() if w0 <= ts - start < w0 + bucket_s)
+        pct = _percentiles(lat)
+        windows.append({"start_s": w0, "target_eps": target, "achieved_eps": achieved,
+                        "e2e": pct, "found": len(lat), "sampled": n_sampled})
+        print(f"{f'{w0}-{int(w1)}s':>10} {target:>11.0f} {achieved:>9.0f} "
+              f"{pct.get('p50', float('nan')):>8.3f}s {pct.get('p99', float('nan')):>8.3f}s "
+              f"{len(lat):>3}/{n_sampled:<3}")
+
+    overall = _percentiles(list(latencies.values()))
+    summary = {
+        "sent": sent,
+        "errors": errors,
+        "achieved_eps": sent / max(profile.duration, 1e-9),
+        "e2e": overall,
+        "sampled": len(sampled),
+        "found": len(latencies),
+        "windows": windows,
+    }
+    print(f"\n🏁 sent={sent} errors={errors} achieved={summary['achieved_eps']:.0f} eps "
+          f"e2e {' '.join(f'{k}={v:.3f}s' for k, v in overall.items())} "
+          f"({len(latencies)}/{len(sampled)} sampled rows found in risk_scored; "
+          f"the rest were skipped by validation, failed or are still in flight)")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-process synthetic load generator with end-to-end latency.")
+    parser.add_argument("--source", default="data/processed/sample_100k.csv",
+                        help="Sample to model events on: CSV or raw archive (dir / s3://bucket/prefix)")
+    parser.add_argument("--mode", default="rows", choices=["rows", "columns"],
+                        help="rows: resample whole rows; columns: sample each column independently")
+    parser.add_argument("--sample-size", type=int, default=20_000, help="Rows loaded from the source")
+    parser.add_argument("--sink", default="kafka", choices=["kafka", "api"])
+    parser.add_argument("--bootstrap", default=os.getenv("KAFKA_BOOTSTRAP", "localhost:9092"))
+    parser.add_argument("--topic", default=os.getenv("KAFKA_TOPIC", "loan_applications"))
+    parser.add_argument("--compression", default=None, help="Kafka compression: gzip | snappy | lz4 | zstd")
+    parser.add_argument("--api-url", default="http://localhost:8000/score")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Generator processes")
+    parser.add_argument("--rate", type=float, default=1000.0, help="Target events/s (all workers)")
+    parser.add_argument("--ramp-seconds", type=float, default=0.0, help="Linear ramp from 0 to --rate")
+    parser.add_argument("--duration", type=float, default=60.0, help="Run length in seconds")
+    parser.add_argument("--profile", help="Piecewise-linear profile 't:eps,...' (overrides --rate/--ramp/--duration)")
+    parser.add_argument("--sample-every", type=int, default=100, help="Track e2e latency for every Nth event")
+    parser.add_argument("--drain-timeout", type=float, default=60.0,
+                        help="Max seconds to wait for sampled rows to reach risk_scored (0 = skip)")
+    parser.add_argument("--window", type=int, default=10, help="Report window in seconds")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--report", help="Write the summary as JSON to this path")
+    args = parser.parse_args()
+
+    profile = RateProfile.parse(args.profile) if args.profile else \
+        RateProfile.ramp(args.rate, args.ramp_seconds, args.duration)
+    model = EventModel.from_source(args.source, args.sample_size, args.mode, args.seed)
+    run_id = uuid.uuid4().hex[:8]
+    start = time.time() + 2.0  # let every worker connect before the clock starts
+    opts = {
+        "profile": profile, "workers": max(1, args.workers), "seed": args.seed, "run_id": run_id,
+        "sink": args.sink, "bootstrap": args.bootstrap, "topic": args.topic, "compression": args.compression,
+        "api_url": args.api_url, "sample_every": max(1, args.sample_every), "start_at": start,
+    }
+    print(f"🚀 Load run {run_id}: {opts['workers']} workers -> {args.sink}, "
+          f"{profile.expected(profile.duration):.0f} events over {profile.duration:.0f}s (peak {max(r for _, r in profile.points):.0f} eps)")
+
+    out: "mp.Queue" = mp.Queue()
+    procs = [mp.Process(target=run_worker, args=(w, opts, model, out)) for w in range(opts["workers"])]
+    for p in procs:
+        p.start()
+    results = [out.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    sampled = [s for r in results for s in r["samples"]]
+    latencies: Dict[str, float] = {}
+    if args.drain_timeout > 0 and sampled:
+        print(f"⏳ Waiting up to {args.drain_timeout:.0f}s for {len(sampled)} sampled rows in risk_scored...")
+        try:
+            latencies = measure_e2e(sampled, start, args.drain_timeout)
+        except Exception as e:
+            print(f"⚠️ Could not measure end-to-end latency: {e}")
+
+    summary = report(results, profile, latencies, sampled, start, max(1, args.window))
+    summary["run_id"] = run_id
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,83 +4,220 @@ from __future__ import annotations
 import json
 import time
 import argparse
-from typing import Optional
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 import pandas as pd
 from kafka import KafkaProducer
 
+from streaming.event_decoder import SCHEMA_HEADER, WIRE_MSGPACK, encode_compact, to_compact
 
-def build_producer(bootstrap_servers: str) -> KafkaProducer:
+try:
+    import msgspec
+    _encode = msgspec.json.Encoder().encode
+except ImportError:  # pragma: no cover - optional fast path
+    msgspec = None
+
+    def _encode(v: Any) -> bytes:
+        return json.dumps(v).encode("utf-8")
+
+
+def build_producer(bootstrap_servers: str, compression: Optional[str] = None) -> KafkaProducer:
+    # values arrive pre-encoded (see encode_chunk)
     return KafkaProducer(
         bootstrap_servers=bootstrap_servers,
-        value_serializer=lambda v: json.dumps(v).encode("utf-8"),
         key_serializer=lambda k: (k.encode("utf-8") if isinstance(k, str) else k),
         acks="all",
         linger_ms=10,
+        batch_size=256 * 1024,
+        compression_type=compression,
         retries=5,
     )
 
 
+class TokenBucket:
+    """
+    Paces sends to `rate` events/s. Tokens accrue continuously (up to `burst`,
+    default one second of events) and acquire(n) sleeps only for the shortfall,
+    so the long-run rate is exact regardless of per-send overhead, sleep
+    granularity or pauses such as reading the next CSV chunk.
+    `clock` and `sleep` can be replaced (tests).
+    """
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[float] = None,
+        clock: Callable[[], float] = time.perf_counter,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.burst
+        self._last = clock()
+
+    def acquire(self, n: int = 1) -> None:
+        if self.rate <= 0:
+            return
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        self._tokens -= n
+        if self._tokens < 0:
+            self._sleep(-self._tokens / self.rate)
+
+
+def chunk_to_records(chunk: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    DataFrame chunk -> list of event dicts with native Python values.
+    Conversion is per column (NaN -> None only where a column has NaNs);
+    no per-row pandas calls.
+    """
+    columns = list(chunk.columns)
+    values = []
+    for col in columns:
+        s = chunk[col]
+        mask = s.isna()
+        if not mask.any():
+            values.append(s.tolist())
+        elif mask.all():
+            values.append([None] * len(s))
+        else:
+            values.append(s.astype(object).where(~mask, None).tolist())
+    return [dict(zip(columns, row)) for row in zip(*values)]
+
+
+def encode_chunk(chunk: pd.DataFrame, offset: int = 0, wire_format: str = "json") -> Tuple[List[str], List[Any]]:
+    """
+    Keys and payloads for one chunk.
+
+    json: each payload is left open (no closing brace) so the send loop can
+    append event_time at send time as plain bytes.
+    msgpack: CompactEvent objects; the send loop sets event_time and encodes.
+    """
+    if "id" not in chunk.columns and "loan_id" not in chunk.columns:
+        # Make sure there is some stable ID. If your CSV doesn't have id, we create one.
+        chunk = chunk.assign(loan_id=[f"loan_{i}" for i in range(offset, offset + len(chunk))])
+    id_col = "id" if "id" in chunk.columns else "loan_id"
+    keys = [str(k) if k is not None else "" for k in chunk[id_col].astype(object).where(chunk[id_col].notna(), None)]
+    if wire_format == "msgpack":
+        return keys, [to_compact(event) for event in chunk_to_records(chunk)]
+    payloads = [_encode(event)[:-1] for event in chunk_to_records(chunk)]
+    return keys, payloads
+
+
+def iter_encoded(
+    csv_path: str, chunksize: int = 10_000, workers: int = 1, wire_format: str = "json"
+) -> Iterator[Tuple[List[str], List[Any]]]:
+    """
+    Encoded chunks in file order. With workers > 1 the record conversion and
+    JSON encoding run in a process pool (a few chunks ahead of the sender).
+    """
+    reader = pd.read_csv(csv_path, chunksize=chunksize, low_memory=False)
+    if workers <= 1:
+        offset = 0
+        for chunk in reader:
+            yield encode_chunk(chunk, offset, wire_format)
+            offset += len(chunk)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        window: deque = deque()
+        offset = 0
+        for chunk in reader:
+            window.append(pool.submit(encode_chunk, chunk, offset, wire_format))
+            offset += len(chunk)
+            if len(window) >= 2 * workers:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+
+
+class _UtcClock:
+    """event_time (`iso()`) or the `,"event_time":"<iso>"}` suffix for an open payload, re-rendered at most once per millisecond."""
+    def __init__(self):
+        self._ms = -1
+        self._iso = ""
+        self._suffix = b""
+
+    def _tick(self) -> None:
+        t = time.time()
+        ms = int(t * 1000)
+        if ms != self._ms:
+            self._ms = ms
+            self._iso = datetime.fromtimestamp(t, timezone.utc).isoformat()
+            self._suffix = f',"event_time":"{self._iso}"}}'.encode("ascii")
+
+    def iso(self) -> str:
+        self._tick()
+        return self._iso
+
+    def suffix(self) -> bytes:
+        self._tick()
+        return self._suffix
+
+
 def main():
     parser = argparse.ArgumentParser(description="Replay LendingClub rows into Kafka as JSON events.")
     parser.add_argument("--bootstrap", default="localhost:9092", help="Kafka bootstrap servers")
     parser.add_argument("--topic", default="loan_applications", help="Kafka topic name")
     parser.add_argument("--csv", default="data/processed/sample_100k.csv", help="Path to input CSV")
-    parser.add_argument("--rate", type=float, default=10.0, help="Events per second (approx)")
+    parser.add_argument("--rate", type=float, default=10.0, help="Events per second (0 = as fast as possible)")
     parser.add_argument("--max", type=int, default=0, help="Max events to send (0 = all)")
     parser.add_argument("--sleep", type=float, default=0.0, help="Extra sleep per event (seconds)")
+    parser.add_argument("--chunksize", type=int, default=10_000, help="CSV rows read per chunk")
+    parser.add_argument("--workers", type=int, default=1, help="Processes converting/encoding CSV chunks")
+    parser.add_argument("--compression", default=None, help="Kafka compression: gzip | snappy | lz4 | zstd")
+    parser.add_argument("--wire-format", default="json", choices=["json", "msgpack"],
+                        help="json: every CSV column (v1); msgpack: scoring fields + passthrough map (v2, schema-version header)")
+    parser.add_argument("--dry-run", action="store_true", help="Build and serialize events without sending")
     args = parser.parse_args()
 
-    df = pd.read_csv(args.csv)
-
-    # Make sure there is some stable ID. If your CSV doesn't have id, we create one.
-    if "id" not in df.columns and "loan_id" not in df.columns:
-        df["loan_id"] = [f"loan_{i}" for i in range(len(df))]
-        id_col = "loan_id"
-    else:
-        id_col = "id" if "id" in df.columns else "loan_id"
-
-    producer = build_producer(args.bootstrap)
-
-    # pacing
-    per_event_delay = 1.0 / args.rate if args.rate > 0 else 0.0
+    producer = None if args.dry_run else build_producer(args.bootstrap, args.compression)
+    bucket = TokenBucket(args.rate)
+    clock = _UtcClock()
+    compact = args.wire_format == "msgpack"
+    headers = [(SCHEMA_HEADER, str(WIRE_MSGPACK).encode("ascii"))] if compact else None
+    sent_bytes = 0
 
     sent = 0
     started = time.time()
 
-    for _, row in df.iterrows():
-        event = row.to_dict()
-
-        # Normalize NaNs to None so JSON is clean
-        for k, v in list(event.items()):
-            if pd.isna(v):
-                event[k] = None
-
-        # add event_time for monitoring + ordering
-        event["event_time"] = pd.Timestamp.utcnow().isoformat()
-
-        key = str(event.get(id_col, ""))
-
-        producer.send(args.topic, key=key, value=event)
-        sent += 1
-
-        # flush periodically for demo stability
-        if sent % 200 == 0:
-            producer.flush()
-
-        if args.sleep > 0:
-            time.sleep(args.sleep)
-        elif per_event_delay > 0:
-            time.sleep(per_event_delay)
+    for keys, payloads in iter_encoded(args.csv, args.chunksize, args.workers, args.wire_format):
+        if args.max:
+            keys, payloads = keys[: args.max - sent], payloads[: args.max - sent]
+        for key, payload in zip(keys, payloads):
+            bucket.acquire()
+
+            # add event_time for monitoring + ordering
+            if compact:
+                payload.event_time = clock.iso()
+                value = encode_compact(payload)
+            else:
+                value = payload + clock.suffix()
+            if producer is not None:
+                producer.send(args.topic, key=key, value=value, headers=headers)
+            sent += 1
+            sent_bytes += len(value)
+
+            if args.sleep > 0:
+                time.sleep(args.sleep)
 
         if args.max and sent >= args.max:
             break
 
-    producer.flush()
+    if producer is not None:
+        producer.flush()
     elapsed = time.time() - started
-    print(f"✅ Sent {sent} events to topic '{args.topic}' in {elapsed:.2f}s (~{sent/elapsed:.1f} eps)")
+    print(
+        f"✅ Sent {sent} events to topic '{args.topic}' in {elapsed:.2f}s (~{sent/elapsed:.1f} eps, "
+        f"{sent_bytes / max(sent, 1):.0f} B/event before compression)"
+    )
 
-    producer.close()
+    if producer is not None:
+        producer.close()
 
 
 if __name__ == "__main__":
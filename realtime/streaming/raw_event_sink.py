@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import os
-import json
+import threading
 import time
 from pathlib import Path
 from datetime import datetime, timezone
@@ -10,7 +10,9 @@ from typing import Any, Dict, Optional
 from dotenv import load_dotenv
 load_dotenv()
 
-from app.storage.s3 import upload_file
+from streaming import archive_manifest
+from streaming.archive_format import FORMATS, open_writer
+from streaming.raw_uploader import BackgroundUploader
 
 
 def _utc_parts():
@@ -18,10 +20,28 @@ def _utc_parts():
     return now, f"{now:%Y/%m/%d}"
 
 
+DURABILITY_MODES = ("none", "interval", "rotation")
+
+
 class RawEventSink:
     """
-    Buffers events to a local JSONL file and periodically uploads to S3,
-    then rotates to a new file. Safe and simple.
+    Buffers events to a local archive file and rotates it when it reaches
+    `flush_every` events, `max_bytes` on disk or `max_age_s` seconds, whichever
+    comes first. Files can be plain, gzip or zstd JSON lines, or Parquet
+    (see archive_format). Closed files move to `<local_dir>/pending` and a
+    BackgroundUploader ships them to S3, so slow uploads never block the
+    consumer loop.
+
+    With `manifest=True` every closed file gets a manifest entry (rows, bytes,
+    min/max event_time, loan_id Bloom filter) in <local_dir>/_manifest/manifest.jsonl
+    and as a sidecar uploaded under <s3_prefix>/_manifest/, see archive_lookup.
+
+    Durability (when written events survive a crash):
+      - "none":     never fsync; the OS writes back on its own schedule.
+      - "interval": group commit, a background thread flushes + fsyncs the open
+                    file every `fsync_interval_ms`, amortising one fsync over
+                    every event appended in that window.
+      - "rotation": fsync once per closed file (previous behaviour).
     """
     def __init__(
         self,
@@ -29,73 +49,189 @@ class RawEventSink:
         s3_prefix: str = "raw_events",
         flush_every: int = 500,
         local_dir: str = "tmp/raw_events",
+        max_upload_backlog: int = 100,
+        upload_retries: int = 5,
+        fmt: str = "jsonl",
+        max_bytes: int = 0,
+        max_age_s: float = 0,
+        parquet_row_group: int = 10_000,
+        durability: str = "rotation",
+        fsync_interval_ms: int = 50,
+        upload: bool = True,
+        manifest: bool = True,
     ):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown raw events format {fmt!r}; expected one of {sorted(FORMATS)}")
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability {durability!r}; expected one of {DURABILITY_MODES}")
         self.enabled = enabled
         self.s3_prefix = s3_prefix
         self.flush_every = max(1, int(flush_every))
+        self.fmt = fmt
+        self.max_bytes = int(max_bytes)
+        self.max_age_s = float(max_age_s)
+        self.parquet_row_group = parquet_row_group
+        self.durability = durability
+        self.fsync_interval_s = max(1, int(fsync_interval_ms)) / 1000.0
+        self.manifest = manifest
         self.local_dir = Path(local_dir)
         self.local_dir.mkdir(parents=True, exist_ok=True)
+        self.pending_dir = self.local_dir / "pending"
 
         self._count = 0
-        self._fp: Optional[Any] = None
+        self._opened_at = 0.0
+        self._writer: Optional[Any] = None
+        self._index: Optional[archive_manifest.FileIndex] = None
         self._local_path: Optional[Path] = None
-        
+        self._uploader: Optional[BackgroundUploader] = None
+        # guards the open writer between append() and the group-commit thread
+        self._lock = threading.Lock()
+        self._stop_sync = threading.Event()
+        self._sync_thread: Optional[threading.Thread] = None
+        self.fsyncs = 0
+
+        if self.enabled and upload:
+            self._uploader = BackgroundUploader(
+                self.pending_dir,
+                s3_prefix=s3_prefix,
+                content_type=FORMATS[fmt][1],
+                max_backlog=max_upload_backlog,
+                max_retries=upload_retries,
+            )
+            self._uploader.start()
         if self.enabled:
+            self.pending_dir.mkdir(parents=True, exist_ok=True)
             self._open_new_file()
+            if durability == "interval":
+                self._sync_thread = threading.Thread(target=self._group_commit_loop, name="raw-event-fsync", daemon=True)
+                self._sync_thread.start()
 
     def _open_new_file(self):
         now, date_path = _utc_parts()
         stamp = now.strftime("%H%M%S")
-        fname = f"events_{stamp}_{int(time.time())}.jsonl"
+        ext = FORMATS[self.fmt][0]
+        base = f"events_{stamp}_{int(time.time())}"
+        fname = f"{base}{ext}"
+        n = 0
+        # several rotations within one second must not reuse a name still waiting in pending/
+        while (self.local_dir / fname).exists() or (self.pending_dir / fname).exists():
+            n += 1
+            fname = f"{base}-{n}{ext}"
         self._local_path = self.local_dir / fname
-        self._fp = open(self._local_path, "a", encoding="utf-8")
+        self._writer = open_writer(str(self._local_path), self.fmt, self.parquet_row_group)
+        self._index = archive_manifest.FileIndex(self.flush_every) if self.manifest else None
+        self._opened_at = time.time()
 
     def append(self, event: Dict[str, Any]):
         if not self.enabled:
             return
 
-        assert self._fp is not None
-        self._fp.write(json.dumps(event, ensure_ascii=False) + "\n")
-        self._count += 1
+        with self._lock:
+            self._writer.write(event)
+            if self._index is not None:
+                self._index.add(event)
+            self._count += 1
+            rotate = self._should_rotate()
 
-        if self._count % self.flush_every == 0:
+        if rotate:
             self.flush_and_upload()
 
+    def _should_rotate(self) -> bool:
+        if self._count >= self.flush_every:
+            return True
+        if self.max_bytes and self._writer.size_bytes >= self.max_bytes:
+            return True
+        return bool(self.max_age_s) and self._count > 0 and time.time() - self._opened_at >= self.max_age_s
+
+    def maybe_rotate(self):
+        """Age-based rotation for idle periods (call from the consumer loop)."""
+        if self.enabled and self._writer is not None and self._should_rotate():
+            self.flush_and_upload()
+
+    def _group_commit_loop(self):
+        while not self._stop_sync.wait(self.fsync_interval_s):
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"⚠️ RawEventSink group commit failed: {e}")
+
+    def sync(self):
+        """Make everything appended so far durable (one fsync for the whole group)."""
+        with self._lock:
+            if self._writer is None or self._count == 0:
+                return
+            self._writer.flush()
+            fd = os.dup(self._writer.fileno())
+        # fsync outside the lock so appends are not blocked by the disk;
+        # the dup'ed fd stays valid even if the file is rotated meanwhile
+        try:
+            os.fsync(fd)
+            self.fsyncs += 1
+        finally:
+            os.close(fd)
+
+    def _close_writer(self):
+        # "interval" mode also fsyncs on close: a file handed to the uploader is complete on disk
+        fsync = self.durability != "none"
+        self._writer.close(fsync=fsync)
+        if fsync:
+            self.fsyncs += 1
+
     def flush_and_upload(self):
+        """Close the current file, hand it to the background uploader and rotate."""
         if not self.enabled:
             return
-        if self._fp is None or self._local_path is None:
+        if self._writer is None or self._local_path is None:
             return
 
-        self._fp.flush()
-        os.fsync(self._fp.fileno())
-        self._fp.close()
+        with self._lock:
+            self._close_writer()
+            pending_path = self.pending_dir / self._local_path.name
+            os.replace(self._local_path, pending_path)
+            sidecar = self._write_manifest(pending_path)
 
-        # Upload to S3 using date partitioning
-        now, date_path = _utc_parts()
-        s3_key = f"{self.s3_prefix}/{date_path}/{self._local_path.name}"
-        uri = upload_file(str(self._local_path), s3_key, content_type="application/json")
-        if uri:
-            print(f"☁️ Uploaded raw events: {uri}")
-            # Success - we can remove the local file if we want, 
-            # but let's keep it for now as a local buffer or just move on.
-            # Actually, usually we delete to save space.
-            try:
-                os.remove(self._local_path)
-            except Exception as e:
-                print(f"⚠️ Failed to remove local file {self._local_path}: {e}")
-        else:
-            print(f"❌ Failed to upload raw events to S3: {s3_key}")
+            # Rotate
+            self._count = 0
+            self._open_new_file()
 
-        # Rotate
-        self._count = 0
-        self._open_new_file()
+        self._enqueue(pending_path, sidecar)
+
+    def _write_manifest(self, path: Path) -> Optional[Path]:
+        if self._index is None:
+            return None
+        s3_key = self._uploader.s3_key_for(path) if self._uploader is not None else None
+        entry = self._index.entry(path.name, self.fmt, path.stat().st_size, s3_key)
+        try:
+            archive_manifest.append_local(self.local_dir, entry)
+            return archive_manifest.write_sidecar(self.pending_dir, entry) if self._uploader is not None else None
+        except Exception as e:
+            print(f"⚠️ Failed to write manifest for {path.name}: {e}")
+            return None
+
+    def _enqueue(self, path: Path, sidecar: Optional[Path]):
+        if self._uploader is None:
+            return
+        self._uploader.enqueue(path)
+        if sidecar is not None:
+            self._uploader.enqueue(sidecar)
 
     def close(self):
         if not self.enabled:
             return
-        if self._fp and not self._fp.closed:
+        self._stop_sync.set()
+        if self._sync_thread is not None:
+            self._sync_thread.join()
+        if self._writer is not None:
             try:
-                self.flush_and_upload()
+                self._close_writer()
+                if self._count:
+                    pending_path = self.pending_dir / self._local_path.name
+                    os.replace(self._local_path, pending_path)
+                    self._enqueue(pending_path, self._write_manifest(pending_path))
+                else:
+                    os.remove(self._local_path)
             except Exception as e:
-                print(f"⚠️ RawEventSink final upload failed: {e}")
+                print(f"⚠️ RawEventSink final rotation failed: {e}")
+            self._writer = None
+        if self._uploader is not None:
+            self._uploader.close()
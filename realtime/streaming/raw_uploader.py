@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from app.storage.s3 import upload_file
+from streaming.archive_manifest import MANIFEST_DIR, SIDECAR_SUFFIX
+from streaming.consumer_metrics import (
+    RAW_UPLOAD_BACKLOG,
+    RAW_UPLOAD_FAILURES_TOTAL,
+    RAW_UPLOAD_LATENCY,
+)
+
+
+class BackgroundUploader(threading.Thread):
+    """
+    Uploads closed raw-event files from `pending_dir` to S3 off the consumer thread.
+
+    Files stay in `pending_dir` until their upload succeeds, so anything left
+    there after a crash or a slow shutdown is picked up again on the next start.
+    The in-memory backlog is bounded: enqueue() blocks once `max_backlog`
+    files are waiting, which slows the consumer down instead of filling the disk.
+    """
+    def __init__(
+        self,
+        pending_dir: Path,
+        s3_prefix: str,
+        content_type: str = "application/json",
+        max_backlog: int = 100,
+        max_retries: int = 5,
+        retry_backoff_s: float = 1.0,
+    ):
+        super().__init__(name="raw-event-uploader", daemon=True)
+        self.pending_dir = Path(pending_dir)
+        self.pending_dir.mkdir(parents=True, exist_ok=True)
+        self.s3_prefix = s3_prefix
+        self.content_type = content_type
+        self.max_retries = max(1, int(max_retries))
+        self.retry_backoff_s = retry_backoff_s
+        self._queue: "queue.Queue[Optional[Path]]" = queue.Queue(maxsize=max(1, int(max_backlog)))
+        self._stopping = threading.Event()
+
+        # restart safety: whatever a previous run left behind is uploaded by run()
+        # first. Not queued here: a backlog above max_backlog would block before the thread starts.
+        self._leftovers = sorted(p for p in self.pending_dir.iterdir() if p.is_file() and not p.name.startswith("."))
+        RAW_UPLOAD_BACKLOG.set(self.backlog)
+
+    @property
+    def backlog(self) -> int:
+        return self._queue.qsize() + len(self._leftovers)
+
+    def enqueue(self, path: Path) -> None:
+        if self._queue.full():
+            print(f"⚠️ Raw upload backlog full ({self._queue.maxsize} files); waiting for uploads")
+        self._queue.put(Path(path))
+        RAW_UPLOAD_BACKLOG.set(self.backlog)
+
+    def s3_key_for(self, path: Path) -> str:
+        # Date partition from the file's open time (events_<HHMMSS>_<epoch>...), not upload time
+        try:
+            opened = int(path.name.split("_")[2].split(".")[0].split("-")[0])
+            when = datetime.fromtimestamp(opened, timezone.utc)
+        except (IndexError, ValueError):
+            when = datetime.now(timezone.utc)
+        if path.name.endswith(SIDECAR_SUFFIX):
+            return f"{self.s3_prefix}/{MANIFEST_DIR}/{when:%Y/%m/%d}/{path.name}"
+        return f"{self.s3_prefix}/{when:%Y/%m/%d}/{path.name}"
+
+    def run(self) -> None:
+        while self._leftovers and not self._stopping.is_set():
+            self._upload_or_requeue(self._leftovers.pop(0))
+        while True:
+            path = self._queue.get()
+            RAW_UPLOAD_BACKLOG.set(self.backlog)
+            if path is None:
+                break
+            self._upload_or_requeue(path)
+
+    def _upload_or_requeue(self, path: Path) -> None:
+        if not self._upload_with_retries(path) and not self._stopping.is_set():
+            # leave it on disk and try again after the rest of the backlog
+            try:
+                self._queue.put_nowait(path)
+            except queue.Full:
+                pass
+        RAW_UPLOAD_BACKLOG.set(self.backlog)
+
+    def _upload_with_retries(self, path: Path) -> bool:
+        if not path.exists():
+            return True
+        s3_key = self.s3_key_for(path)
+        for attempt in range(1, self.max_retries + 1):
+            t0 = time.time()
+            content_type = "application/json" if path.name.endswith(SIDECAR_SUFFIX) else self.content_type
+            uri = upload_file(str(path), s3_key, content_type=content_type)
+            if uri:
+                RAW_UPLOAD_LATENCY.observe(time.time() - t0)
+                print(f"☁️ Uploaded raw events: {uri}")
+                try:
+                    os.remove(path)
+                except Exception as e:
+                    print(f"⚠️ Failed to remove local file {path}: {e}")
+                return True
+
+            RAW_UPLOAD_FAILURES_TOTAL.inc()
+            print(f"❌ Failed to upload raw events to S3: {s3_key} (attempt {attempt}/{self.max_retries})")
+            if self._stopping.wait(min(60.0, self.retry_backoff_s * 2 ** (attempt - 1))):
+                break
+        return False
+
+    def close(self, timeout: Optional[float] = 30.0) -> None:
+        """Drain the backlog (up to `timeout`); unfinished files stay in pending_dir."""
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self.join(timeout)
+        self._stopping.set()
+        self.join(1.0)
@@ -0,0 +1,269 @@
+# streaming/replay.py
+"""
+Replay archived raw events (RawEventSink JSONL files) straight into risk_scored,
+bypassing Kafka. Uses the consumer's scoring (score_event, with the same
+velocity features) and bulk write path (BatchWriter), one process per file.
+Velocity windows span files, so with velocity features on (VELOCITY_ENABLED,
+the consumer's default) files are replayed in order in one process through a
+single tracker, timed by each event's event_time; --no-velocity parallelizes.
+
+Examples:
+  python streaming/replay.py --source tmp/raw_events --workers 8
+  python streaming/replay.py --source s3://credit-risk-lake/raw_events \
+      --since 2026-02-14T00:00:00+00:00 --until 2026-02-15T00:00:00+00:00 \
+      --checkpoint tmp/replay/checkpoint.json --upsert
+"""
+from __future__ import annotations
+
+import argparse
+import fnmatch
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app.api.db import PG_UPSERT
+from app.storage import s3
+from streaming.archive_format import format_for_path, iter_archive_lines
+from streaming.batch_writer import BatchWriter
+from streaming.consumer import normalize_event_id, pg_connect, score_event
+from streaming.event_decoder import DECODE_ERRORS, decode_for_scoring
+from streaming.velocity import VelocityTracker
+
+# events_<HHMMSS>_<unix seconds the file was opened>.<ext>
+_FILE_TS = re.compile(r"events_\d{6}_(\d+)")
+
+
+def _parse_ts(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _file_opened_at(name: str) -> Optional[int]:
+    m = _FILE_TS.search(name)
+    return int(m.group(1)) if m else None
+
+
+def list_sources(source: str, pattern: str = "events_*") -> List[str]:
+    """Archive files under a local directory or an s3://bucket/prefix, oldest first."""
+    if source.startswith("s3://"):
+        bucket, _, prefix = source[len("s3://"):].partition("/")
+        files = [f"s3://{bucket}/{key}" for key in s3.list_keys(prefix, bucket=bucket)]
+    else:
+        files = [str(p) for p in Path(source).rglob("*") if p.is_file()]
+    files = [f for f in files if fnmatch.fnmatch(os.path.basename(f), pattern) and _is_archive(f)]
+    return sorted(files, key=lambda f: (_file_opened_at(os.path.basename(f)) or 0, f))
+
+
+def _is_archive(name: str) -> bool:
+    try:
+        format_for_path(name)
+        return True
+    except ValueError:
+        return False
+
+
+def prune_by_time(files: List[str], since: Optional[float], until: Optional[float]) -> List[str]:
+    """
+    Drop files that cannot hold events in [since, until] using the open time in
+    the file name: a file opened after `until` is too new, and a file is too old
+    if the next file was already opened before `since`.
+    """
+    opened = [_file_opened_at(os.path.basename(f)) for f in files]
+    kept = []
+    for i, f in enumerate(files):
+        start = opened[i]
+        nxt = opened[i + 1] if i + 1 < len(opened) else None
+        if until is not None and start is not None and start > until:
+            continue
+        if since is not None and nxt is not None and nxt < since:
+            continue
+        kept.append(f)
+    return kept
+
+
+def iter_raw_lines(source: str) -> Iterator[bytes]:
+    """Events from one archive file in any RawEventSink format (jsonl, .gz, .zst, .parquet)."""
+    if source.startswith("s3://"):
+        bucket, _, key = source[len("s3://"):].partition("/")
+        if format_for_path(key) == "jsonl":
+            yield from s3.iter_lines(key, bucket=bucket)
+            return
+        body = s3.open_object(key, bucket=bucket)
+        try:
+            yield from iter_archive_lines(body, key)
+        finally:
+            body.close()
+        return
+    with open(source, "rb") as f:
+        yield from iter_archive_lines(f, source)
+
+
+def _event_ts(event: Any) -> Optional[float]:
+    try:
+        return _parse_ts(event.get("event_time"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _ts_in_range(ts: Optional[float], since: Optional[float], until: Optional[float]) -> bool:
+    if since is None and until is None:
+        return True
+    if ts is None:
+        return False
+    return (since is None or ts >= since) and (until is None or ts < until)
+
+
+def _in_range(event: Any, since: Optional[float], until: Optional[float]) -> bool:
+    return _ts_in_range(_event_ts(event), since, until)
+
+
+def replay_file(
+    source: str,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    batch_size: int = 2000,
+    upsert: bool = False,
+    dry_run: bool = False,
+    velocity: Optional[VelocityTracker] = None,
+) -> Dict[str, Any]:
+    """Score and write one archive file (in a worker process unless a shared `velocity` tracker is passed)."""
+    writer = None if dry_run else BatchWriter(pg_connect, upsert=upsert)
+    stats = {"source": source, "read": 0, "bad": 0, "out_of_range": 0, "skipped": 0, "written": 0, "failed": 0}
+    batch: List[Dict[str, Any]] = []
+
+    def flush():
+        if writer is not None and batch:
+            ok = writer.write_batch(batch)
+            stats["written"] += ok
+            stats["failed"] += len(batch) - ok
+        elif batch:
+            stats["written"] += len(batch)
+        batch.clear()
+
+    try:
+        for line in iter_raw_lines(source):
+            if not line.strip():
+                continue
+            stats["read"] += 1
+            try:
+                event = decode_for_scoring(line)
+            except DECODE_ERRORS:
+                # a truncated or corrupt line (e.g. the tail of a crashed sink) must not fail the file
+                stats["bad"] += 1
+                continue
+            ts = _event_ts(event)
+            if not _ts_in_range(ts, since, until):
+                stats["out_of_range"] += 1
+                continue
+            row = score_event(event, normalize_event_id(event), velocity, ts)
+            if row is None:
+                stats["skipped"] += 1
+                continue
+            batch.append(row)
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+    finally:
+        if writer is not None:
+            writer.close_connection()
+    return stats
+
+
+class ReplayCheckpoint:
+    """Set of fully replayed files, persisted after every file so a rerun resumes."""
+    def __init__(self, path: Optional[str]):
+        self.path = Path(path) if path else None
+        self.done: set[str] = set()
+        if self.path and self.path.exists():
+            self.done = set(json.loads(self.path.read_text()).get("done", []))
+
+    def mark(self, source: str) -> None:
+        self.done.add(source)
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"done": sorted(self.done)}))
+        os.replace(tmp, self.path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay archived raw events into risk_scored without Kafka.")
+    parser.add_argument("--source", default=os.getenv("RAW_EVENTS_LOCAL_DIR", "tmp/raw_events"),
+                        help="Local archive directory or s3://bucket/prefix")
+    parser.add_argument("--match", default="events_*", help="Filename glob filter")
+    parser.add_argument("--since", help="Only events with event_time >= this ISO timestamp")
+    parser.add_argument("--until", help="Only events with event_time < this ISO timestamp")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Parallel file readers/scorers")
+    parser.add_argument("--batch-size", type=int, default=2000, help="Rows per DB batch")
+    parser.add_argument("--checkpoint", help="Resume file: completed files are recorded and skipped on rerun")
+    parser.add_argument("--upsert", action=argparse.BooleanOptionalAction, default=PG_UPSERT,
+                        help="ON CONFLICT (loan_id) upsert (needs infra/unique_loan_id.sql; default PG_UPSERT)")
+    parser.add_argument("--velocity", action=argparse.BooleanOptionalAction, default=True,
+                        help="Velocity features as in the live consumer (VELOCITY_*); replays files sequentially")
+    parser.add_argument("--dry-run", action="store_true", help="Score only, do not write to Postgres")
+    args = parser.parse_args()
+
+    since, until = _parse_ts(args.since), _parse_ts(args.until)
+    checkpoint = ReplayCheckpoint(args.checkpoint)
+
+    files = prune_by_time(list_sources(args.source, args.match), since, until)
+    todo = [f for f in files if f not in checkpoint.done]
+    print(f"🔁 Replay: {len(files)} files matched, {len(files) - len(todo)} already done, {len(todo)} to go")
+
+    velocity = VelocityTracker.from_env(os.getenv) if args.velocity else None
+    if velocity is not None:
+        print(f"🔁 Velocity features on ({', '.join(velocity.feature_names)}): files replayed in order, one process")
+
+    totals = {"read": 0, "bad": 0, "out_of_range": 0, "skipped": 0, "written": 0, "failed": 0}
+    started = time.time()
+
+    def done(source: str, stats: Dict[str, Any]) -> None:
+        for k in totals:
+            totals[k] += stats[k]
+        checkpoint.mark(source)
+        elapsed = time.time() - started
+        print(f"✅ {source}: written={stats['written']} skipped={stats['skipped']} bad={stats['bad']} "
+              f"(total {totals['written']} rows, ~{totals['read'] / max(elapsed, 1e-9):.0f} eps)")
+
+    if velocity is not None:
+        for source in todo:
+            try:
+                stats = replay_file(source, since, until, args.batch_size, args.upsert, args.dry_run, velocity)
+            except Exception as e:
+                print(f"❌ Replay failed for {source}: {e}")
+                continue
+            done(source, stats)
+    else:
+        with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            futures = {
+                pool.submit(replay_file, f, since, until, args.batch_size, args.upsert, args.dry_run): f
+                for f in todo
+            }
+            for fut in as_completed(futures):
+                source = futures[fut]
+                try:
+                    stats = fut.result()
+                except Exception as e:
+                    print(f"❌ Replay failed for {source}: {e}")
+                    continue
+                done(source, stats)
+
+    elapsed = time.time() - started
+    print(f"🏁 Replay done in {elapsed:.2f}s: {totals}")
+
+
+if __name__ == "__main__":
+    main()
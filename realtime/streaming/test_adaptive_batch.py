@@ -0,0 +1,24 @@
+"""
+Run: cd realtime && python -m pytest streaming
+"""
+from streaming.adaptive_batch import AdaptiveBatchController
+
+
+def test_grows_under_lag_and_shrinks_when_caught_up():
+    c = AdaptiveBatchController(target_latency_s=1.0, min_batch=10, max_batch=1000, initial_batch=100)
+    c.adjust(lag_s=5.0)
+    c.adjust(lag_s=5.0)
+    assert c.batch_size == 400
+    assert c.poll_size == c.batch_size
+
+    for _ in range(20):
+        c.adjust(lag_s=0.1)
+    assert c.batch_size == 10
+    assert c.linger_s == c.min_linger_s
+
+
+def test_write_cost_caps_batch_when_not_lagging():
+    c = AdaptiveBatchController(target_latency_s=1.0, min_batch=1, max_batch=10000, initial_batch=5000)
+    c.observe_flush(rows=1000, seconds=1.0)  # 1ms per row -> 500 rows fit in half the budget
+    c.adjust(lag_s=0.0)
+    assert c.batch_size == 500
@@ -0,0 +1,84 @@
+"""
+Run: cd realtime && python -m pytest streaming
+"""
+import json
+
+from streaming.alert_lane import WatchlistAlertLane
+from streaming.consumer_metrics import WATCHLIST_ALERT_LATENCY
+
+
+class FakeProducer:
+    def __init__(self):
+        self.sent = []
+        self.flushes = 0
+
+    def send(self, topic, key=None, value=None):
+        self.sent.append((topic, key, json.loads(value)))
+
+    def flush(self):
+        self.flushes += 1
+
+
+def _count():
+    return sum(s.value for s in WATCHLIST_ALERT_LATENCY.collect()[0].samples if s.name.endswith("_count"))
+
+
+def test_alerts_are_sent_in_small_groups_with_latency():
+    producer = FakeProducer()
+    lane = WatchlistAlertLane(producer=producer, topic="risk_alerts", max_batch=2)
+    before = _count()
+    for i in range(3):
+        lane.submit({"loan_id": i, "risk_tier": "Watchlist"}, kafka_ts=None)
+    lane.start()
+    lane.close()
+
+    assert [(t, k) for t, k, _ in producer.sent] == [("risk_alerts", b"0"), ("risk_alerts", b"1"), ("risk_alerts", b"2")]
+    assert producer.sent[0][2]["risk_tier"] == "Watchlist"
+    assert producer.flushes >= 2  # one flush per group of max_batch
+    assert lane.sent == 3
+    assert _count() - before == 3
+
+
+class FakeCursor:
+    def __init__(self, executed):
+        self.executed = executed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql):
+        self.executed.append(sql)
+
+
+class FakeConn:
+    def __init__(self, executed):
+        self.executed = executed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self):
+        return FakeCursor(self.executed)
+
+    def close(self):
+        pass
+
+
+def test_table_is_created_at_startup_or_sink_disabled():
+    executed = []
+    lane = WatchlistAlertLane(connect=lambda: FakeConn(executed))
+    assert lane.ensure_table()
+    assert "CREATE TABLE IF NOT EXISTS risk_alerts" in executed[0]
+
+    def refuse():
+        raise RuntimeError("permission denied for schema public")
+
+    lane = WatchlistAlertLane(connect=refuse)
+    assert not lane.ensure_table()
+    assert lane._connect is None  # no per-batch insert errors afterwards
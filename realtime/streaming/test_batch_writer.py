@@ -0,0 +1,46 @@
+"""
+Run: cd realtime && python -m pytest streaming
+"""
+from streaming import batch_writer
+from streaming.batch_writer import BatchWriter
+
+
+class FakeCursor:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeConn:
+    closed = False
+    autocommit = False
+
+    def cursor(self):
+        return FakeCursor()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def test_on_written_gets_only_committed_rows(monkeypatch):
+    def execute_values(cur, sql, rows, **kwargs):
+        if any(r["loan_id"] == "bad" for r in rows):
+            raise ValueError("bad row")
+
+    monkeypatch.setattr(batch_writer, "execute_values", execute_values)
+    written = []
+    writer = BatchWriter(FakeConn, on_written=written.extend)
+
+    assert writer.write_batch([{"loan_id": "a"}, {"loan_id": "b"}]) == 2
+    # the batch fails, the row-by-row retry commits all but the bad row
+    assert writer.write_batch([{"loan_id": "c"}, {"loan_id": "bad"}, {"loan_id": "d"}]) == 2
+    assert [r["loan_id"] for r in written] == ["a", "b", "c", "d"]
+    assert writer.failed == 1
@@ -0,0 +1,36 @@
+"""
+Run: cd realtime && python -m pytest streaming
+"""
+from streaming.dedup import BloomFilter, RecentIdFilter
+
+
+def test_bloom_no_false_negatives():
+    bf = BloomFilter(capacity=1000, fp_rate=1e-4)
+    for i in range(1000):
+        bf.add(f"loan_{i}")
+    assert all(f"loan_{i}" in bf for i in range(1000))
+    false_pos = sum(f"other_{i}" in bf for i in range(10000))
+    assert false_pos < 10
+
+
+def test_recent_filter_rotates_and_forgets():
+    f = RecentIdFilter(capacity=100, fp_rate=1e-6)
+    assert not f.check_and_add("a")
+    assert f.check_and_add("a")
+    for i in range(250):
+        f.add(f"x{i}")
+    # two generations of 100 each: "a" has aged out
+    assert not f.seen("a")
+    assert f.seen("x249")
+
+
+def test_checkpoint_roundtrip(tmp_path):
+    path = tmp_path / "seen.bin"
+    f = RecentIdFilter(capacity=50, fp_rate=1e-6, checkpoint_path=str(path))
+    for i in range(80):
+        f.add(f"id{i}")
+    f.save()
+
+    restored = RecentIdFilter(capacity=50, fp_rate=1e-6, checkpoint_path=str(path))
+    assert all(restored.seen(f"id{i}") for i in range(80))
+    assert not restored.seen("never")
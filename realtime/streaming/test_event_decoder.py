@@ -0,0 +1,105 @@
+"""
+Projected decoder must score exactly like the full json decode.
+
+Run: cd realtime && python -m pytest streaming
+"""
+import json
+import math
+
+import pytest
+
+from app.api.preprocess import preprocess_event
+from streaming.consumer import normalize_event_id
+from streaming.event_decoder import (
+    DECODE_ERRORS,
+    SCHEMA_HEADER,
+    WIRE_JSON,
+    WIRE_MSGPACK,
+    decode_for_scoring,
+    decode_full,
+    encode_compact,
+    to_compact,
+    wire_version,
+)
+
+
+RAW = {
+    "id": 58471152, "member_id": None, "loan_amnt": 5325.0, "funded_amnt": 5325.0,
+    "term": " 36 months", "int_rate": "18.55", "installment": 193.99, "grade": "E",
+    "emp_title": "tradesman", "emp_length": "10+ years", "annual_inc": 33904.0,
+    "loan_status": "Fully Paid", "purpose": "credit_card", "zip_code": "685xx",
+    "dti": 28.5, "delinq_2yrs": 0.0, "earliest_cr_line": "Sep-2003",
+    "inq_last_6mths": 0.0, "open_acc": 11.0, "revol_util": "96.5", "total_acc": 14.0,
+    "event_time": "2026-02-15T01:10:44+00:00",
+}
+
+
+def _same(a, b):
+    if isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b):
+        return True
+    return a == b
+
+
+def test_projected_matches_full_decode():
+    payload = json.dumps(RAW).encode("utf-8")
+    projected = decode_for_scoring(payload)
+    full = decode_full(payload)
+
+    assert normalize_event_id(projected) == normalize_event_id(full) == "58471152"
+    f1, f2 = preprocess_event(projected), preprocess_event(full)
+    assert f1.keys() == f2.keys()
+    for k in f1:
+        assert _same(f1[k], f2[k]), k
+
+
+def test_nan_payload_falls_back():
+    payload = b'{"loan_id": "x1", "dti": NaN, "loan_amnt": 100}'
+    event = decode_for_scoring(payload)
+    assert event.get("loan_id") == "x1"
+    assert event.get("loan_amnt") == 100
+    assert event.get("zip_code") is None
+
+
+def test_compact_wire_format_scores_like_json():
+    payload = encode_compact(to_compact(RAW))
+    assert len(payload) < len(json.dumps(RAW))
+    assert wire_version([(SCHEMA_HEADER, b"2")]) == WIRE_MSGPACK
+    assert wire_version(None) == wire_version([("other", b"x")]) == WIRE_JSON
+
+    compact = decode_for_scoring(payload, WIRE_MSGPACK)
+    f1, f2 = preprocess_event(compact), preprocess_event(decode_for_scoring(json.dumps(RAW).encode()))
+    assert normalize_event_id(compact) == "58471152"
+    for k in f1:
+        assert _same(f1[k], f2[k]), k
+
+    full = decode_full(payload, WIRE_MSGPACK)
+    assert full["grade"] == "E" and full["funded_amnt"] == 5325.0
+    assert "member_id" not in full  # null passthrough columns are dropped
+
+
+def test_float_ids_are_sent_as_ints():
+    payload = encode_compact(to_compact({**RAW, "id": 53595000.0, "loan_id": float("nan")}))
+    event = decode_for_scoring(payload, WIRE_MSGPACK)
+    assert event.id == 53595000 and event.loan_id is None
+    assert normalize_event_id(event) == "53595000"
+
+
+@pytest.mark.parametrize("payload, version", [
+    (b"\x93\x01", WIRE_MSGPACK),   # truncated array
+    (b'["not", "an", "event"]', WIRE_MSGPACK),
+    (b"{not json", WIRE_JSON),
+    (b"\xff\xfe", WIRE_JSON),
+    (b"[1, 2]", WIRE_JSON),
+])
+def test_malformed_payloads_raise_decode_errors(payload, version):
+    with pytest.raises(DECODE_ERRORS):
+        decode_for_scoring(payload, version)
+    with pytest.raises(DECODE_ERRORS):
+        decode_full(payload, version)
+
+
+def test_v1_float_ids_are_normalized():
+    event = decode_for_scoring(b'{"id": 53595000.0, "loan_id": NaN}')
+    assert normalize_event_id(event) == "53595000"
+    assert normalize_event_id({"id": 1.0, "loan_id": "L-7"}) == "L-7"
+    assert normalize_event_id({"id": 2.5}) == "2.5"
@@ -0,0 +1,34 @@
+"""
+Run: cd realtime && python -m pytest streaming
+"""
+from streaming.consumer_metrics import CONSUMER_PARTITION_LAG_MESSAGES
+from streaming.lag_monitor import PartitionLagMonitor
+
+
+class FakeClient:
+    def __init__(self, end, committed):
+        self.end = end
+        self.committed_offsets = committed
+
+    def partitions_for_topic(self, topic):
+        return set(self.end)
+
+    def end_offsets(self, tps):
+        return {tp: self.end[tp.partition] for tp in tps}
+
+    def committed(self, tp):
+        return self.committed_offsets.get(tp.partition)
+
+
+def test_refresh_sets_per_partition_lag_and_drain():
+    mon = PartitionLagMonitor("t_lag", "g", "unused:9092")
+    client = FakeClient(end={0: 100, 1: 50}, committed={0: 40})
+    mon.refresh(client)
+    assert mon.lag == {0: 60, 1: 50}
+    assert CONSUMER_PARTITION_LAG_MESSAGES.labels(topic="t_lag", partition="1")._value.get() == 50
+
+    mon._last_refresh -= 10  # pretend 10s passed
+    client.committed_offsets = {0: 90, 1: 50}
+    mon.refresh(client)
+    assert mon.lag == {0: 10, 1: 0}
+    assert round(mon.rate_per_s, 1) == 10.0
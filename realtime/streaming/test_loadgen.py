@@ -0,0 +1,34 @@
+"""
+Run: cd realtime && python -m pytest streaming
+"""
+import json
+import random
+
+import pytest
+
+from streaming.loadgen import EventModel, RateProfile, _suffix
+
+
+def test_rate_profile_integrates_ramp():
+    profile = RateProfile.parse("0:0,10:1000,30:1000")
+    assert profile.duration == 30
+    assert profile.rate(5) == pytest.approx(500)
+    assert profile.expected(10) == pytest.approx(5000)
+    assert profile.expected(30) == pytest.approx(25000)
+    flat = RateProfile.ramp(200, 0, 60)
+    assert flat.expected(60) == pytest.approx(12000)
+
+
+def test_event_model_resamples_rows_with_fresh_ids():
+    rows = [{"id": 1, "loan_amnt": 1000.0, "purpose": "car"},
+            {"id": 2, "loan_amnt": 2500.0, "purpose": "debt_consolidation"}]
+    rng = random.Random(0)
+    for mode in ("rows", "columns"):
+        model = EventModel(rows, mode)
+        events = [json.loads(model.body(rng) + _suffix(f"lg-x-0-{i}", 1.7e9)) for i in range(20)]
+        assert all("id" not in e for e in events)
+        assert {e["purpose"] for e in events} <= {"car", "debt_consolidation"}
+        assert events[3]["loan_id"] == "lg-x-0-3" and events[3]["send_ts"] == 1.7e9
+    paired = {(e["loan_amnt"], e["purpose"]) for e in
+              (json.loads(EventModel(rows).body(rng) + b"}") for _ in range(50))}
+    assert paired == {(1000.0, "car"), (2500.0, "debt_consolidation")}
@@ -0,0 +1,62 @@
+"""
+Run: cd realtime && python -m pytest streaming
+"""
+import json
+import math
+
+import pandas as pd
+
+from streaming.producer import TokenBucket, _UtcClock, encode_chunk
+
+
+def test_encode_chunk_matches_per_row_conversion():
+    df = pd.DataFrame({
+        "loan_amnt": [5325.0, math.nan],
+        "term": [" 36 months", None],
+        "desc": [math.nan, math.nan],
+        "open_acc": [11, 3],
+    })
+    keys, payloads = encode_chunk(df, offset=100)
+    assert keys == ["loan_100", "loan_101"]
+    events = [json.loads(p + _UtcClock().suffix()) for p in payloads]
+    assert events[0]["loan_amnt"] == 5325.0 and events[1]["loan_amnt"] is None
+    assert events[1]["term"] is None and events[0]["desc"] is None
+    assert events[0]["open_acc"] == 11 and events[0]["loan_id"] == "loan_100"
+    assert "event_time" in events[0]
+
+
+class FakeClock:
+    """Time that only moves when the bucket sleeps (or the test advances it)."""
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_token_bucket_holds_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(2000, burst=1, clock=clock, sleep=clock.sleep)
+    for _ in range(400):
+        bucket.acquire()
+    # the first event uses the burst token, each later one waits 1/rate
+    assert len(clock.sleeps) == 399
+    assert all(abs(s - 1 / 2000) < 1e-12 for s in clock.sleeps)
+    assert abs(clock.now - 399 / 2000) < 1e-9
+
+
+def test_token_bucket_uses_idle_time_up_to_burst():
+    clock = FakeClock()
+    bucket = TokenBucket(100, burst=10, clock=clock, sleep=clock.sleep)
+    bucket.acquire(10)
+    assert clock.sleeps == []
+    clock.now += 5.0  # a long pause only refills the burst, not 500 tokens
+    bucket.acquire(10)
+    assert clock.sleeps == []
+    bucket.acquire(5)
+    assert clock.sleeps == [0.05]
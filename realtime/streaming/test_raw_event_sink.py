@@ -0,0 +1,142 @@
+"""
+Run: cd realtime && python -m pytest streaming
+"""
+import json
+import threading
+import time
+
+import pytest
+
+import streaming.raw_uploader as raw_uploader
+from streaming import archive_lookup, archive_manifest
+from streaming.archive_format import FORMATS, iter_archive_lines, open_writer
+from streaming.raw_event_sink import RawEventSink
+
+
+@pytest.fixture
+def make_sink():
+    """RawEventSink factory; every sink is closed (uploader and fsync threads stopped) after the test."""
+    sinks = []
+
+    def make(**kwargs):
+        sink = RawEventSink(**kwargs)
+        sinks.append(sink)
+        return sink
+
+    yield make
+    for sink in sinks:
+        sink.close()
+
+
+def test_rotation_hands_files_to_background_uploader(tmp_path, monkeypatch, make_sink):
+    uploaded = []
+    release = threading.Event()
+
+    def slow_upload(local_path, s3_path, content_type=None):
+        release.wait(5)
+        uploaded.append(s3_path)
+        return f"s3://bucket/{s3_path}"
+
+    monkeypatch.setattr(raw_uploader, "upload_file", slow_upload)
+    sink = make_sink(enabled=True, flush_every=2, local_dir=str(tmp_path))
+    for i in range(5):
+        sink.append({"id": i})  # rotation must not wait for the blocked upload
+    assert len(list((tmp_path / "pending").glob("events_*.jsonl"))) == 2
+    assert len(list((tmp_path / "pending").glob("*.manifest.json"))) == 2
+
+    release.set()
+    sink.close()
+    assert len(uploaded) == 6  # 3 files + their manifest sidecars
+    assert all(key.startswith("raw_events/") for key in uploaded)
+    assert sum(key.startswith("raw_events/_manifest/") for key in uploaded) == 3
+    assert list((tmp_path / "pending").iterdir()) == []
+
+
+def test_pending_files_survive_restart(tmp_path, monkeypatch):
+    monkeypatch.setattr(raw_uploader, "upload_file", lambda *a, **k: None)
+    pending = tmp_path / "pending"
+    pending.mkdir()
+    (pending / "events_100000_1771063200.jsonl").write_text('{"id": 1}\n')
+
+    up = raw_uploader.BackgroundUploader(pending, "raw_events", max_retries=1, retry_backoff_s=0.01)
+    assert up.backlog == 1
+    assert up.s3_key_for(pending / "events_100000_1771063200.jsonl") == \
+        "raw_events/2026/02/14/events_100000_1771063200.jsonl"
+
+
+def test_leftovers_beyond_backlog_do_not_block_start(tmp_path, monkeypatch):
+    uploaded = []
+    monkeypatch.setattr(raw_uploader, "upload_file", lambda local, key, **k: uploaded.append(key) or f"s3://b/{key}")
+    pending = tmp_path / "pending"
+    pending.mkdir()
+    for i in range(5):
+        (pending / f"events_100000_17710632{i:02d}.jsonl").write_text('{"id": 1}\n')
+
+    up = raw_uploader.BackgroundUploader(pending, "raw_events", max_backlog=2)
+    assert up.backlog == 5
+    up.start()
+    up.close()
+    assert len(uploaded) == 5
+    assert list(pending.iterdir()) == []
+
+
+def test_archive_formats_roundtrip(tmp_path):
+    events = [{"id": i, "loan_amnt": 1000.0 + i, "int_rate": "9.5", "desc": None} for i in range(25)]
+    for fmt, (ext, _) in FORMATS.items():
+        path = tmp_path / f"events_000000_1{ext}"
+        try:
+            w = open_writer(str(path), fmt, parquet_row_group=10)
+        except RuntimeError:
+            pytest.skip(f"{fmt} dependency missing")
+        for e in events:
+            w.write(e)
+        w.close()
+        with open(path, "rb") as f:
+            back = [json.loads(line) for line in iter_archive_lines(f, path.name)]
+        assert back == events, fmt
+
+
+def test_rotates_on_bytes_and_age(tmp_path, make_sink):
+    sink = make_sink(enabled=True, flush_every=10_000, local_dir=str(tmp_path), max_bytes=200, upload=False)
+    for i in range(10):
+        sink.append({"id": i, "pad": "x" * 50})
+    assert len(list((tmp_path / "pending").glob("events_*.jsonl"))) >= 3
+
+    aged = make_sink(enabled=True, flush_every=10_000, local_dir=str(tmp_path / "aged"), max_age_s=0.01, upload=False)
+    time.sleep(0.02)
+    aged.append({"id": 1})
+    assert list((tmp_path / "aged" / "pending").iterdir()) != []
+    aged.maybe_rotate()  # empty file is not rotated
+    assert len(list((tmp_path / "aged" / "pending").glob("events_*.jsonl"))) == 1
+
+
+def test_interval_durability_flushes_open_file(tmp_path, make_sink):
+    sink = make_sink(enabled=True, local_dir=str(tmp_path), durability="interval",
+                        fsync_interval_ms=10, upload=False)
+    for i in range(3):
+        sink.append({"id": i})
+    time.sleep(0.1)
+    assert sink.fsyncs >= 1
+    open_file = next(tmp_path.glob("events_*.jsonl"))
+    assert [json.loads(l)["id"] for l in open_file.read_text().splitlines()] == [0, 1, 2]
+
+
+def test_manifest_prunes_files_for_lookup(tmp_path, make_sink):
+    sink = make_sink(enabled=True, flush_every=10, local_dir=str(tmp_path), upload=False)
+    for i in range(30):
+        sink.append({"id": i, "event_time": f"2026-02-14T00:{i:02d}:00+00:00"})
+    sink.close()
+
+    entries = archive_manifest.load_local(str(tmp_path))
+    assert [e["rows"] for e in entries] == [10, 10, 10]
+    assert entries[1]["min_event_time"] == "2026-02-14T00:10:00+00:00"
+    assert entries[1]["max_event_time"] == "2026-02-14T00:19:00+00:00"
+
+    since = archive_manifest.event_ts({"event_time": "2026-02-14T00:12:00+00:00"})
+    assert [e["file"] for e in archive_manifest.select(entries, since=since)] == [e["file"] for e in entries[1:]]
+    assert archive_manifest.matches(entries[2], loan_id="25")  # Bloom filters have no false negatives
+
+    stats = {}
+    found = list(archive_lookup.lookup(str(tmp_path), loan_id="25", stats=stats))
+    assert [e["id"] for e in found] == [25]
+    assert stats["indexed"] == 3 and 1 <= stats["opened"] <= 3
@@ -0,0 +1,58 @@
+"""
+Run: cd realtime && python -m pytest streaming
+"""
+import json
+
+from streaming.replay import prune_by_time, replay_file
+from streaming.velocity import VelocityTracker
+
+
+def test_prune_by_time_uses_file_open_times():
+    files = [f"d/events_000000_{ts}.jsonl" for ts in (100, 200, 300)]
+    assert prune_by_time(files, since=250, until=None) == files[1:]
+    assert prune_by_time(files, since=None, until=150) == files[:1]
+
+
+def test_replay_file_dry_run(tmp_path):
+    good = {"id": 1, "loan_amnt": 1000, "annual_inc": 50000, "dti": 10, "int_rate": "9%",
+            "earliest_cr_line": "Jan-2010", "event_time": "2026-02-14T10:00:00+00:00"}
+    late = dict(good, id=2, event_time="2026-02-16T10:00:00+00:00")
+    missing = {"id": 3, "event_time": "2026-02-14T10:00:00+00:00"}
+    path = tmp_path / "events_100000_1771063200.jsonl"
+    path.write_text("\n".join(json.dumps(e) for e in (good, late, missing)) + "\n")
+
+    stats = replay_file(str(path), until=1771200000, dry_run=True)
+    assert stats["read"] == 3
+    assert stats["out_of_range"] == 1
+    assert stats["skipped"] == 1
+    assert stats["written"] == 1
+
+
+def test_replay_adds_velocity_features_across_files(tmp_path):
+    event = {"loan_amnt": 1000, "annual_inc": 50000, "dti": 10, "int_rate": "9%",
+             "earliest_cr_line": "Jan-2010", "zip_code": "945xx"}
+    paths = []
+    for n, ts in enumerate((1771063200, 1771063260)):
+        path = tmp_path / f"events_100000_{ts}.jsonl"
+        path.write_text(json.dumps(dict(event, id=n, event_time=f"2026-02-14T10:0{n}:00+00:00")) + "\n")
+        paths.append(path)
+
+    velocity = VelocityTracker(keys=["zip_code"], windows_s=[600])
+    for path in paths:
+        replay_file(str(path), dry_run=True, velocity=velocity)
+    # the second file's event sees the first one inside the 10m window
+    features = velocity.observe(dict(event, id=9), 1771063300)
+    assert features[velocity.feature_names[0]] == 3
+
+
+def test_replay_file_counts_bad_lines(tmp_path):
+    good = {"id": 1, "loan_amnt": 1000, "annual_inc": 50000, "dti": 10, "int_rate": "9%",
+            "earliest_cr_line": "Jan-2010"}
+    path = tmp_path / "events_100000_1771063200.jsonl"
+    # a non-object line and a truncated last line, as left by a crashed sink
+    path.write_text(json.dumps(good) + "\n[1, 2]\n" + json.dumps(dict(good, id=2))[:25] + "\n")
+
+    stats = replay_file(str(path), dry_run=True)
+    assert stats["read"] == 3
+    assert stats["bad"] == 2
+    assert stats["written"] == 1
@@ -0,0 +1,33 @@
+"""
+Run: cd realtime && python -m pytest streaming
+"""
+import pytest
+
+from streaming.velocity import SlidingWindowCounter, VelocityTracker, parse_duration
+
+
+def test_counter_expires_old_buckets():
+    c = SlidingWindowCounter(window_s=60, buckets=6, width=64)
+    assert [c.add("921xx", t) for t in (0, 5, 15)] == [1, 2, 3]
+    assert c.add("100xx", 20) == 1
+    assert c.count("921xx", ts=65) == 1   # events at 0 and 5 left the window
+    assert c.count("921xx", ts=500) == 0
+
+
+def test_tracker_features_and_memory_cap():
+    v = VelocityTracker(windows_s=(600, 3600), max_memory_mb=1, burst_thresholds={"zip_code": 3})
+    assert v.memory_bytes <= 1024 * 1024
+    feats = None
+    for i in range(3):
+        feats = v.observe({"zip_code": "921xx", "emp_title": " Nurse ", "addr_state": None}, ts=1000 + i)
+    assert feats["velocity_zip_code_10m"] == 3
+    assert feats["velocity_emp_title_1h"] == 3
+    assert feats["velocity_addr_state_10m"] is None
+    assert v.burst_reasons(feats) == ["VELOCITY_ZIP_CODE_10M>=3"]
+    assert v.observe({"zip_code": "921XX"}, ts=1000 + 601)["velocity_zip_code_10m"] == 1
+
+
+def test_parse_duration():
+    assert [parse_duration(x) for x in ("90", "45s", "10m", "1h")] == [90, 45, 600, 3600]
+    with pytest.raises(ValueError):
+        parse_duration("ten minutes")
@@ -0,0 +1,71 @@
+"""
+Run: cd realtime && python -m pytest streaming
+"""
+import threading
+
+from streaming.consumer_metrics import WINDOW_TIER_EVENTS, WINDOW_WATCHLIST_SHARE
+from streaming import window_aggregates
+from streaming.window_aggregates import BinnedHistogram, RollupWriter, WindowedAggregates
+
+
+def _row(tier, purpose, dti, util=50.0):
+    return {"risk_tier": tier, "purpose": purpose, "dti": dti, "revol_util_pct": util}
+
+
+def test_sliding_windows_and_export():
+    agg = WindowedAggregates(windows_s=(60, 600), bucket_s=30)
+    agg.add(_row("Low", "car", 10.0), ts=0)
+    agg.add(_row("Watchlist", "credit_card", 35.0), ts=550)
+    agg.add(_row("Low", "credit_card", 15.0), ts=560)
+
+    short = agg.snapshot(60)
+    assert short["tiers"] == {"Watchlist": 1, "Low": 1}
+    assert short["watchlist_share"] == {"credit_card": 0.5}
+    assert short["features"]["dti"]["mean"] == 25.0
+    assert agg.snapshot(600)["purposes"] == {"car": 1, "credit_card": 2}
+
+    agg.export(now=570)
+    assert WINDOW_TIER_EVENTS.labels(window="1m", risk_tier="Low")._value.get() == 1
+    assert WINDOW_WATCHLIST_SHARE.labels(window="10m", purpose="credit_card")._value.get() == 0.5
+    agg.export(now=5000)  # idle: windows empty out, previously exported labels go to 0
+    assert WINDOW_TIER_EVENTS.labels(window="10m", risk_tier="Low")._value.get() == 0
+
+
+def test_histogram_quantiles_within_one_bin():
+    h = BinnedHistogram(0, 100, 0.5)
+    for v in range(100):
+        h.add(float(v))
+    assert abs(h.quantile(0.5) - 50) <= 0.5
+    assert h.quantile(0.99) == 98.5  # 99th of 0..99 is 98, bin [98, 98.5)
+
+
+def test_minute_rollups_are_handed_over():
+    out = []
+    agg = WindowedAggregates(on_rollup=out.extend)
+    agg.add(_row("Low", "car", 10.0), ts=60)
+    agg.add(_row("Low", "car", None), ts=90)
+    agg.add(_row("Elevated", "car", 20.0), ts=125)  # next minute closes the first
+    assert out == [(60, "Low", "car", 2, 10.0, 1, 100.0, 2)]
+    agg.flush_rollup()
+    assert out[-1][:4] == (120, "Elevated", "car", 1)
+
+
+def test_rollup_writer_writes_off_thread(monkeypatch):
+    written, threads = [], []
+
+    def fake_write_rollups(connect):
+        def write(rows):
+            threads.append(threading.current_thread().name)
+            written.extend(rows)
+        write.close = lambda: written.append("closed")
+        return write
+
+    monkeypatch.setattr(window_aggregates, "write_rollups", fake_write_rollups)
+    writer = RollupWriter(connect=None)
+    agg = WindowedAggregates(on_rollup=writer.submit)
+    writer.start()
+    agg.add(_row("Low", "car", 10.0), ts=60)
+    agg.flush_rollup()
+    writer.close()
+    assert written == [(60, "Low", "car", 1, 10.0, 1, 50.0, 1), "closed"]
+    assert threads == ["rollup-writer"]
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import hashlib
+import operator
+import re
+import time
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_KEYS = ("zip_code", "emp_title", "addr_state")
+
+_DURATION = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*$")
+_UNIT_S = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_duration(text: str) -> float:
+    """'90' / '90s' / '10m' / '1h' / '1d' -> seconds."""
+    m = _DURATION.match(text)
+    if not m:
+        raise ValueError(f"Bad duration: {text!r}")
+    return float(m.group(1)) * _UNIT_S[m.group(2)]
+
+
+def window_label(seconds: float) -> str:
+    for unit, size in (("d", 86400), ("h", 3600), ("m", 60)):
+        if seconds >= size and seconds % size == 0:
+            return f"{int(seconds // size)}{unit}"
+    return f"{int(seconds)}s"
+
+
+def _columns(key: str, depth: int, width: int) -> List[int]:
+    """Flat cell index per sketch row (double hashing on blake2b, as in dedup.BloomFilter)."""
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+    return [i * width + (h1 + i * h2) % width for i in range(depth)]
+
+
+class SlidingWindowCounter:
+    """
+    Approximate per-key event counts over the last `window_s` seconds.
+
+    The window is a ring of `buckets` count-min sketches (depth x width) plus a
+    running total sketch. An event touches `depth` cells in its bucket and in
+    the total; when time moves into a new bucket the expired bucket is
+    subtracted from the total once. Both add and query are O(depth), and memory
+    is fixed at (buckets + 1) * depth * width counters whatever the key
+    cardinality. Counts never undercount; collisions can only add.
+    Timestamps older than the newest bucket are counted in the newest bucket.
+    Sketches are flat uint32 arrays: scalar updates stay cheap per event, and
+    only bucket expiry touches a whole sketch.
+    """
+    def __init__(self, window_s: float, buckets: int = 10, width: int = 4096, depth: int = 4):
+        self.window_s = float(window_s)
+        self.buckets = max(1, int(buckets))
+        self.bucket_s = self.window_s / self.buckets
+        self.width = max(16, int(width))
+        self.depth = max(1, int(depth))
+        cells = self.depth * self.width
+        self._ring = [array("I", bytes(4 * cells)) for _ in range(self.buckets)]
+        self._total = array("I", bytes(4 * cells))
+        self._head: Optional[int] = None
+
+    @property
+    def memory_bytes(self) -> int:
+        return (self.buckets + 1) * self.depth * self.width * 4
+
+    def _advance(self, ts: float) -> int:
+        bucket = int(ts // self.bucket_s)
+        if self._head is None:
+            self._head = bucket
+        elif bucket > self._head:
+            for b in range(self._head + 1, self._head + 1 + min(bucket - self._head, self.buckets)):
+                expired = self._ring[b % self.buckets]
+                if any(expired):
+                    self._total = array("I", map(operator.sub, self._total, expired))
+                    self._ring[b % self.buckets] = array("I", bytes(len(expired) * 4))
+            self._head = bucket
+        return self._head % self.buckets
+
+    def add(self, key: str, ts: float, cols: Optional[List[int]] = None) -> int:
+        """Count one event for `key` at `ts`; returns the key's count in the window, this event included."""
+        if cols is None:
+            cols = _columns(key, self.depth, self.width)
+        bucket = self._ring[self._advance(ts)]
+        total = self._total
+        for c in cols:
+            bucket[c] += 1
+            total[c] += 1
+        return min(total[c] for c in cols)
+
+    def count(self, key: str, ts: Optional[float] = None, cols: Optional[List[int]] = None) -> int:
+        if cols is None:
+            cols = _columns(key, self.depth, self.width)
+        if ts is not None:
+            self._advance(ts)
+        return min(self._total[c] for c in cols)
+
+
+def _norm_key(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, float) and value != value:
+        return None
+    text = str(value).strip().lower()
+    return text or None
+
+
+class VelocityTracker:
+    """
+    Sliding-window application counts per key field, added to the feature dict
+    as velocity_<field>_<window> (e.g. velocity_zip_code_10m). Missing key
+    values give None and are not counted.
+
+    `max_memory_mb` caps the total sketch memory; the sketch width is derived
+    from it. `burst_thresholds` ({field: count}) turns a count at or above the
+    threshold in the shortest window into an informational reason
+    (VELOCITY_ZIP_CODE_10M>=20); the risk tier itself is not changed.
+    """
+    def __init__(
+        self,
+        keys: Sequence[str] = DEFAULT_KEYS,
+        windows_s: Sequence[float] = (600.0, 3600.0),
+        buckets: int = 10,
+        depth: int = 4,
+        max_memory_mb: float = 16.0,
+        burst_thresholds: Optional[Dict[str, int]] = None,
+    ):
+        self.keys = tuple(keys)
+        self.windows_s = tuple(sorted(float(w) for w in windows_s))
+        self.depth = max(1, int(depth))
+        n = max(1, len(self.keys) * len(self.windows_s))
+        per_counter = max_memory_mb * 1024 * 1024 / n
+        width = int(per_counter // ((buckets + 1) * self.depth * 4))
+        self.width = max(16, width)
+        self._counters: Dict[Tuple[str, float], SlidingWindowCounter] = {
+            (k, w): SlidingWindowCounter(w, buckets=buckets, width=self.width, depth=self.depth)
+            for k in self.keys for w in self.windows_s
+        }
+        self._names = {(k, w): f"velocity_{k}_{window_label(w)}" for k in self.keys for w in self.windows_s}
+        self.burst_thresholds = dict(burst_thresholds or {})
+
+    @classmethod
+    def from_env(cls, getenv) -> Optional["VelocityTracker"]:
+        if getenv("VELOCITY_ENABLED", "true").lower() != "true":
+            return None
+        thresholds = {}
+        for item in filter(None, getenv("VELOCITY_BURST_THRESHOLDS", "").split(",")):
+            key, _, value = item.partition("=")
+            thresholds[key.strip()] = int(value)
+        return cls(
+            keys=[k.strip() for k in getenv("VELOCITY_KEYS", ",".join(DEFAULT_KEYS)).split(",") if k.strip()],
+            windows_s=[parse_duration(w) for w in getenv("VELOCITY_WINDOWS", "10m,1h").split(",") if w.strip()],
+            buckets=int(getenv("VELOCITY_BUCKETS", "10")),
+            depth=int(getenv("VELOCITY_SKETCH_DEPTH", "4")),
+            max_memory_mb=float(getenv("VELOCITY_MAX_MEMORY_MB", "16")),
+            burst_thresholds=thresholds,
+        )
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(c.memory_bytes for c in self._counters.values())
+
+    @property
+    def feature_names(self) -> List[str]:
+        return list(self._names.values())
+
+    def observe(self, event: Any, ts: Optional[float] = None) -> Dict[str, Optional[int]]:
+        """Count this event and return its velocity features."""
+        ts = time.time() if ts is None else ts
+        out: Dict[str, Optional[int]] = {}
+        for key in self.keys:
+            value = _norm_key(event.get(key))
+            cols = None if value is None else _columns(f"{key}\x00{value}", self.depth, self.width)
+            for w in self.windows_s:
+                name = self._names[(key, w)]
+                out[name] = None if value is None else self._counters[(key, w)].add(value, ts, cols)
+        return out
+
+    def burst_reasons(self, features: Dict[str, Any]) -> List[str]:
+        reasons = []
+        shortest = self.windows_s[0] if self.windows_s else None
+        for key, threshold in self.burst_thresholds.items():
+            if shortest is None or (key, shortest) not in self._names:
+                continue
+            name = self._names[(key, shortest)]
+            value = features.get(name)
+            if value is not None and value >= threshold:
+                reasons.append(f"{name.upper()}>={threshold}")
+        return reasons
@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from array import array
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from psycopg2.extras import execute_values
+
+from streaming.consumer_metrics import (
+    WINDOW_FEATURE_MEAN,
+    WINDOW_FEATURE_QUANTILE,
+    WINDOW_PURPOSE_EVENTS,
+    WINDOW_TIER_EVENTS,
+    WINDOW_WATCHLIST_SHARE,
+)
+from streaming.velocity import window_label
+
+# feature -> (low, high, bin width) of its fixed-bin quantile histogram
+FEATURE_BINS = {
+    "dti": (0.0, 100.0, 0.5),
+    "revol_util_pct": (0.0, 150.0, 0.5),
+}
+
+ROLLUP_SQL = """
+INSERT INTO risk_rollups_1m (
+  window_start, risk_tier, purpose, events, sum_dti, n_dti, sum_util, n_util
+) VALUES %s
+ON CONFLICT (window_start, risk_tier, purpose) DO UPDATE SET
+  events = risk_rollups_1m.events + EXCLUDED.events,
+  sum_dti = risk_rollups_1m.sum_dti + EXCLUDED.sum_dti,
+  n_dti = risk_rollups_1m.n_dti + EXCLUDED.n_dti,
+  sum_util = risk_rollups_1m.sum_util + EXCLUDED.sum_util,
+  n_util = risk_rollups_1m.n_util + EXCLUDED.n_util;
+"""
+ROLLUP_ROW_TEMPLATE = "(to_timestamp(%s), %s, %s, %s, %s, %s, %s, %s)"
+
+
+class BinnedHistogram:
+    """Fixed-bin histogram over [low, high); out-of-range values land in the edge bins. Mergeable by addition."""
+    def __init__(self, low: float, high: float, width: float):
+        self.low = low
+        self.width = width
+        self.bins = max(1, int(round((high - low) / width)))
+        self.counts = array("I", bytes(4 * self.bins))
+
+    def add(self, value: float) -> None:
+        i = int((value - self.low) // self.width)
+        self.counts[min(max(i, 0), self.bins - 1)] += 1
+
+    def quantile(self, q: float, counts: Optional[Sequence[int]] = None) -> Optional[float]:
+        """Upper edge of the bin holding the q-quantile (error <= one bin width)."""
+        counts = self.counts if counts is None else counts
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for i, c in enumerate(counts):
+            seen += c
+            if seen >= rank and c:
+                return self.low + (i + 1) * self.width
+        return self.low + self.bins * self.width
+
+
+class _Bucket:
+    """Everything observed during one `bucket_s` slice of event time."""
+    __slots__ = ("index", "tiers", "purposes", "watchlist", "sums", "counts", "hists")
+
+    def __init__(self, index: int):
+        self.index = index
+        self.tiers: Counter = Counter()
+        self.purposes: Counter = Counter()
+        self.watchlist: Counter = Counter()
+        self.sums = {f: 0.0 for f in FEATURE_BINS}
+        self.counts = {f: 0 for f in FEATURE_BINS}
+        self.hists = {f: BinnedHistogram(*FEATURE_BINS[f]) for f in FEATURE_BINS}
+
+
+def _num(value: Any) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        v = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if v != v else v
+
+
+class WindowedAggregates:
+    """
+    Sliding-window aggregates of scored rows, exported as Prometheus gauges:
+    events per risk tier and per purpose, Watchlist share per purpose, mean and
+    quantiles (fixed-bin histograms) of DTI and revolving utilization.
+
+    Rows are added to the bucket of their event time (O(1) per row); a window
+    is the merge of its most recent buckets, computed only on export(). With
+    `on_rollup`, each closed minute is also handed over as compact
+    (minute, tier, purpose) rows for the risk_rollups_1m table.
+    Purposes beyond `max_purposes` distinct values are reported as "other".
+    """
+    def __init__(
+        self,
+        windows_s: Sequence[float] = (300.0, 3600.0),
+        bucket_s: float = 30.0,
+        quantiles: Sequence[float] = (0.5, 0.9, 0.99),
+        max_purposes: int = 30,
+        on_rollup: Optional[Callable[[List[Tuple]], None]] = None,
+    ):
+        self.windows_s = tuple(sorted(float(w) for w in windows_s))
+        self.bucket_s = float(bucket_s)
+        self.keep = max(1, int(max(self.windows_s) // self.bucket_s))
+        self.quantiles = tuple(quantiles)
+        self.max_purposes = max(1, int(max_purposes))
+        self._buckets: List[_Bucket] = []
+        self._purposes: set = set()
+        self._exported: Dict[str, set] = {"tier": set(), "purpose": set()}
+
+        self.on_rollup = on_rollup
+        self._minute: Optional[int] = None
+        self._rollup: Dict[Tuple[str, str], List[float]] = {}
+
+    @classmethod
+    def from_env(cls, getenv, on_rollup=None) -> Optional["WindowedAggregates"]:
+        from streaming.velocity import parse_duration
+
+        if getenv("WINDOW_AGG_ENABLED", "true").lower() != "true":
+            return None
+        return cls(
+            windows_s=[parse_duration(w) for w in getenv("WINDOW_AGG_WINDOWS", "5m,1h").split(",") if w.strip()],
+            bucket_s=parse_duration(getenv("WINDOW_AGG_BUCKET", "30s")),
+            on_rollup=on_rollup,
+        )
+
+    def _purpose(self, value: Any) -> str:
+        purpose = str(value) if value else "unknown"
+        if purpose not in self._purposes:
+            if len(self._purposes) >= self.max_purposes:
+                return "other"
+            self._purposes.add(purpose)
+        return purpose
+
+    def _bucket(self, ts: float) -> _Bucket:
+        index = int(ts // self.bucket_s)
+        if self._buckets and index <= self._buckets[-1].index:
+            return self._buckets[-1]  # late rows count in the newest bucket
+        self._buckets.append(_Bucket(index))
+        if len(self._buckets) > self.keep:
+            del self._buckets[0]
+        return self._buckets[-1]
+
+    def add(self, row: Dict[str, Any], ts: Optional[float] = None) -> None:
+        ts = time.time() if ts is None else ts
+        tier = row.get("risk_tier") or "unknown"
+        purpose = self._purpose(row.get("purpose"))
+        b = self._bucket(ts)
+        b.tiers[tier] += 1
+        b.purposes[purpose] += 1
+        if tier == "Watchlist":
+            b.watchlist[purpose] += 1
+        values = {}
+        for feature in FEATURE_BINS:
+            v = _num(row.get(feature))
+            values[feature] = v
+            if v is not None:
+                b.sums[feature] += v
+                b.counts[feature] += 1
+                b.hists[feature].add(v)
+        if self.on_rollup is not None:
+            self._add_rollup(ts, tier, purpose, values)
+
+    def _add_rollup(self, ts: float, tier: str, purpose: str, values: Dict[str, Optional[float]]) -> None:
+        minute = int(ts // 60)
+        if self._minute is None:
+            self._minute = minute
+        elif minute > self._minute:
+            self.flush_rollup()
+            self._minute = minute
+        acc = self._rollup.setdefault((tier, purpose), [0, 0.0, 0, 0.0, 0])
+        acc[0] += 1
+        if values["dti"] is not None:
+            acc[1] += values["dti"]
+            acc[2] += 1
+        if values["revol_util_pct"] is not None:
+            acc[3] += values["revol_util_pct"]
+            acc[4] += 1
+
+    def flush_rollup(self) -> None:
+        """Hand the current minute's rollup rows to on_rollup (also called on shutdown)."""
+        if self.on_rollup is None or not self._rollup:
+            return
+        start = self._minute * 60
+        rows = [(start, tier, purpose, *acc) for (tier, purpose), acc in self._rollup.items()]
+        self._rollup = {}
+        try:
+            self.on_rollup(rows)
+        except Exception as e:
+            print(f"⚠️ Failed to write {len(rows)} rollup rows: {e}")
+
+    def snapshot(self, window_s: float, now: Optional[float] = None) -> Dict[str, Any]:
+        """Merged aggregates of the buckets inside the last `window_s` seconds (ending at `now` or the newest bucket)."""
+        if not self._buckets:
+            newest = int((time.time() if now is None else now) // self.bucket_s)
+        else:
+            newest = self._buckets[-1].index if now is None else int(now // self.bucket_s)
+        oldest = newest - int(window_s // self.bucket_s) + 1
+        tiers: Counter = Counter()
+        purposes: Counter = Counter()
+        watchlist: Counter = Counter()
+        sums = {f: 0.0 for f in FEATURE_BINS}
+        counts = {f: 0 for f in FEATURE_BINS}
+        hists = {f: [0] * BinnedHistogram(*FEATURE_BINS[f]).bins for f in FEATURE_BINS}
+        for b in self._buckets:
+            if b.index < oldest or b.index > newest:
+                continue
+            tiers.update(b.tiers)
+            purposes.update(b.purposes)
+            watchlist.update(b.watchlist)
+            for f in FEATURE_BINS:
+                sums[f] += b.sums[f]
+                counts[f] += b.counts[f]
+                merged = hists[f]
+                for i, c in enumerate(b.hists[f].counts):
+                    if c:
+                        merged[i] += c
+        features = {}
+        for f, (low, high, width) in FEATURE_BINS.items():
+            h = BinnedHistogram(low, high, width)
+            features[f] = {
+                "mean": sums[f] / counts[f] if counts[f] else None,
+                "quantiles": {q: h.quantile(q, hists[f]) for q in self.quantiles},
+            }
+        return {
+            "tiers": dict(tiers),
+            "purposes": dict(purposes),
+            "watchlist_share": {p: watchlist[p] / n for p, n in purposes.items() if n},
+            "features": features,
+        }
+
+    def export(self, now: Optional[float] = None) -> None:
+        """Publish every window to the credit_risk_window_* gauges."""
+        for w in self.windows_s:
+            label = window_label(w)
+            snap = self.snapshot(w, now)
+            tiers = set(snap["tiers"]) | self._exported["tier"]
+            for tier in tiers:
+                WINDOW_TIER_EVENTS.labels(window=label, risk_tier=tier).set(snap["tiers"].get(tier, 0))
+            purposes = set(snap["purposes"]) | self._exported["purpose"]
+            for purpose in purposes:
+                WINDOW_PURPOSE_EVENTS.labels(window=label, purpose=purpose).set(snap["purposes"].get(purpose, 0))
+                WINDOW_WATCHLIST_SHARE.labels(window=label, purpose=purpose).set(snap["watchlist_share"].get(purpose, 0.0))
+            self._exported["tier"] |= set(snap["tiers"])
+            self._exported["purpose"] |= set(snap["purposes"])
+            for feature, stats in snap["features"].items():
+                if stats["mean"] is not None:
+                    WINDOW_FEATURE_MEAN.labels(window=label, feature=feature).set(stats["mean"])
+                for q, value in stats["quantiles"].items():
+                    if value is not None:
+                        WINDOW_FEATURE_QUANTILE.labels(window=label, feature=feature, quantile=str(q)).set(value)
+
+
+def write_rollups(connect: Callable[[], Any]) -> Callable[[Iterable[Tuple]], None]:
+    """on_rollup callback that upserts rollup rows into risk_rollups_1m on its own connection."""
+    state: Dict[str, Any] = {"conn": None}
+
+    def write(rows: Iterable[Tuple]) -> None:
+        conn = state["conn"]
+        if conn is None or conn.closed:
+            conn = state["conn"] = connect()
+        try:
+            with conn.cursor() as cur:
+                execute_values(cur, ROLLUP_SQL, list(rows), template=ROLLUP_ROW_TEMPLATE)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def close() -> None:
+        if state["conn"] is not None and not state["conn"].closed:
+            state["conn"].close()
+
+    write.close = close
+    return write
+
+
+class RollupWriter(threading.Thread):
+    """
+    Writes closed rollup minutes off the consumer thread (pass `submit` as on_rollup).
+    At most `max_pending` minutes wait; beyond that a minute is dropped with a
+    warning rather than stalling scoring.
+    """
+    def __init__(self, connect: Callable[[], Any], max_pending: int = 60):
+        super().__init__(name="rollup-writer", daemon=True)
+        self._write = write_rollups(connect)
+        self._queue: "queue.Queue[Optional[List[Tuple]]]" = queue.Queue(maxsize=max(1, int(max_pending)))
+
+    def submit(self, rows: List[Tuple]) -> None:
+        try:
+            self._queue.put_nowait(list(rows))
+        except queue.Full:
+            print(f"⚠️ Rollup writer behind, dropped {len(rows)} rollup rows")
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        """Write what is queued, then stop and close the connection."""
+        self._queue.put(None)
+        self.join(timeout)
+
+    def run(self) -> None:
+        while True:
+            rows = self._queue.get()
+            if rows is None:
+                break
+            try:
+                self._write(rows)
+            except Exception as e:
+                print(f"⚠️ Failed to write {len(rows)} rollup rows: {e}")
+        self._write.close()
@@ -0,0 +1,274 @@
+"""
+pipeline.py
+
+Purpose:
+- Run the batch flow (sample -> preprocess -> risk_rules -> logistic_regression
+  -> roc_curve) as one incremental pipeline
+
+Notes:
+- Each stage declares its script, inputs, outputs and parameters. Its
+  fingerprint hashes the code (script + stage_io.py), the content of its
+  inputs, its arguments and PIPELINE_FORMAT. A stage whose fingerprint
+  matches the cached one and whose outputs are unchanged since that run is
+  skipped; a changed upstream output changes the downstream fingerprint.
+- Stages whose inputs are ready run in parallel (up to --jobs)
+- Each stage's wall time and peak RSS (from wait4 where available) are reported
+- File digests are cached by (size, mtime), so an unchanged multi-GB raw file
+  is not re-hashed on every run
+- Run from the repository root:
+    python scripts/pipeline.py
+    python scripts/pipeline.py --args "preprocess=--workers 8" --force risk_rules
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from stage_io import PIPELINE_FORMAT, StageWriter, resolve, rss_mb
+
+CACHE_PATH = "data/.pipeline_cache.json"
+SHARED_CODE = ["scripts/stage_io.py"]
+
+
+@dataclass
+class Stage:
+    name: str
+    script: str
+    inputs: List[str]
+    outputs: List[str]
+    args: List[str] = field(default_factory=list)
+    # outputs that are plain files, not stage datasets (no Parquet variant)
+    plain: bool = False
+
+
+STAGES = [
+    Stage("sample", "scripts/sample.py",
+          ["data/raw/appl_accepted_20072019Q3.csv"], ["data/processed/sample_100k.csv"]),
+    Stage("preprocess", "scripts/preprocess.py",
+          ["data/processed/sample_100k.csv"], ["data/processed/clean_loans.csv"]),
+    Stage("risk_rules", "scripts/risk_rules.py",
+          ["data/processed/clean_loans.csv"],
+          ["data/processed/risk_segments.csv", "data/processed/early_warning_watchlist.csv",
+           "data/processed/kpi_summary.csv"]),
+    Stage("logistic_regression", "analysis/logistic_regression.py",
+          ["data/processed/risk_segments.csv"], ["data/processed/risk_segments_with_predictions.csv"]),
+    Stage("roc_curve", "analysis/roc_curve.py",
+          ["data/processed/risk_segments_with_predictions.csv"], ["analysis/roc_curve.png"], plain=True),
+]
+
+
+def dataset_files(path: str, fmt: str) -> List[str]:
+    """Files a dataset path stands for in this format (see stage_io.write_stage)."""
+    if path.startswith("data/raw/") or not path.endswith(".csv"):
+        return [path]
+    return StageWriter(path, fmt).paths
+
+
+def input_file(path: str, fmt: str) -> str:
+    """The file a stage reading this dataset opens (a CSV-only input in parquet mode is read as CSV)."""
+    if path.startswith("data/raw/") or not path.endswith(".csv"):
+        return path
+    return resolve(path, fmt)
+
+
+class DigestCache:
+    """Content digests of files, reused while (size, mtime_ns) is unchanged."""
+    def __init__(self, entries: Optional[Dict[str, list]] = None):
+        self.entries = entries or {}
+        self._lock = threading.Lock()
+
+    def digest(self, path: str) -> Optional[str]:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            cached = self.entries.get(path)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        with self._lock:
+            self.entries[path] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+
+def fingerprint(stage: Stage, fmt: str, digests: DigestCache) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps({"script": stage.script, "args": stage.args, "format": fmt}).encode())
+    for path in [stage.script, *SHARED_CODE]:
+        h.update(f"{path}={digests.digest(path)}".encode())
+    for dataset in stage.inputs:
+        path = input_file(dataset, fmt)
+        h.update(f"{path}={digests.digest(path)}".encode())
+    return h.hexdigest()
+
+
+def output_digests(stage: Stage, fmt: str, digests: DigestCache) -> Dict[str, Optional[str]]:
+    files = stage.outputs if stage.plain else [p for d in stage.outputs for p in dataset_files(d, fmt)]
+    return {p: digests.digest(p) for p in files}
+
+
+def run_stage(stage: Stage, fmt: str) -> Dict[str, float]:
+    """Run one stage script; returns wall seconds and the child's peak RSS (not on Windows)."""
+    env = {**os.environ, "PIPELINE_FORMAT": fmt, "MPLBACKEND": "Agg"}
+    log_path = os.path.join("data", f".pipeline_{stage.name}.log")
+    started = time.time()
+    with open(log_path, "w") as log:
+        proc = subprocess.Popen([sys.executable, stage.script, *stage.args], stdout=log, stderr=subprocess.STDOUT, env=env)
+        usage = None
+        if hasattr(os, "wait4"):
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+        else:
+            proc.wait()
+    seconds = time.time() - started
+    if proc.returncode != 0:
+        raise RuntimeError(f"stage '{stage.name}' failed with exit code {proc.returncode}, see {log_path}")
+    stats = {"seconds": seconds}
+    if usage is not None:
+        stats["peak_rss_mb"] = rss_mb(usage.ru_maxrss)
+    return stats
+
+
+def run_pipeline(
+    stages: List[Stage],
+    fmt: str = PIPELINE_FORMAT,
+    jobs: int = 2,
+    force: Optional[List[str]] = None,
+    dry_run: bool = False,
+    cache_path: str = CACHE_PATH,
+) -> Dict[str, dict]:
+    cache = {}
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            cache = json.load(f)
+    digests = DigestCache(cache.get("_files"))
+    force = set(force or [])
+    producer = {d: s.name for s in stages for d in s.outputs}
+    deps = {s.name: {producer[d] for d in s.inputs if d in producer} for s in stages}
+    by_name = {s.name: s for s in stages}
+    results: Dict[str, dict] = {}
+    done: set = set()
+    failed: set = set()
+    planned: set = set()
+    running = {}
+
+    def ready() -> List[Stage]:
+        return [s for s in stages
+                if s.name not in done and s.name not in failed and s.name not in running
+                and deps[s.name] <= done]
+
+    def submit(pool: ThreadPoolExecutor, stage: Stage) -> None:
+        fp = fingerprint(stage, fmt, digests)
+        prev = cache.get(stage.name, {})
+        unchanged = (
+            prev.get("fingerprint") == fp
+            and prev.get("outputs") == output_digests(stage, fmt, digests)
+            and all(prev.get("outputs", {}).values())
+        )
+        if dry_run and deps[stage.name] & planned:
+            unchanged = False  # an upstream stage would run and may change this stage's inputs
+        if unchanged and stage.name not in force:
+            results[stage.name] = {"status": "cached", **prev.get("stats", {})}
+            done.add(stage.name)
+            return
+        if dry_run:
+            results[stage.name] = {"status": "would run"}
+            planned.add(stage.name)
+            done.add(stage.name)
+            return
+        print(f"[pipeline] Running {stage.name}")
+        running[stage.name] = (pool.submit(run_stage, stage, fmt), fp)
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        while True:
+            for stage in ready():
+                if len(running) >= max(1, jobs):
+                    break
+                submit(pool, stage)
+            if not running:
+                if not ready():
+                    break
+                continue
+            finished, _ = wait([f for f, _ in running.values()], return_when=FIRST_COMPLETED)
+            for name, (future, fp) in list(running.items()):
+                if future not in finished:
+                    continue
+                del running[name]
+                try:
+                    stats = future.result()
+                except Exception as e:
+                    print(f"[pipeline] ERROR: {e}", file=sys.stderr)
+                    results[name] = {"status": "failed"}
+                    failed.add(name)
+                    continue
+                cache[name] = {
+                    "fingerprint": fp,
+                    "outputs": output_digests(by_name[name], fmt, digests),
+                    "stats": stats,
+                }
+                results[name] = {"status": "ran", **stats}
+                done.add(name)
+
+    for s in stages:
+        if s.name not in results:
+            results[s.name] = {"status": "blocked"}
+    if not dry_run:
+        cache["_files"] = digests.entries
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        with open(cache_path, "w") as f:
+            json.dump(cache, f, indent=2)
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Incremental batch pipeline runner.")
+    parser.add_argument("--format", default=PIPELINE_FORMAT, choices=["csv", "parquet"], help="PIPELINE_FORMAT for all stages")
+    parser.add_argument("--jobs", type=int, default=2, help="Stages run in parallel when their inputs are ready")
+    parser.add_argument("--only", nargs="*", help="Run only these stages (their inputs must exist)")
+    parser.add_argument("--force", nargs="*", default=[], help="Re-run these stages even when cached")
+    parser.add_argument("--args", action="append", default=[], metavar="STAGE=ARGS",
+                        help='Extra script arguments, e.g. "preprocess=--workers 8" (part of the fingerprint)')
+    parser.add_argument("--dry-run", action="store_true", help="Show which stages would run")
+    args = parser.parse_args()
+
+    stages = [Stage(**{**s.__dict__}) for s in STAGES]
+    extra = {}
+    for item in args.args:
+        name, _, value = item.partition("=")
+        extra[name.strip()] = shlex.split(value)
+    for s in stages:
+        s.args = extra.get(s.name, s.args)
+    if args.only:
+        stages = [s for s in stages if s.name in args.only]
+
+    started = time.time()
+    results = run_pipeline(stages, args.format, args.jobs, args.force, args.dry_run)
+
+    print(f"\n{'stage':<22} {'status':<10} {'seconds':>8} {'peak MB':>8}")
+    for s in stages:
+        r = results[s.name]
+        secs = f"{r['seconds']:.2f}" if "seconds" in r else "-"
+        rss = f"{r['peak_rss_mb']:.0f}" if "peak_rss_mb" in r else "-"
+        print(f"{s.name:<22} {r['status']:<10} {secs:>8} {rss:>8}")
+    print(f"[pipeline] Total {time.time() - started:.2f}s (cached stages show the time of their last run)")
+    return 1 if any(r["status"] in ("failed", "blocked") for r in results.values()) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -13,15 +13,48 @@ Outputs:
 Notes:
 - This script is deterministic and reproducible
 - All cleaning decisions are justified by prior data profiling
+- Only the needed columns are read, with explicit dtypes
+- --chunksize N streams the input (e.g. the full appl_accepted_20072019Q3.csv):
+  pass 1 computes the imputation medians, pass 2 writes cleaned chunks.
+  Peak memory is bounded by the chunk size; output is identical to the
+  in-memory mode.
+- PIPELINE_FORMAT=parquet reads sample_100k.parquet and writes
+  clean_loans.parquet (see stage_io.py); a .parquet --input/--output also works
+- --workers N splits the file into byte ranges at record boundaries and
+  parses and cleans them in a process pool. Derived ranges are spilled to a
+  temp dir in pass 1, per-worker median counts are merged, and pass 2 writes
+  the ranges in input order, so the output is identical to the serial run.
+- Text columns (int_rate, revol_util, emp_length, earliest_cr_line) are parsed
+  once per distinct value and mapped back; earliest_cr_line uses explicit
+  month-year formats instead of per-row date inference
 """
 
 
 from __future__ import annotations
 
+import argparse
+import os
 import sys
+import tempfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
 import pandas as pd
 import numpy as np
 
+from stage_io import (
+    StageWriter,
+    iter_stage,
+    ordered_map,
+    peak_rss_mb,
+    read_csv_range,
+    read_stage,
+    resolve,
+    split_csv_ranges,
+    stage_columns,
+)
+
 
 INPUT_PATH = "data/processed/sample_100k.csv"
 OUTPUT_PATH = "data/processed/clean_loans.csv"
@@ -46,12 +79,104 @@ EXPECTED_COLUMNS = {
 }
 
 
+# Explicit read dtypes: numeric fields as float64 (stable across chunks),
+# low-cardinality strings as category, free text as object
+READ_DTYPES = {
+    "loan_amnt": "float64",
+    "term": "category",
+    "int_rate": "object",
+    "installment": "float64",
+    "purpose": "category",
+    "annual_inc": "float64",
+    "dti": "float64",
+    "revol_util": "object",
+    "delinq_2yrs": "float64",
+    "inq_last_6mths": "float64",
+    "open_acc": "float64",
+    "total_acc": "float64",
+    "emp_length": "category",
+    "earliest_cr_line": "object",
+    "loan_status": "category",
+}
+
+VALID_STATUSES = {"Fully Paid", "Charged Off"}
+REFERENCE_DATE = pd.Timestamp("2019-01-01")
+REQUIRED = ["loan_amnt", "annual_inc", "dti", "int_rate_pct", "credit_history_years"]
+IMPUTE_MEDIAN = ["emp_length_yrs", "revol_util_pct"]
+
+FINAL_COLS = [
+    "loan_amnt",
+    "term",
+    "installment",
+    "purpose",
+    "annual_inc",
+    "dti",
+    "int_rate_pct",
+    "revol_util_pct",
+    "delinq_2yrs",
+    "inq_last_6mths",
+    "open_acc",
+    "total_acc",
+    "emp_length_yrs",
+    "credit_history_years",
+    "default",
+]
+
+NUMERIC_COLS = [c for c in FINAL_COLS if c not in ("term", "purpose")]
+
+
 def _require_columns(df: pd.DataFrame, expected: set[str]) -> None:
     missing = expected - set(df.columns)
     if missing:
         raise ValueError(f"Missing required columns: {sorted(missing)}")
 
 
+def _on_uniques(series: pd.Series, parse) -> pd.Series:
+    """
+    Apply `parse` (Series -> Series) to the distinct values of `series` only and
+    map the results back through the factorized codes. These columns have a few
+    hundred distinct values, so the string work no longer scales with rows.
+    """
+    codes, uniques = pd.factorize(series)
+    parsed = parse(pd.Series(uniques)).reset_index(drop=True)
+    # missing values have code -1, which reindexes to NaN / NaT
+    return pd.Series(parsed.reindex(codes).to_numpy(), index=series.index)
+
+
+_SHORT_MONTH_YEAR = r"^([A-Za-z]{3})-(\d{2})$"
+
+
+def _parse_month_year(series: pd.Series, today: Optional[pd.Timestamp] = None) -> pd.Series:
+    """
+    earliest_cr_line values ('Sep-2003', and 'Dec-97' in some extracts) to the
+    first of the month, with explicit formats. Matches what the format-less
+    pd.to_datetime produced (it fell back to dateutil per element):
+      'Mon-YYYY'          -> that month
+      'Mon-YY', YY > 31   -> dateutil's two-digit year (within 50 years of today)
+      'Mon-YY', YY <= 31  -> NaT (YY is read as a day, leaving no year)
+    Anything else goes through the per-element parser as before.
+    """
+    s = series.astype(object).where(series.notna(), None)
+    out = pd.to_datetime(s, format="%b-%Y", errors="coerce")
+
+    short = s.astype(str).str.extract(_SHORT_MONTH_YEAR)
+    yy = pd.to_numeric(short[1], errors="coerce")
+    is_short = yy.notna()
+    two_digit = is_short & (yy > 31)
+    if two_digit.any():
+        year_now = (today or pd.Timestamp.now()).year
+        year = yy[two_digit] + (year_now // 100) * 100
+        year = year.where(year < year_now + 50, year - 100)
+        year = year.where(year >= year_now - 50, year + 100)
+        text = short.loc[two_digit, 0] + "-" + year.astype(int).astype(str)
+        out[two_digit] = pd.to_datetime(text, format="%b-%Y", errors="coerce")
+
+    rest = out.isna() & s.notna() & ~is_short
+    if rest.any():
+        out[rest] = pd.to_datetime(s[rest], errors="coerce", format="mixed")
+    return out
+
+
 def _to_percent_float(series: pd.Series) -> pd.Series:
     """
     Convert strings like '13.56%' to float 13.56.
@@ -60,7 +185,8 @@ def _to_percent_float(series: pd.Series) -> pd.Series:
     s = series.astype(str).str.strip()
     s = s.replace({"nan": np.nan, "None": np.nan, "": np.nan})
     s = s.str.rstrip("%")
-    return pd.to_numeric(s, errors="coerce")
+    # float64 even when every value is integral, so chunks agree with the whole file
+    return pd.to_numeric(s, errors="coerce").astype("float64")
 
 
 def _emp_length_to_years(series: pd.Series) -> pd.Series:
@@ -76,111 +202,273 @@ def _emp_length_to_years(series: pd.Series) -> pd.Series:
     s = s.replace({"nan": np.nan, "None": np.nan, "": np.nan})
     s = s.replace({"< 1 year": "0", "10+ years": "10"})
     extracted = s.str.extract(r"(\d+)", expand=False)
-    return pd.to_numeric(extracted, errors="coerce")
-
-
-def main() -> int:
-    print(f"[preprocess] Reading: {INPUT_PATH}")
-    df = pd.read_csv(INPUT_PATH, low_memory=False)
-    print(f"[preprocess] Loaded shape: {df.shape}")
-
-    _require_columns(df, EXPECTED_COLUMNS)
+    return pd.to_numeric(extracted, errors="coerce").astype("float64")
 
-    # 1) Target definition 
-    valid_statuses = {"Fully Paid", "Charged Off"}
-    before = len(df)
-    df = df[df["loan_status"].isin(valid_statuses)].copy()
-    print(f"[preprocess] Filter loan_status to {valid_statuses}: {before} -> {len(df)}")
 
-    df["default"] = (df["loan_status"] == "Charged Off").astype(int)
-    df.drop(columns=["loan_status"], inplace=True)
+def derive(df: pd.DataFrame) -> Tuple[pd.DataFrame, int]:
+    """
+    Steps 1-5 for one frame (whole file or one chunk): target, standardized
+    numeric fields, employment length, credit history. Builds the output
+    columns in one new frame and applies the row filters with a single
+    selection instead of copying the input after each step.
 
-    # 2) Standardize numeric fields 
-    df["int_rate_pct"] = _to_percent_float(df["int_rate"])
-    df["revol_util_pct"] = _to_percent_float(df["revol_util"])
+    Returns the filtered frame (before imputation) and the row count after
+    the loan_status filter, for logging.
+    """
+    # 1) Target definition
+    status_ok = df["loan_status"].isin(VALID_STATUSES)
 
-    # DTI: profiling showed extreme values 
-    df["dti"] = pd.to_numeric(df["dti"], errors="coerce")
-    df.loc[df["dti"] > 100, "dti"] = np.nan
-    df.loc[df["dti"] < 0, "dti"] = np.nan
+    # 2) Standardize numeric fields
+    # DTI: profiling showed extreme values
+    dti = pd.to_numeric(df["dti"], errors="coerce")
+    dti = dti.where((dti <= 100) & (dti >= 0) | dti.isna(), np.nan)
 
-    # annual_inc can have extreme outliers
-    df["annual_inc"] = pd.to_numeric(df["annual_inc"], errors="coerce")
+    # 4) Credit history length (years)
+    earliest = _on_uniques(df["earliest_cr_line"], _parse_month_year)
+
+    out = pd.DataFrame({
+        "loan_amnt": df["loan_amnt"],
+        "term": df["term"],
+        "installment": df["installment"],
+        "purpose": df["purpose"],
+        # annual_inc can have extreme outliers
+        "annual_inc": pd.to_numeric(df["annual_inc"], errors="coerce"),
+        "dti": dti,
+        "int_rate_pct": _on_uniques(df["int_rate"], _to_percent_float),
+        "revol_util_pct": _on_uniques(df["revol_util"], _to_percent_float),
+        "delinq_2yrs": df["delinq_2yrs"],
+        "inq_last_6mths": df["inq_last_6mths"],
+        "open_acc": df["open_acc"],
+        "total_acc": df["total_acc"],
+        # 3) Employment length
+        "emp_length_yrs": _on_uniques(df["emp_length"], _emp_length_to_years),
+        "credit_history_years": (REFERENCE_DATE - earliest).dt.days / 365.0,
+        "default": (df["loan_status"] == "Charged Off").astype(int),
+    })
+
+    # 5) Missing handling
+    keep = status_ok & out[REQUIRED].notna().all(axis=1)
+    return out.loc[keep], int(status_ok.sum())
+
+
+def finalize(df: pd.DataFrame, medians: Dict[str, float]) -> Tuple[pd.DataFrame, int]:
+    """Impute optional fields, coerce numeric columns, drop rows that became NaN. Returns (frame, rows before the drop)."""
+    df = df.fillna({c: medians[c] for c in IMPUTE_MEDIAN if medians.get(c) is not None})
+    for c in NUMERIC_COLS:
+        if not pd.api.types.is_numeric_dtype(df[c]):
+            df[c] = pd.to_numeric(df[c], errors="coerce")
+    before = len(df)
+    return df.dropna(subset=NUMERIC_COLS), before
 
-    # 3) Employment length
-    df["emp_length_yrs"] = _emp_length_to_years(df["emp_length"])
 
-    # 4) Credit history length (years)
-    df["earliest_cr_line"] = pd.to_datetime(df["earliest_cr_line"], errors="coerce")
-    reference_date = pd.Timestamp("2019-01-01")
-    df["credit_history_years"] = (reference_date - df["earliest_cr_line"]).dt.days / 365.0
+class StreamingMedian:
+    """
+    Exact median over a stream of Series, equal to Series.median() on their
+    concatenation. Keeps one count per distinct value, so memory is bounded by
+    the column's cardinality (11 for emp_length_yrs, ~1.3k for revol_util_pct),
+    not by the row count.
+    """
+    def __init__(self):
+        self.counts: Counter = Counter()
+        self.n = 0
+
+    def update(self, values: pd.Series) -> None:
+        vc = values.value_counts(dropna=True)
+        self.counts.update(dict(zip(vc.index.tolist(), vc.tolist())))
+        self.n += int(vc.sum())
+
+    def merge(self, other: "StreamingMedian") -> None:
+        """Combine counts from another stream (e.g. another worker)."""
+        self.counts.update(other.counts)
+        self.n += other.n
+
+    def median(self) -> Optional[float]:
+        if not self.n:
+            return None
+        lo, hi = (self.n - 1) // 2, self.n // 2
+        seen = 0
+        low_value = None
+        for value in sorted(self.counts):
+            seen += self.counts[value]
+            if low_value is None and seen > lo:
+                low_value = value
+            if seen > hi:
+                return float(np.mean([low_value, value]))
+        return None
+
+
+def _read_header(path: str) -> None:
+    _require_columns(pd.DataFrame(columns=stage_columns(path)), EXPECTED_COLUMNS)
+
+
+def _iter_chunks(path: str, chunksize: int) -> Iterator[pd.DataFrame]:
+    return iter_stage(path, chunksize, columns=list(READ_DTYPES), dtype=READ_DTYPES)
+
+
+def run_in_memory(input_path: str, output_path: str) -> pd.DataFrame:
+    print(f"[preprocess] Reading: {resolve(input_path)}")
+    _read_header(input_path)
+    df = read_stage(input_path, columns=list(READ_DTYPES), dtype=READ_DTYPES)
+    print(f"[preprocess] Loaded shape: {df.shape}")
 
-    # 5) Missing handling 
-    required = ["loan_amnt", "annual_inc", "dti", "int_rate_pct", "credit_history_years"]
-    before = len(df)
-    df = df.dropna(subset=required).copy()
-    print(f"[preprocess] Drop rows missing required {required}: {before} -> {len(df)}")
+    loaded = len(df)
+    df, after_status = derive(df)
+    print(f"[preprocess] Filter loan_status to {VALID_STATUSES}: {loaded} -> {after_status}")
+    print(f"[preprocess] Drop rows missing required {REQUIRED}: {after_status} -> {len(df)}")
 
     # Impute optional fields
-    if df["emp_length_yrs"].isna().any():
-        df["emp_length_yrs"] = df["emp_length_yrs"].fillna(df["emp_length_yrs"].median())
-    if df["revol_util_pct"].isna().any():
-        df["revol_util_pct"] = df["revol_util_pct"].fillna(df["revol_util_pct"].median())
-
-    # 6) Final dataset 
-    final_cols = [
-        "loan_amnt",
-        "term",
-        "installment",
-        "purpose",
-        "annual_inc",
-        "dti",
-        "int_rate_pct",
-        "revol_util_pct",
-        "delinq_2yrs",
-        "inq_last_6mths",
-        "open_acc",
-        "total_acc",
-        "emp_length_yrs",
-        "credit_history_years",
-        "default",
-    ]
-
-    # Ensure final columns exist
-    missing_final = [c for c in final_cols if c not in df.columns]
-    if missing_final:
-        raise ValueError(f"Final columns missing after processing: {missing_final}")
-
-    df_final = df[final_cols].copy()
-
-    numeric_cols = [
-        "loan_amnt",
-        "installment",
-        "annual_inc",
-        "dti",
-        "int_rate_pct",
-        "revol_util_pct",
-        "delinq_2yrs",
-        "inq_last_6mths",
-        "open_acc",
-        "total_acc",
-        "emp_length_yrs",
-        "credit_history_years",
-        "default",
-    ]
-    for c in numeric_cols:
-        df_final[c] = pd.to_numeric(df_final[c], errors="coerce")
-
-    # drop any rows that became NaN in numeric columns after coercion
-    before = len(df_final)
-    df_final = df_final.dropna(subset=numeric_cols).copy()
+    medians = {c: df[c].median() for c in IMPUTE_MEDIAN}
+    df_final, before = finalize(df, medians)
     print(f"[preprocess] Final numeric coercion drop: {before} -> {len(df_final)}")
 
-    print(f"[preprocess] Writing: {OUTPUT_PATH}")
-    df_final.to_csv(OUTPUT_PATH, index=False)
+    writer = StageWriter(output_path)
+    print(f"[preprocess] Writing: {', '.join(writer.paths)}")
+    writer.write(df_final)
+    writer.close()
+    return df_final
+
+
+def run_chunked(input_path: str, output_path: str, chunksize: int) -> Tuple[int, float]:
+    """Two passes over the input in chunks. Returns (rows written, default rate)."""
+    print(f"[preprocess] Streaming: {resolve(input_path)} (chunksize={chunksize})")
+    _read_header(input_path)
+
+    # Pass 1: imputation medians over the rows that survive the filters
+    medians_acc = {c: StreamingMedian() for c in IMPUTE_MEDIAN}
+    loaded = after_status = after_required = 0
+    for chunk in _iter_chunks(input_path, chunksize):
+        loaded += len(chunk)
+        kept, n_status = derive(chunk)
+        after_status += n_status
+        after_required += len(kept)
+        for c, acc in medians_acc.items():
+            acc.update(kept[c])
+    medians = {c: acc.median() for c, acc in medians_acc.items()}
+    print(f"[preprocess] Filter loan_status to {VALID_STATUSES}: {loaded} -> {after_status}")
+    print(f"[preprocess] Drop rows missing required {REQUIRED}: {after_status} -> {after_required}")
+    print(f"[preprocess] Imputation medians: {medians}")
+
+    # Pass 2: clean and append chunk by chunk
+    writer = StageWriter(output_path)
+    print(f"[preprocess] Writing: {', '.join(writer.paths)}")
+    written = defaults = 0
+    for chunk in _iter_chunks(input_path, chunksize):
+        kept, _ = derive(chunk)
+        df_final, _ = finalize(kept, medians)
+        if len(df_final):
+            writer.write(df_final)
+        written += len(df_final)
+        defaults += int(df_final["default"].sum())
+    writer.close(FINAL_COLS)
+    print(f"[preprocess] Final numeric coercion drop: {after_required} -> {written}")
+    return written, defaults / written if written else float("nan")
+
+
+def _derive_spill(
+    path: str, start: int, end: int, columns: List[str], spill_path: str
+) -> Tuple[Dict[str, StreamingMedian], int, int, int]:
+    """Pass 1 worker: parse and derive one byte range, spill the kept rows, return its median and row counts."""
+    chunk = read_csv_range(path, start, end, columns, list(READ_DTYPES), READ_DTYPES)
+    kept, n_status = derive(chunk)
+    kept.to_pickle(spill_path)
+    medians = {c: StreamingMedian() for c in IMPUTE_MEDIAN}
+    for c, acc in medians.items():
+        acc.update(kept[c])
+    return medians, len(chunk), n_status, len(kept)
+
+
+def _finalize_spill(spill_path: str, medians: Dict[str, float], as_text: bool) -> Tuple[Any, int, int]:
+    """Pass 2 worker: impute and coerce one spilled chunk; returns it rendered as CSV (no header) or as a frame."""
+    df_final, _ = finalize(pd.read_pickle(spill_path), medians)
+    os.remove(spill_path)
+    out = df_final.to_csv(index=False, header=False) if as_text else df_final
+    return out, len(df_final), int(df_final["default"].sum())
+
+
+def run_parallel(input_path: str, output_path: str, chunk_bytes: int, workers: int) -> Tuple[int, float]:
+    """
+    run_chunked on a process pool. Workers parse their own byte ranges, so
+    CSV parsing, string percent parsing, the emp_length regex and the date
+    conversion all run in parallel; the parent only finds range boundaries and
+    concatenates rendered CSV. Returns (rows written, default rate).
+    """
+    if resolve(input_path).endswith(".parquet"):
+        print("[preprocess] Byte ranges need CSV input; Parquet input runs chunked")
+        return run_chunked(input_path, output_path, 100_000)
+    print(f"[preprocess] Streaming: {input_path} (chunk={chunk_bytes / 2**20:.0f} MB, workers={workers})")
+    _read_header(input_path)
+    columns, ranges = split_csv_ranges(input_path, chunk_bytes)
+    spill_dir = tempfile.mkdtemp(prefix="preprocess_", dir=os.path.dirname(os.path.abspath(output_path)))
+    spills = [os.path.join(spill_dir, f"chunk_{i:06d}.pkl") for i in range(len(ranges))]
+    pass1_args = ((input_path, start, end, columns, spill) for (start, end), spill in zip(ranges, spills))
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Pass 1: derive + spill, merge median counts
+            medians_acc = {c: StreamingMedian() for c in IMPUTE_MEDIAN}
+            loaded = after_status = after_required = 0
+            for part, n_loaded, n_status, n_kept in ordered_map(pool, _derive_spill, pass1_args, 2 * workers):
+                for c, acc in medians_acc.items():
+                    acc.merge(part[c])
+                loaded += n_loaded
+                after_status += n_status
+                after_required += n_kept
+            medians = {c: acc.median() for c, acc in medians_acc.items()}
+            print(f"[preprocess] Filter loan_status to {VALID_STATUSES}: {loaded} -> {after_status}")
+            print(f"[preprocess] Drop rows missing required {REQUIRED}: {after_status} -> {after_required}")
+            print(f"[preprocess] Imputation medians: {medians}")
+
+            # Pass 2: finalize spilled chunks, write in input order
+            # CSV-only output is rendered in the workers; Parquet is written by the parent
+            writer = StageWriter(output_path)
+            as_text = writer.parquet_path is None
+            print(f"[preprocess] Writing: {', '.join(writer.paths)}")
+            written = defaults = 0
+            for out, n_rows, n_defaults in ordered_map(
+                pool, _finalize_spill, ((p, medians, as_text) for p in spills), 2 * workers
+            ):
+                if as_text:
+                    writer.write_csv_text(out, header=FINAL_COLS)
+                elif n_rows:
+                    writer.write(out)
+                written += n_rows
+                defaults += n_defaults
+            writer.close(FINAL_COLS)
+    finally:
+        for p in spills:
+            if os.path.exists(p):
+                os.remove(p)
+        os.rmdir(spill_dir)
+    print(f"[preprocess] Final numeric coercion drop: {after_required} -> {written}")
+    return written, defaults / written if written else float("nan")
+
 
-    print(f"[preprocess] Done. Final shape: {df_final.shape}")
-    print(f"[preprocess] Default rate: {df_final['default'].mean():.4f}")
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Clean sampled LendingClub loans for risk monitoring.")
+    parser.add_argument("--input", default=INPUT_PATH)
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--chunksize", type=int, default=0,
+                        help="Rows per chunk for out-of-core processing (0 = load the whole file)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes parsing and cleaning byte ranges in parallel")
+    parser.add_argument("--chunk-mb", type=float, default=32.0, help="Byte range size per task with --workers")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        rows, default_rate = run_parallel(args.input, args.output, int(args.chunk_mb * 2**20), args.workers)
+        print(f"[preprocess] Done. Final shape: ({rows}, {len(FINAL_COLS)})")
+    elif args.chunksize > 0:
+        rows, default_rate = run_chunked(args.input, args.output, args.chunksize)
+        print(f"[preprocess] Done. Final shape: ({rows}, {len(FINAL_COLS)})")
+    else:
+        df_final = run_in_memory(args.input, args.output)
+        default_rate = df_final["default"].mean()
+        print(f"[preprocess] Done. Final shape: {df_final.shape}")
+    print(f"[preprocess] Default rate: {default_rate:.4f}")
+    peak = peak_rss_mb()
+    if peak is not None:
+        print(f"[preprocess] Peak RSS: {peak:.0f} MB"
+              + (f" (largest worker {peak_rss_mb(children=True):.0f} MB)" if args.workers > 1 else ""))
     return 0
 
 
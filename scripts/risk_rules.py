@@ -16,23 +16,83 @@ Outputs:
 Notes:
 - This file contains no machine learning
 - Rules are explainable, auditable, and business-driven
+- PIPELINE_FORMAT=parquet reads clean_loans.parquet and also writes Parquet
+  copies of the outputs (see stage_io.py); the CSVs are always written
+- Rules are vectorized; segments and watchlist are written in the same pass
+  and the KPIs come from counters accumulated along the way
+- --chunksize / --workers process the portfolio in partitions (CSV byte
+  ranges or Parquet row groups) across processes; outputs keep input order
+  and the KPI counters merge exactly
+- KPI counters are kept per (risk_tier, purpose) cell and saved to
+  data/.kpi_state.json after each run. --increment <clean loans file> scores
+  only the new loans, appends them to clean_loans and to the segment and
+  watchlist CSVs, and adds their counters to the saved state, so kpi_summary
+  is updated in time proportional to the new file (CSV stage files only).
+  A file already applied is not counted twice. A full run resets the state;
+  it refuses (unless --reset) when clean_loans was replaced after increments
+  were counted, e.g. by a preprocess re-run, since they would be dropped.
 """
 
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
 import pandas as pd
 import numpy as np
 
+from stage_io import (
+    SCHEMAS,
+    StageWriter,
+    iter_stage,
+    ordered_map,
+    read_csv_range,
+    read_stage,
+    resolve,
+    split_csv_ranges,
+    stage_columns,
+    write_stage,
+)
+
 
 INPUT_PATH = "data/processed/clean_loans.csv"
 SEGMENTS_PATH = "data/processed/risk_segments.csv"
 WATCHLIST_PATH = "data/processed/early_warning_watchlist.csv"
+KPI_PATH = "data/processed/kpi_summary.csv"
+KPI_STATE_PATH = "data/.kpi_state.json"
 
 
-def main() -> None:
-    print("[risk_rules] Loading clean dataset")
-    df = pd.read_csv(INPUT_PATH)
-    print("[risk_rules] Shape:", df.shape)
+RISK_COLUMNS = [
+    "loan_amnt",
+    "purpose",
+    "annual_inc",
+    "dti",
+    "dti_band",
+    "revol_util_pct",
+    "util_band",
+    "int_rate_pct",
+    "rate_band",
+    "delinq_2yrs",
+    "inq_last_6mths",
+    "credit_history_years",
+    "early_warning_flag",
+    "risk_tier",
+    "default"
+]
+
+HIGH_BANDS = ["High", "Very High"]
+
+# KPI accumulator cells and the additive values kept per cell
+SEGMENT_COLUMNS = ["risk_tier", "purpose"]
+COUNTER_COLUMNS = ["rows", "defaults", "watchlist_rows", "watchlist_defaults", "loan_amnt"]
+
 
-    
+def apply_rules(df: pd.DataFrame) -> pd.DataFrame:
+    """Bands, early-warning flag and risk tier for a frame of clean loans (adds columns in place)."""
     # DTI risk bands
     df["dti_band"] = pd.cut(
         df["dti"],
@@ -69,61 +129,304 @@ def main() -> None:
         )
     ).astype(int)
 
-    
-    def assign_risk_tier(row):
-        if row["early_warning_flag"] == 1:
-            return "Watchlist"
-        elif (
-            row["dti_band"] in ["High", "Very High"]
-            or row["util_band"] in ["High", "Very High"]
-        ):
-            return "Elevated"
-        else:
-            return "Low"
-
-    df["risk_tier"] = df.apply(assign_risk_tier, axis=1)
-
-   
-    risk_columns = [
-        "loan_amnt",
-        "purpose",
-        "annual_inc",
-        "dti",
-        "dti_band",
-        "revol_util_pct",
-        "util_band",
-        "int_rate_pct",
-        "rate_band",
-        "delinq_2yrs",
-        "inq_last_6mths",
-        "credit_history_years",
-        "early_warning_flag",
-        "risk_tier",
-        "default"
-    ]
-
-    df[risk_columns].to_csv(SEGMENTS_PATH, index=False)
-    print("[risk_rules] Risk segments saved to:", SEGMENTS_PATH)
+    # Watchlist if flagged, Elevated if DTI or utilization is in a high band, else Low
+    df["risk_tier"] = np.select(
+        [
+            df["early_warning_flag"].to_numpy() == 1,
+            (df["dti_band"].isin(HIGH_BANDS) | df["util_band"].isin(HIGH_BANDS)).to_numpy(),
+        ],
+        ["Watchlist", "Elevated"],
+        default="Low",
+    ).astype(object)
+    return df
 
-    
-    watchlist = df[df["early_warning_flag"] == 1].copy()
 
-    watchlist.to_csv(WATCHLIST_PATH, index=False)
-    print("[risk_rules] Early-warning watchlist saved to:", WATCHLIST_PATH)
-    print("[risk_rules] Watchlist size:", watchlist.shape[0])
+class KpiCounters:
+    """
+    Additive KPI counters per (risk_tier, purpose) cell: rows, defaults,
+    watchlist rows and defaults, and loan_amnt exposure. Partitions, new
+    chunks and streamed rows merge with +; kpi_summary comes from the totals.
+    """
+    def __init__(self, cells: Optional[Dict[Tuple[str, str], List[float]]] = None):
+        self.cells = cells or {}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "KpiCounters":
+        """Counters for scored rows (a partition, a day of loans or a few streamed rows)."""
+        flagged = (df["early_warning_flag"] == 1).astype("int64")
+        default = df["default"].astype("int64")
+        counts = pd.DataFrame({
+            "rows": 1,
+            "defaults": default,
+            "watchlist_rows": flagged,
+            "watchlist_defaults": default * flagged,
+            "loan_amnt": df["loan_amnt"].fillna(0.0),
+        }, index=df.index)
+        keys = [df[c].astype(object).fillna("") for c in SEGMENT_COLUMNS]
+        grouped = counts.groupby(keys, sort=False).sum()
+        cells = {}
+        for key, *values in grouped.itertuples(name=None):
+            cells[key] = [int(v) for v in values[:-1]] + [float(values[-1])]
+        return cls(cells)
+
+    def __add__(self, other: "KpiCounters") -> "KpiCounters":
+        cells = {k: list(v) for k, v in self.cells.items()}
+        for key, values in other.cells.items():
+            if key in cells:
+                cells[key] = [a + b for a, b in zip(cells[key], values)]
+            else:
+                cells[key] = list(values)
+        return KpiCounters(cells)
+
+    def total(self, column: str) -> float:
+        i = COUNTER_COLUMNS.index(column)
+        return sum(v[i] for v in self.cells.values())
+
+    @property
+    def portfolio_rows(self) -> int:
+        return self.total("rows")
+
+    @property
+    def watchlist_rows(self) -> int:
+        return self.total("watchlist_rows")
+
+    def by_tier(self) -> Dict[str, int]:
+        rows: Dict[str, int] = {}
+        for (tier, _), values in self.cells.items():
+            rows[tier] = rows.get(tier, 0) + values[0]
+        return dict(sorted(rows.items()))
+
+    def to_frame(self) -> pd.DataFrame:
+        n, w = self.portfolio_rows, self.watchlist_rows
+        defaults, watchlist_defaults = self.total("defaults"), self.total("watchlist_defaults")
+        baseline = defaults / n if n else np.nan
+        watchlist_rate = watchlist_defaults / w if w > 0 else np.nan
+        return pd.DataFrame([{
+            "portfolio_rows": n,
+            "baseline_default_rate": float(baseline),
+            "watchlist_rows": int(w),
+            "watchlist_share": float(w / n) if n else np.nan,
+            "watchlist_default_rate": float(watchlist_rate) if w > 0 else np.nan,
+            "lift_vs_baseline": float(watchlist_rate / baseline) if w > 0 else np.nan
+        }])
+
+    def to_json(self) -> dict:
+        return {
+            "columns": SEGMENT_COLUMNS + COUNTER_COLUMNS,
+            "cells": [[*key, *values] for key, values in self.cells.items()],
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "KpiCounters":
+        if data.get("columns") != SEGMENT_COLUMNS + COUNTER_COLUMNS:
+            raise ValueError("KPI state was written with different columns; run a full pass")
+        k = len(SEGMENT_COLUMNS)
+        return cls({tuple(cell[:k]): cell[k:] for cell in data["cells"]})
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def file_stamp(path: str) -> List[int]:
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def load_kpi_state(path: str = KPI_STATE_PATH) -> Optional[Dict[str, Any]]:
+    """
+    Saved KPI state, or None before the first full run:
+      kpi      KpiCounters
+      sources  digests of the inputs counted (the full-run input, then each increment)
+      input    (size, mtime_ns) of clean_loans once they were counted
+      pending  file sizes before an increment's appends, until it is counted
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        state = json.load(f)
+    state["kpi"] = KpiCounters.from_json(state["kpi"])
+    return state
+
+
+def save_kpi_state(state: Dict[str, Any], path: str = KPI_STATE_PATH) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({**state, "kpi": state["kpi"].to_json()}, f)
+    os.replace(tmp, path)
 
 
-    kpi = pd.DataFrame([{
-        "portfolio_rows": len(df),
-        "baseline_default_rate": float(df["default"].mean()),
-        "watchlist_rows": int(watchlist.shape[0]),
-        "watchlist_share": float(watchlist.shape[0] / len(df)),
-        "watchlist_default_rate": float(watchlist["default"].mean()) if watchlist.shape[0] > 0 else np.nan,
-        "lift_vs_baseline": float(watchlist["default"].mean() / df["default"].mean()) if watchlist.shape[0] > 0 else np.nan
-    }])
+def score_partition(df: pd.DataFrame, as_text: bool) -> Tuple[Any, Any, KpiCounters]:
+    """Rules + both outputs + KPI counters for one partition; outputs as CSV text (no header) or frames."""
+    df = apply_rules(df)
+    segments = df[RISK_COLUMNS]
+    watchlist = df[df["early_warning_flag"] == 1]
+    kpi = KpiCounters.from_frame(df)
+    if as_text:
+        return segments.to_csv(index=False, header=False), watchlist.to_csv(index=False, header=False), kpi
+    return segments, watchlist, kpi
+
+
+def _score_range(path: str, start: int, end: int, columns: List[str], as_text: bool):
+    chunk = read_csv_range(path, start, end, columns, dtype={c: t for c, t in SCHEMAS["clean_loans"].items() if c in columns})
+    return score_partition(chunk, as_text)
+
+
+def _score_row_group(path: str, group: int, as_text: bool):
+    import pyarrow.parquet as pq
+
+    return score_partition(pq.ParquetFile(path).read_row_group(group).to_pandas(), as_text)
+
+
+def _partitions(path: str, chunksize: int) -> Tuple[Any, Iterator[tuple]]:
+    """(worker function, argument tuples) covering the input in order."""
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        return _score_row_group, ((path, g) for g in range(pq.ParquetFile(path).num_row_groups))
+    # ~chunksize rows per range, estimated from the average row width
+    with open(path, "rb") as f:
+        sample = f.read(1 << 20)
+    row_bytes = max(1, len(sample) // max(1, sample.count(b"\n")))
+    columns, ranges = split_csv_ranges(path, max(1 << 16, chunksize * row_bytes))
+    return _score_range, ((path, start, end, columns) for start, end in ranges)
+
+
+def apply_increment(path: str) -> Optional[KpiCounters]:
+    """
+    Score a file of new clean loans, append it to clean_loans and to the
+    segment and watchlist CSVs, and add its counters to the saved KPI state.
+    Returns the updated counters, or None when the file was already counted.
+
+    The file sizes are saved as "pending" before appending and the counters
+    after, so an increment interrupted in between is truncated away and
+    applied again by the next --increment.
+    """
+    if resolve(INPUT_PATH).endswith(".parquet") or StageWriter(SEGMENTS_PATH).parquet_path:
+        raise SystemExit("[risk_rules] --increment appends to the CSV stage files; run it with PIPELINE_FORMAT=csv")
+    state = load_kpi_state()
+    if state is None:
+        raise SystemExit(f"[risk_rules] No KPI state at {KPI_STATE_PATH}; run a full pass first")
+    if state.get("pending"):
+        for target, size in state["pending"].items():
+            with open(target, "r+b") as f:
+                f.truncate(size)
+        print("[risk_rules] Rolled back an interrupted increment")
+        state["pending"] = None
+        save_kpi_state(state)
+
+    source = resolve(path)
+    digest = file_digest(source)
+    if digest in state["sources"]:
+        print("[risk_rules] Increment already counted:", source)
+        return None
+    columns = stage_columns(source)
+    if columns != stage_columns(INPUT_PATH):
+        raise SystemExit(f"[risk_rules] {source} does not have the columns of {INPUT_PATH}")
+
+    df = read_stage(source, dtype={c: t for c, t in SCHEMAS["clean_loans"].items() if c in columns})
+    print("[risk_rules] Increment shape:", df.shape)
+    segments, watchlist, part = score_partition(df.copy(), as_text=True)
+    if source.endswith(".csv"):
+        with open(source, "rb") as f:
+            f.readline()
+            clean_rows = f.read().decode("utf-8")
+    else:
+        clean_rows = df.to_csv(index=False, header=False)
+
+    appends = [(INPUT_PATH, clean_rows), (SEGMENTS_PATH, segments), (WATCHLIST_PATH, watchlist)]
+    state["pending"] = {target: os.path.getsize(target) for target, _ in appends}
+    save_kpi_state(state)
+    for target, text in appends:
+        if text:
+            StageWriter(target, "csv", append=True).write_csv_text(text if text.endswith("\n") else text + "\n")
+    state["kpi"] += part
+    state["sources"].append(digest)
+    state["input"] = file_stamp(INPUT_PATH)
+    state["pending"] = None
+    save_kpi_state(state)
+    print("[risk_rules] Appended", part.portfolio_rows, "rows to", INPUT_PATH, "and", SEGMENTS_PATH)
+    print("[risk_rules] Appended", part.watchlist_rows, "rows to", WATCHLIST_PATH)
+    return state["kpi"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rule-based risk banding, watchlist and KPIs.")
+    parser.add_argument("--chunksize", type=int, default=0,
+                        help="Rows per partition (0 = whole file in memory)")
+    parser.add_argument("--workers", type=int, default=1, help="Processes scoring partitions in parallel")
+    parser.add_argument("--increment", metavar="PATH",
+                        help="Clean loans to add to the existing outputs and KPI state (e.g. one new day)")
+    parser.add_argument("--reset", action="store_true",
+                        help="Full run even if clean_loans no longer holds increments counted in the KPI state")
+    args = parser.parse_args()
+
+    if args.increment:
+        kpi = apply_increment(args.increment)
+        if kpi is not None:
+            write_stage(kpi.to_frame(), KPI_PATH)
+            print("[risk_rules] Rows per tier:", kpi.by_tier())
+            print("[risk_rules] KPI summary saved to:", KPI_PATH)
+        return
+
+    path = resolve(INPUT_PATH)
+    state = load_kpi_state()
+    if state is not None and len(state["sources"]) > 1 and state.get("input") != file_stamp(path) and not args.reset:
+        raise SystemExit(
+            f"[risk_rules] {path} changed since {len(state['sources']) - 1} increment(s) were counted, so a full "
+            "run may drop them. Re-run with --reset to rebuild from this input, then re-apply the increments."
+        )
+    print("[risk_rules] Loading clean dataset:", path)
+    segments_out = StageWriter(SEGMENTS_PATH)
+    watchlist_out = StageWriter(WATCHLIST_PATH)
+    # CSV-only outputs are rendered where the partition is scored
+    as_text = segments_out.parquet_path is None and watchlist_out.parquet_path is None
+    kpi = KpiCounters()
+
+    def write(segments, watchlist, columns: List[str]) -> None:
+        if as_text:
+            segments_out.write_csv_text(segments, header=RISK_COLUMNS)
+            watchlist_out.write_csv_text(watchlist, header=columns)
+        else:
+            segments_out.write(segments)
+            if len(watchlist) or watchlist_out.parquet_path is None:
+                watchlist_out.write(watchlist)
+
+    watchlist_columns = stage_columns(INPUT_PATH) + ["dti_band", "util_band", "rate_band", "early_warning_flag", "risk_tier"]
+    if args.workers > 1 or args.chunksize > 0:
+        if args.workers > 1:
+            fn, parts = _partitions(path, args.chunksize or 1_000_000)
+            with ProcessPoolExecutor(max_workers=args.workers) as pool:
+                for segments, watchlist, part in ordered_map(pool, fn, (p + (as_text,) for p in parts), 2 * args.workers):
+                    write(segments, watchlist, watchlist_columns)
+                    kpi += part
+        else:
+            for chunk in iter_stage(INPUT_PATH, args.chunksize):
+                segments, watchlist, part = score_partition(chunk, as_text)
+                write(segments, watchlist, watchlist_columns)
+                kpi += part
+        print("[risk_rules] Shape:", (kpi.portfolio_rows, len(watchlist_columns) - 5))
+    else:
+        df = read_stage(INPUT_PATH)
+        print("[risk_rules] Shape:", df.shape)
+        segments, watchlist, kpi = score_partition(df, as_text)
+        write(segments, watchlist, watchlist_columns)
+
+    segments_out.close(RISK_COLUMNS)
+    watchlist_out.close(watchlist_columns)
+    print("[risk_rules] Risk segments saved to:", SEGMENTS_PATH)
+    print("[risk_rules] Early-warning watchlist saved to:", WATCHLIST_PATH)
+    print("[risk_rules] Watchlist size:", kpi.watchlist_rows)
+    print("[risk_rules] Rows per tier:", kpi.by_tier())
 
-    kpi.to_csv("data/processed/kpi_summary.csv", index=False)
-    print("[risk_rules] KPI summary saved to: data/processed/kpi_summary.csv")
+    write_stage(kpi.to_frame(), KPI_PATH)
+    save_kpi_state({"kpi": kpi, "sources": [file_digest(path)], "input": file_stamp(path), "pending": None})
+    print("[risk_rules] KPI summary saved to:", KPI_PATH)
 
 
 if __name__ == "__main__":
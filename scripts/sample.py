@@ -1,15 +1,208 @@
+"""
+sample.py
+
+Purpose:
+- Draw a reproducible random sample of the raw LendingClub file
+
+Inputs:
+- data/raw/appl_accepted_20072019Q3.csv
+
+Outputs:
+- data/processed/sample_100k.csv (or .parquet, see stage_io.py)
+
+Notes:
+- Reads the file in chunks; memory is proportional to the sample (plus one
+  chunk), not to the input
+- Every row gets a seeded uniform key and the rows with the smallest keys
+  are kept (bottom-k, a uniform sample without replacement). Keys come from
+  one seeded stream in file order, so the sample depends only on the seed,
+  not on the chunk size. --hash-column keys rows by a hash of that column
+  instead, so the sample is also stable when rows are reordered or appended.
+- --stratify loan_status | issue_year | <column> keeps a bottom-k per stratum
+  and allocates the sample proportionally to stratum sizes (largest
+  remainder), or equally with --allocation equal. Allocations are only known
+  at the end, so pass 1 keeps just keys and row numbers per stratum and a
+  second pass reads the chosen rows.
+- Rows are written in file order
+"""
+
+from __future__ import annotations
+
+import argparse
+from typing import Dict, Optional
+
+import numpy as np
 import pandas as pd
 
-print("Loading data...")
+from stage_io import write_stage
+
+INPUT_PATH = "data/raw/appl_accepted_20072019Q3.csv"
+OUTPUT_PATH = "data/processed/sample_100k.csv"
+
+
+class BottomK:
+    """The k rows with the smallest keys offered so far (row numbers only when no frame is given)."""
+    def __init__(self, k: int):
+        self.k = k
+        self.frame: Optional[pd.DataFrame] = None
+        self.keys = np.empty(0)
+        self.rows = np.empty(0, dtype=np.int64)
+
+    @property
+    def threshold(self) -> float:
+        """Keys at or above this cannot enter any more."""
+        return float(self.keys.max()) if len(self.keys) >= self.k else np.inf
+
+    def offer(self, frame: Optional[pd.DataFrame], keys: np.ndarray, rows: np.ndarray) -> None:
+        mask = keys < self.threshold
+        if not mask.any():
+            return
+        keys, rows = keys[mask], rows[mask]
+        frame = frame[mask] if frame is not None else None
+        if self.frame is not None and frame is not None:
+            frame = pd.concat([self.frame, frame], ignore_index=True)
+        keys = np.concatenate([self.keys, keys])
+        rows = np.concatenate([self.rows, rows])
+        if len(keys) > self.k:
+            keep = np.argpartition(keys, self.k - 1)[: self.k]
+            keys, rows = keys[keep], rows[keep]
+            frame = frame.iloc[keep].reset_index(drop=True) if frame is not None else None
+        self.frame, self.keys, self.rows = frame, keys, rows
+
+    def smallest_rows(self, n: int) -> np.ndarray:
+        return self.rows[np.argsort(self.keys, kind="stable")[:max(0, n)]]
+
+    def smallest(self, n: int) -> pd.DataFrame:
+        if self.frame is None or n <= 0:
+            return pd.DataFrame()
+        order = np.argsort(self.keys, kind="stable")[:n]
+        return self.frame.iloc[order].assign(_row=self.rows[order])
+
+
+def _keys(chunk: pd.DataFrame, rng: np.random.Generator, hash_column: Optional[str], seed: int) -> np.ndarray:
+    if hash_column is None:
+        return rng.random(len(chunk))
+    hashed = pd.util.hash_pandas_object(chunk[hash_column].astype(str), index=False, hash_key=f"{seed:016d}"[-16:])
+    return hashed.to_numpy(dtype=np.uint64) / float(2 ** 64)
+
+
+def _strata(chunk: pd.DataFrame, stratify: str) -> pd.Series:
+    if stratify == "issue_year":
+        # issue_d is "Dec-2015" in older files and "Dec-15" in newer ones
+        year = chunk["issue_d"].astype(str).str.extract(r"(\d{2,4})\s*$", expand=False)
+        values = year.where(year.str.len() != 2, "20" + year)
+    else:
+        values = chunk[stratify].astype(str).where(chunk[stratify].notna())
+    return values.fillna("missing")
+
+
+def allocate(sizes: Dict[str, int], n: int, allocation: str = "proportional") -> Dict[str, int]:
+    """
+    Sample size per stratum: proportional to stratum size or equal, rounded by
+    largest remainder. Strata smaller than their share are taken whole and the
+    rest is re-allocated over the others.
+    """
+    alloc = {s: 0 for s in sizes}
+    open_ = {s for s, size in sizes.items() if size}
+    remaining = min(n, sum(sizes.values()))
+    while remaining and open_:
+        weight = {s: (1 if allocation == "equal" else sizes[s]) for s in open_}
+        total = sum(weight.values())
+        share = {s: remaining * w / total for s, w in weight.items()}
+        cap = {s: sizes[s] - alloc[s] for s in open_}
+        full = {s for s in open_ if share[s] >= cap[s]}
+        if full:
+            for s in full:
+                alloc[s] += cap[s]
+                remaining -= cap[s]
+            open_ -= full
+            continue
+        base = {s: int(share[s]) for s in open_}
+        extra = remaining - sum(base.values())
+        for s in sorted(open_, key=lambda s: (base[s] - share[s], s))[:extra]:
+            base[s] += 1
+        for s in open_:
+            alloc[s] += base[s]
+        break
+    return alloc
+
+
+def sample_csv(
+    path: str,
+    n: int,
+    seed: int = 42,
+    chunksize: int = 200_000,
+    stratify: Optional[str] = None,
+    allocation: str = "proportional",
+    hash_column: Optional[str] = None,
+) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    reservoirs: Dict[str, BottomK] = {}
+    sizes: Dict[str, int] = {}
+    offset = 0
+    for chunk in pd.read_csv(path, chunksize=chunksize, low_memory=False):
+        keys = _keys(chunk, rng, hash_column, seed)
+        rows = np.arange(offset, offset + len(chunk))
+        offset += len(chunk)
+        print(f"[sample] Read {offset} rows")
+        if stratify is None:
+            reservoirs.setdefault("all", BottomK(n)).offer(chunk, keys, rows)
+            sizes["all"] = offset
+            continue
+        # keys and row numbers only: up to n per stratum, rows are read in pass 2
+        strata = _strata(chunk, stratify)
+        for stratum, idx in strata.groupby(strata, sort=False).indices.items():
+            sizes[stratum] = sizes.get(stratum, 0) + len(idx)
+            reservoirs.setdefault(stratum, BottomK(n)).offer(None, keys[idx], rows[idx])
+
+    alloc = allocate(sizes, n, allocation)
+    if stratify is None:
+        parts = [reservoirs[s].smallest(k) for s, k in alloc.items() if k]
+        if not parts:
+            return pd.DataFrame()
+        out = pd.concat(parts, ignore_index=True).sort_values("_row", kind="stable")
+        return out.drop(columns="_row").reset_index(drop=True)
+
+    print("[sample] Per stratum:", {s: f"{alloc[s]}/{sizes[s]}" for s in sorted(sizes)})
+    chosen = [reservoirs[s].smallest_rows(k) for s, k in alloc.items() if k]
+    if not chosen:
+        return pd.DataFrame()
+    return _read_rows(path, np.sort(np.concatenate(chosen)), chunksize)
+
+
+def _read_rows(path: str, wanted: np.ndarray, chunksize: int) -> pd.DataFrame:
+    """Pass 2: the rows with these (sorted) row numbers, in file order."""
+    parts = []
+    offset = 0
+    for chunk in pd.read_csv(path, chunksize=chunksize, low_memory=False):
+        lo, hi = np.searchsorted(wanted, [offset, offset + len(chunk)])
+        if hi > lo:
+            parts.append(chunk.iloc[wanted[lo:hi] - offset])
+        offset += len(chunk)
+        if hi == len(wanted):
+            break
+    return pd.concat(parts, ignore_index=True)
 
-df = pd.read_csv("data/raw/appl_accepted_20072019Q3.csv")
 
-print("Data loaded:", df.shape)
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Reproducible streaming sample of the raw LendingClub file.")
+    parser.add_argument("--input", default=INPUT_PATH)
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("-n", "--size", type=int, default=100_000, help="Rows in the sample")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunksize", type=int, default=200_000, help="Rows read per chunk")
+    parser.add_argument("--stratify", help="loan_status | issue_year | any column")
+    parser.add_argument("--allocation", default="proportional", choices=["proportional", "equal"])
+    parser.add_argument("--hash-column", help="Key rows by a seeded hash of this column (e.g. id) instead of position")
+    args = parser.parse_args()
 
-df = df.sample(n=100_000, random_state=42)
+    print("Sampling data...")
+    df = sample_csv(args.input, args.size, args.seed, args.chunksize, args.stratify, args.allocation, args.hash_column)
+    print("Sampled data:", df.shape)
 
-print("Sampled data:", df.shape)
+    written = write_stage(df, args.output)
+    print("Saved sampled file:", ", ".join(written))
 
-df.to_csv("data/processed/sample_100k.csv", index=False)
 
-print("Saved sampled file.")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+stage_io.py
+
+Purpose:
+- Read and write the datasets passed between batch stages
+  (sample.py -> preprocess.py -> risk_rules.py -> analysis/logistic_regression.py)
+- Parquet intermediates with a declared schema and categorical columns,
+  CSV kept for the files Tableau and Excel open
+
+Notes:
+- PIPELINE_FORMAT=csv (default) keeps every stage on CSV, as before
+- PIPELINE_FORMAT=parquet writes <name>.parquet for every stage, plus the
+  <name>.csv copy for exports (CSV_EXPORTS); readers prefer the .parquet file
+  and read only the columns they use
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import sys
+from collections import deque
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PIPELINE_FORMAT = os.getenv("PIPELINE_FORMAT", "csv").lower()  # csv | parquet
+
+# Files opened by Tableau / Excel: always written as CSV as well
+CSV_EXPORTS = {
+    "risk_segments",
+    "early_warning_watchlist",
+    "kpi_summary",
+    "risk_segments_with_predictions",
+}
+
+BANDS = ["Low", "Moderate", "High", "Very High"]
+
+# Parquet row group size: the unit partitioned stages hand to a worker
+ROW_GROUP_ROWS = 250_000
+
+# Declared column types per dataset. Columns not listed keep their inferred type.
+SCHEMAS: Dict[str, Dict[str, object]] = {
+    "clean_loans": {
+        "loan_amnt": "float64",
+        "term": "category",
+        "installment": "float64",
+        "purpose": "category",
+        "annual_inc": "float64",
+        "dti": "float64",
+        "int_rate_pct": "float64",
+        "revol_util_pct": "float64",
+        "delinq_2yrs": "float64",
+        "inq_last_6mths": "float64",
+        "open_acc": "float64",
+        "total_acc": "float64",
+        "emp_length_yrs": "float64",
+        "credit_history_years": "float64",
+        "default": "int64",
+    },
+}
+SCHEMAS["risk_segments"] = {
+    **{c: t for c, t in SCHEMAS["clean_loans"].items() if c not in ("term", "installment", "open_acc", "total_acc", "emp_length_yrs")},
+    "dti_band": pd.CategoricalDtype(BANDS, ordered=True),
+    "util_band": pd.CategoricalDtype(BANDS, ordered=True),
+    "rate_band": pd.CategoricalDtype(BANDS, ordered=True),
+    "early_warning_flag": "int64",
+    "risk_tier": pd.CategoricalDtype(["Low", "Elevated", "Watchlist"]),
+}
+SCHEMAS["early_warning_watchlist"] = {**SCHEMAS["clean_loans"], **SCHEMAS["risk_segments"]}
+SCHEMAS["risk_segments_with_predictions"] = {**SCHEMAS["risk_segments"], "pred_default_prob": "float64"}
+
+
+def dataset_name(path: str) -> str:
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def with_suffix(path: str, suffix: str) -> str:
+    return os.path.splitext(path)[0] + suffix
+
+
+def conform(df: pd.DataFrame, name: str) -> pd.DataFrame:
+    """Cast to the declared schema; undeclared text columns become category when low-cardinality."""
+    schema = SCHEMAS.get(name, {})
+    casts = {c: t for c, t in schema.items() if c in df.columns and str(df[c].dtype) != str(t)}
+    df = df.astype(casts) if casts else df
+    text = {}
+    for c in df.columns:
+        if c in schema or df[c].dtype != object:
+            continue
+        s = df[c]
+        # mixed str/float object columns (raw LendingClub text) cannot go to Parquet as-is
+        s = s.where(s.isna(), s.astype(str))
+        text[c] = s.astype("category") if s.nunique() <= max(50, len(s) // 100) else s
+    # a new frame: the caller's columns are never replaced in place
+    return df.assign(**text) if text else df
+
+
+def resolve(path: str, fmt: Optional[str] = None) -> str:
+    """The file a reader should open: <name>.parquet in parquet mode when it exists, else the CSV."""
+    fmt = fmt or PIPELINE_FORMAT
+    if path.endswith(".parquet"):
+        return path
+    parquet = with_suffix(path, ".parquet")
+    if fmt == "parquet" and os.path.exists(parquet):
+        return parquet
+    return path
+
+
+def stage_columns(path: str, fmt: Optional[str] = None) -> List[str]:
+    path = resolve(path, fmt)
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        return pq.read_schema(path).names
+    return pd.read_csv(path, nrows=0).columns.tolist()
+
+
+def read_stage(
+    path: str,
+    columns: Optional[List[str]] = None,
+    dtype: Optional[Dict[str, object]] = None,
+    fmt: Optional[str] = None,
+) -> pd.DataFrame:
+    """Read a stage output, column-pruned. CSV reads apply the declared schema as read dtypes."""
+    path = resolve(path, fmt)
+    if path.endswith(".parquet"):
+        df = pd.read_parquet(path, columns=columns)
+        return df.astype(dtype) if dtype else df
+    if dtype is None:
+        schema = SCHEMAS.get(dataset_name(path), {})
+        dtype = {c: t for c, t in schema.items() if columns is None or c in columns} or None
+    return pd.read_csv(path, usecols=columns, dtype=dtype, low_memory=False)
+
+
+def iter_stage(
+    path: str,
+    chunksize: int,
+    columns: Optional[List[str]] = None,
+    dtype: Optional[Dict[str, object]] = None,
+    fmt: Optional[str] = None,
+) -> Iterator[pd.DataFrame]:
+    """Chunks of about `chunksize` rows (Parquet: record batches of the selected columns)."""
+    path = resolve(path, fmt)
+    if not path.endswith(".parquet"):
+        if dtype is None:
+            schema = SCHEMAS.get(dataset_name(path), {})
+            dtype = {c: t for c, t in schema.items() if columns is None or c in columns} or None
+        yield from pd.read_csv(path, usecols=columns, dtype=dtype, chunksize=chunksize)
+        return
+    import pyarrow.parquet as pq
+
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+        df = batch.to_pandas()
+        yield df.astype(dtype) if dtype else df
+
+
+def split_csv_ranges(path: str, target_bytes: int) -> Tuple[List[str], List[Tuple[int, int]]]:
+    """
+    Header columns and (start, end) byte ranges of roughly `target_bytes`
+    covering the data rows, for workers that parse their own partition.
+    Ranges end on a newline outside quotes (even quote count since the range
+    start), so quoted free text spanning lines (e.g. `desc`) is never cut.
+    """
+    ranges = []
+    with open(path, "rb") as f:
+        columns = pd.read_csv(io.BytesIO(f.readline()), nrows=0).columns.tolist()
+        start = f.tell()
+        while True:
+            block = f.read(target_bytes)
+            if not block:
+                break
+            quotes = block.count(b'"')
+            end = start + len(block)
+            if block.endswith(b"\n") and quotes % 2 == 0:
+                ranges.append((start, end))
+                start = end
+                continue
+            # extend to the next newline outside quotes
+            while True:
+                line = f.readline()
+                if not line:
+                    break
+                quotes += line.count(b'"')
+                end += len(line)
+                if quotes % 2 == 0:
+                    break
+            ranges.append((start, end))
+            start = end
+    return columns, ranges
+
+
+def read_csv_range(
+    path: str,
+    start: int,
+    end: int,
+    columns: List[str],
+    usecols: Optional[List[str]] = None,
+    dtype: Optional[Dict[str, object]] = None,
+) -> pd.DataFrame:
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return pd.read_csv(io.BytesIO(data), header=None, names=columns, usecols=usecols, dtype=dtype)
+
+
+def ordered_map(pool: Executor, fn: Callable, args: Iterable[Tuple], window: int) -> Iterator[Any]:
+    """pool.map with at most `window` tasks in flight, results in submission order."""
+    pending: deque = deque()
+    for a in args:
+        pending.append(pool.submit(fn, *a))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def rss_mb(ru_maxrss: int) -> float:
+    """ru_maxrss in MB: bytes on macOS, KiB on Linux and the other Unixes."""
+    return ru_maxrss / (1024 * 1024) if sys.platform == "darwin" else ru_maxrss / 1024
+
+
+def peak_rss_mb(children: bool = False) -> Optional[float]:
+    """Peak RSS of this process (or of its largest finished child); None where getrusage is missing."""
+    if resource is None:
+        return None
+    return rss_mb(resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss)
+
+
+def write_stage(df: pd.DataFrame, path: str, fmt: Optional[str] = None) -> List[str]:
+    """
+    Write a stage output. `path` is the CSV path; in parquet mode the Parquet
+    file is written next to it, and the CSV only for CSV_EXPORTS.
+    An explicit .parquet path is always written as Parquet.
+    Returns the paths written.
+    """
+    fmt = fmt or PIPELINE_FORMAT
+    name = dataset_name(path)
+    written = []
+    if fmt == "parquet" or path.endswith(".parquet"):
+        target = with_suffix(path, ".parquet")
+        conform(df, name).to_parquet(target, index=False, row_group_size=ROW_GROUP_ROWS)
+        written.append(target)
+    if not path.endswith(".parquet") and (fmt != "parquet" or name in CSV_EXPORTS):
+        df.to_csv(path, index=False)
+        written.append(path)
+    return written
+
+
+class StageWriter:
+    """
+    Chunk-by-chunk write_stage (same files), for out-of-core stages.
+    append=True adds rows to an existing CSV (no header); not supported for Parquet.
+    """
+    def __init__(self, path: str, fmt: Optional[str] = None, append: bool = False):
+        fmt = fmt or PIPELINE_FORMAT
+        self.name = dataset_name(path)
+        self.parquet_path = with_suffix(path, ".parquet") if fmt == "parquet" or path.endswith(".parquet") else None
+        self.csv_path = path if not path.endswith(".parquet") and (fmt != "parquet" or self.name in CSV_EXPORTS) else None
+        if append and self.parquet_path:
+            raise ValueError("Parquet stage outputs cannot be appended to")
+        self._pq = None
+        self._csv_started = append and self.csv_path is not None and os.path.exists(self.csv_path)
+
+    @property
+    def paths(self) -> List[str]:
+        return [p for p in (self.parquet_path, self.csv_path) if p]
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self.parquet_path:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(conform(df, self.name), preserve_index=False)
+            if self._pq is None:
+                self._pq = pq.ParquetWriter(self.parquet_path, table.schema)
+            self._pq.write_table(table.cast(self._pq.schema), row_group_size=ROW_GROUP_ROWS)
+        if self.csv_path:
+            self.write_csv_text(df.to_csv(index=False, header=not self._csv_started))
+
+    def write_csv_text(self, text: str, header: Optional[List[str]] = None) -> None:
+        """Append pre-rendered CSV rows (header added on the first call when given)."""
+        mode = "a" if self._csv_started else "w"
+        with open(self.csv_path, mode, newline="") as f:
+            if not self._csv_started and header:
+                f.write(",".join(header) + "\n")
+            f.write(text)
+        self._csv_started = True
+
+    def close(self, columns: Optional[List[str]] = None) -> None:
+        """Finish the files; with no rows written, write an empty frame with `columns`."""
+        if self._pq is None and not self._csv_started and columns is not None:
+            write_stage(pd.DataFrame(columns=columns), self.csv_path or self.parquet_path,
+                        "parquet" if self.parquet_path else "csv")
+        if self._pq is not None:
+            self._pq.close()
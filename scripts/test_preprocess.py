@@ -0,0 +1,93 @@
+"""
+Run: python -m pytest scripts
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from preprocess import StreamingMedian, _parse_month_year, run_chunked, run_in_memory, run_parallel
+from stage_io import read_csv_range, split_csv_ranges
+
+
+@pytest.fixture
+def raw_csv(tmp_path):
+    """A small sampled-loans file with the messy values preprocess cleans, and multi-line quoted text."""
+    rng = np.random.default_rng(0)
+    n = 120
+    df = pd.DataFrame({
+        "id": np.arange(n),
+        "loan_amnt": rng.integers(1, 40, n) * 500.0,
+        "term": rng.choice([" 36 months", " 60 months"], n),
+        "int_rate": rng.choice(["13.56%", " 7.9%", "21%", None], n, p=[0.4, 0.3, 0.2, 0.1]),
+        "installment": rng.uniform(50, 900, n).round(2),
+        "purpose": rng.choice(["car", "credit_card", "debt_consolidation"], n),
+        "annual_inc": rng.choice([30000.0, 65000.0, 120000.0, np.nan], n, p=[0.3, 0.3, 0.3, 0.1]),
+        "dti": rng.choice([5.0, 18.2, 31.0, 250.0, -1.0, np.nan], n),
+        "revol_util": rng.choice(["45.1%", "80%", "0%", None], n),
+        "delinq_2yrs": rng.choice([0.0, 1.0, 3.0], n),
+        "inq_last_6mths": rng.choice([0.0, 2.0, np.nan], n),
+        "open_acc": rng.integers(1, 30, n).astype(float),
+        "total_acc": rng.integers(1, 60, n).astype(float),
+        "emp_length": rng.choice(["< 1 year", "1 year", "6 years", "10+ years", None], n),
+        "earliest_cr_line": rng.choice(["Sep-2003", "Jan-1999", "Dec-97", "Mar-05", "bogus", None], n),
+        "loan_status": rng.choice(["Fully Paid", "Charged Off", "Current"], n, p=[0.5, 0.3, 0.2]),
+        "desc": rng.choice(["", "short", 'line one\nline "two"\nline three'], n),
+    })
+    path = tmp_path / "sample.csv"
+    df.to_csv(path, index=False)
+    return str(path)
+
+
+def test_in_memory_chunked_and_parallel_outputs_match(raw_csv, tmp_path):
+    outputs = [tmp_path / f"clean_{mode}.csv" for mode in ("memory", "chunked", "parallel")]
+    run_in_memory(raw_csv, str(outputs[0]))
+    run_chunked(raw_csv, str(outputs[1]), chunksize=17)
+    run_parallel(raw_csv, str(outputs[2]), chunk_bytes=1024, workers=2)
+
+    expected = outputs[0].read_bytes()
+    assert len(pd.read_csv(outputs[0])) > 0
+    assert outputs[1].read_bytes() == expected
+    assert outputs[2].read_bytes() == expected
+
+
+def test_parse_month_year():
+    values = pd.Series(["Jan-2005", "Jan-05", "Jan-99", "garbage", np.nan, None], dtype=object)
+    parsed = _parse_month_year(values, today=pd.Timestamp("2026-10-19"))
+
+    assert parsed[0] == pd.Timestamp("2005-01-01")
+    # a two-digit YY <= 31 is read as a day of month, leaving no year
+    assert pd.isna(parsed[1])
+    assert parsed[2] == pd.Timestamp("1999-01-01")
+    assert parsed[3:].isna().all()
+
+
+def test_streaming_median_equals_median_of_concatenation():
+    parts = [pd.Series([3.0, 1.0, np.nan]), pd.Series([7.0, 1.0]), pd.Series([np.nan]), pd.Series([4.0])]
+    acc, other = StreamingMedian(), StreamingMedian()
+    for part in parts[:2]:
+        acc.update(part)
+    for part in parts[2:]:
+        other.update(part)
+    acc.merge(other)
+    whole = pd.concat(parts)
+    assert acc.median() == whole.median()
+
+    acc.update(pd.Series([9.0]))
+    assert acc.median() == pd.concat([whole, pd.Series([9.0])]).median()
+    assert StreamingMedian().median() is None
+
+
+def test_split_csv_ranges_keeps_quoted_newlines_in_one_range(tmp_path):
+    path = tmp_path / "text.csv"
+    df = pd.DataFrame({"id": range(6), "desc": ["a", "b\nc\nd", "e", 'f\n"g"', "h", "i"]})
+    df.to_csv(path, index=False)
+    data = path.read_bytes()
+    # the first range's target ends inside row 1's quoted text
+    target = data.index(b"b\nc") + 2 - data.index(b"\n") - 1
+
+    columns, ranges = split_csv_ranges(str(path), target)
+    assert columns == ["id", "desc"]
+    assert len(ranges) > 1
+    assert ranges[0][1] > data.index(b'd"')
+    parts = [read_csv_range(str(path), start, end, columns) for start, end in ranges]
+    pd.testing.assert_frame_equal(pd.concat(parts, ignore_index=True), df)
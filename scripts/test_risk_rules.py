@@ -0,0 +1,98 @@
+"""
+Run: python -m pytest scripts
+"""
+import itertools
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import risk_rules
+from risk_rules import KpiCounters, apply_increment, apply_rules
+
+
+def assign_risk_tier(row):
+    # the row-wise rule apply_rules replaced with np.select
+    if row["early_warning_flag"] == 1:
+        return "Watchlist"
+    elif (
+        row["dti_band"] in ["High", "Very High"]
+        or row["util_band"] in ["High", "Very High"]
+    ):
+        return "Elevated"
+    else:
+        return "Low"
+
+
+def make_loans(n, seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "loan_amnt": rng.integers(1, 40, n) * 1000.0,
+        "term": rng.choice([" 36 months", " 60 months"], n),
+        "installment": rng.uniform(50, 900, n).round(2),
+        "purpose": rng.choice(["car", "credit_card", "debt_consolidation", None], n),
+        "annual_inc": rng.integers(20, 200, n) * 1000.0,
+        "dti": rng.choice([0.0, 12.5, 20.0, 30.0, 35.0, 40.0, 55.0, np.nan], n),
+        "int_rate_pct": rng.choice([6.5, 10.0, 14.2, 19.9, 25.0], n),
+        "revol_util_pct": rng.choice([0.0, 30.0, 45.0, 80.0, 99.0, np.nan], n),
+        "delinq_2yrs": rng.choice([0.0, 1.0, np.nan], n),
+        "inq_last_6mths": rng.choice([0.0, 1.0, 2.0, 5.0], n),
+        "open_acc": rng.integers(1, 30, n).astype(float),
+        "total_acc": rng.integers(1, 60, n).astype(float),
+        "emp_length_yrs": rng.integers(0, 11, n).astype(float),
+        "credit_history_years": rng.uniform(1, 30, n),
+        "default": rng.integers(0, 2, n),
+    })
+
+
+def test_risk_tier_matches_row_wise_rule_on_boundaries():
+    grid = list(itertools.product(
+        [np.nan, 0.0, 20.0, 20.01, 30.0, 40.0, 100.0, 150.0],  # dti
+        [np.nan, 0.0, 60.0, 60.01, 80.0, 100.0, 120.0],       # revol_util_pct
+        [np.nan, 0.0, 1.0],                                    # delinq_2yrs
+        [np.nan, 1.0, 2.0],                                    # inq_last_6mths
+    ))
+    df = pd.DataFrame(grid, columns=["dti", "revol_util_pct", "delinq_2yrs", "inq_last_6mths"])
+    df["int_rate_pct"] = 12.0
+
+    scored = apply_rules(df)
+    expected = scored.apply(assign_risk_tier, axis=1)
+    pd.testing.assert_series_equal(scored["risk_tier"], expected, check_names=False)
+    assert set(scored["risk_tier"]) == {"Watchlist", "Elevated", "Low"}
+
+
+def test_kpi_counters_merge_like_one_frame():
+    a, b = apply_rules(make_loans(300, 1)), apply_rules(make_loans(200, 2))
+    merged = KpiCounters.from_frame(a) + KpiCounters.from_frame(b)
+    whole = KpiCounters.from_frame(pd.concat([a, b], ignore_index=True))
+
+    assert merged.cells == whole.cells
+    pd.testing.assert_frame_equal(merged.to_frame(), whole.to_frame())
+
+
+def test_same_increment_is_applied_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data" / "processed").mkdir(parents=True)
+    make_loans(400, 3).to_csv(risk_rules.INPUT_PATH, index=False)
+    day = tmp_path / "day.csv"
+    make_loans(50, 4).to_csv(day, index=False)
+
+    monkeypatch.setattr(sys, "argv", ["risk_rules.py"])
+    risk_rules.main()
+    kpi = apply_increment(str(day))
+    assert kpi.portfolio_rows == 450
+
+    outputs = [risk_rules.INPUT_PATH, risk_rules.SEGMENTS_PATH, risk_rules.WATCHLIST_PATH, risk_rules.KPI_STATE_PATH]
+    before = [open(p, "rb").read() for p in outputs]
+    assert apply_increment(str(day)) is None
+    assert [open(p, "rb").read() for p in outputs] == before
+
+
+def test_increment_needs_a_full_run_first(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data" / "processed").mkdir(parents=True)
+    make_loans(10, 5).to_csv(risk_rules.INPUT_PATH, index=False)
+
+    with pytest.raises(SystemExit):
+        apply_increment(risk_rules.INPUT_PATH)
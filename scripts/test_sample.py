@@ -0,0 +1,71 @@
+"""
+Run: python -m pytest scripts
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from sample import allocate, sample_csv
+
+
+@pytest.fixture
+def raw_csv(tmp_path):
+    rng = np.random.default_rng(7)
+    n = 500
+    df = pd.DataFrame({
+        "id": np.arange(1000, 1000 + n),
+        "loan_amnt": rng.integers(1, 40, n) * 500.0,
+        "loan_status": rng.choice(["Fully Paid", "Charged Off", "Default"], n, p=[0.7, 0.28, 0.02]),
+    })
+    path = tmp_path / "raw.csv"
+    df.to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.mark.parametrize("hash_column", [None, "id"])
+def test_sample_does_not_depend_on_chunksize(raw_csv, hash_column):
+    samples = [sample_csv(raw_csv, 60, seed=3, chunksize=c, hash_column=hash_column) for c in (7, 64, 1000)]
+    assert len(samples[0]) == 60
+    assert samples[0]["id"].is_monotonic_increasing
+    for other in samples[1:]:
+        pd.testing.assert_frame_equal(other, samples[0])
+    assert not sample_csv(raw_csv, 60, seed=4, chunksize=64, hash_column=hash_column).equals(samples[0])
+
+
+def test_stratified_sample_takes_smallest_keys_per_stratum(raw_csv):
+    df = pd.read_csv(raw_csv)
+    # one seeded stream in file order, whatever the chunk size
+    keys = np.random.default_rng(3).random(len(df))
+    sizes = df["loan_status"].value_counts().to_dict()
+    alloc = allocate(sizes, 40)
+
+    expected = []
+    for stratum, k in alloc.items():
+        rows = np.flatnonzero(df["loan_status"].to_numpy() == stratum)
+        expected.extend(rows[np.argsort(keys[rows], kind="stable")[:k]])
+    expected = df.iloc[np.sort(expected)].reset_index(drop=True)
+
+    for chunksize in (9, 1000):
+        out = sample_csv(raw_csv, 40, seed=3, chunksize=chunksize, stratify="loan_status")
+        pd.testing.assert_frame_equal(out, expected)
+    assert out["loan_status"].value_counts().to_dict() == {s: k for s, k in alloc.items() if k}
+
+
+def test_allocate_proportional_and_equal():
+    assert allocate({"a": 60, "b": 30, "c": 10}, 10) == {"a": 6, "b": 3, "c": 1}
+    # largest remainder, ties broken by stratum name
+    assert allocate({"a": 1, "b": 1, "c": 1}, 2) == {"a": 1, "b": 1, "c": 0}
+    assert allocate({"a": 50, "b": 50}, 10, "equal") == {"a": 5, "b": 5}
+
+
+def test_allocate_small_and_empty_strata():
+    # a stratum smaller than its share is taken whole, the rest goes to the others
+    assert allocate({"a": 2, "b": 100, "c": 50}, 30, "equal") == {"a": 2, "b": 14, "c": 14}
+    assert allocate({"a": 0, "b": 10}, 5) == {"a": 0, "b": 5}
+    assert allocate({}, 5) == {}
+
+
+def test_allocate_more_than_population():
+    assert allocate({"a": 3, "b": 4}, 100) == {"a": 3, "b": 4}
+    assert allocate({"a": 3, "b": 4}, 100, "equal") == {"a": 3, "b": 4}
+    assert allocate({"a": 3, "b": 4}, 0) == {"a": 0, "b": 0}